@@ -0,0 +1,221 @@
+import asyncio
+import os
+from typing import Any, AsyncIterator, Dict, List
+from dotenv import load_dotenv
+from core.ai.prompt_builder import PROMPT_COLUMNS, PromptBuilder, token_budget
+from core.serialization import loads
+
+# Load environment variables
+load_dotenv()
+
+BATCH_PROMPT = "position_batch_analysis"
+CONTEXT_KEYS = ("network", "exchange", "token0", "token1")
+
+# Completion tokens reserved per position (one JSON line each)
+BATCH_TOKENS_PER_ITEM = int(os.getenv("BATCH_TOKENS_PER_ITEM", "120"))
+# Completion token limit of a single chunk; caps positions per chunk
+BATCH_MAX_OUTPUT_TOKENS = int(os.getenv("BATCH_MAX_OUTPUT_TOKENS", "4000"))
+# Chunks analyzed at the same time by one batch request
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+# Positions accepted by one batch request
+BATCH_MAX_POSITIONS = int(os.getenv("BATCH_MAX_POSITIONS", "1000"))
+
+
+class BatchChunk:
+    """Positions of one pair analyzed together in a single model call"""
+
+    __slots__ = ("group", "context", "positions")
+
+    def __init__(
+        self, group: int, context: Dict[str, Any], positions: List[Dict[str, Any]]
+    ):
+        self.group = group
+        self.context = context
+        self.positions = positions
+
+
+def batch_groups(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Normalize a batch request into per-pair groups
+
+    Accepts either top-level 'positions' (with network/exchange/token0/token1)
+    or a 'pairs' list of such objects.
+
+    Returns:
+        List of {"context": {...}, "positions": [...]} groups
+
+    Raises:
+        ValueError: When the request is malformed, or there is nothing to
+            analyze or too much of it
+    """
+    entries = data.get("pairs")
+    if entries is None:
+        entries = [data]
+    if not isinstance(entries, list):
+        raise ValueError("'pairs' must be a list")
+
+    groups = []
+    total = 0
+    for group_index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            raise ValueError("Each pair must be an object")
+        positions = entry.get("positions") or []
+        if not isinstance(positions, list):
+            raise ValueError("'positions' must be a list")
+        context = {key: entry.get(key, "unknown") for key in CONTEXT_KEYS}
+
+        items = []
+        for index, position in enumerate(positions):
+            if not isinstance(position, dict):
+                raise ValueError("Each position must be an object")
+            if position.get("nft_id") is None:
+                # The model refers to rows by nft_id; give anonymous rows one
+                position = {**position, "nft_id": f"{group_index}-{index}"}
+            items.append(position)
+        if items:
+            groups.append({"context": context, "positions": items})
+            total += len(items)
+
+    if not groups:
+        raise ValueError("No positions provided")
+    if total > BATCH_MAX_POSITIONS:
+        raise ValueError(
+            f"Too many positions ({total}); at most {BATCH_MAX_POSITIONS} per batch"
+        )
+    return groups
+
+
+def pack_chunks(
+    builder: PromptBuilder, groups: List[Dict[str, Any]]
+) -> List[BatchChunk]:
+    """
+    Greedily pack each group's positions into as few chunks as possible
+
+    A chunk is closed when its table would exceed the batch prompt's token
+    budget (with the same reserve PromptBuilder keeps for its omission
+    line) or when the expected answer would exceed BATCH_MAX_OUTPUT_TOKENS.
+    """
+    budget = token_budget(BATCH_PROMPT)
+    columns = PROMPT_COLUMNS[BATCH_PROMPT]
+    reserve = 60 + 12 * len(columns)
+    header = builder.counter.count("\t".join(columns)) + 20
+    max_items = max(1, BATCH_MAX_OUTPUT_TOKENS // BATCH_TOKENS_PER_ITEM)
+
+    chunks = []
+    for group_index, group in enumerate(groups):
+        context = group["context"]
+        base = builder.build(context, BATCH_PROMPT).tokens + header
+        current: List[Dict[str, Any]] = []
+        used = base
+        for position in group["positions"]:
+            cost = builder.row_tokens(position, BATCH_PROMPT)
+            if current and (
+                used + cost > budget - reserve or len(current) >= max_items
+            ):
+                chunks.append(BatchChunk(group_index, context, current))
+                current = []
+                used = base
+            current.append(position)
+            used += cost
+        if current:
+            chunks.append(BatchChunk(group_index, context, current))
+    return chunks
+
+
+def parse_results(text: str) -> Dict[str, Dict[str, Any]]:
+    """Per-position answers from the model's JSON lines, keyed by nft_id"""
+    results = {}
+    for line in (text or "").splitlines():
+        line = line.strip().strip("`").strip()
+        if not line.startswith("{"):
+            continue
+        try:
+            item = loads(line)
+        except ValueError:
+            continue
+        if isinstance(item, dict) and item.get("nft_id") is not None:
+            results[str(item.pop("nft_id"))] = item
+    return results
+
+
+async def analyze_batch(
+    llm_service, groups: List[Dict[str, Any]], concurrency: int
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Analyze many positions with as few model calls as the budget allows
+
+    Chunks run concurrently (at most `concurrency` per batch, and through the
+    LLM scheduler at bulk priority). Per-position results are yielded as
+    soon as their chunk completes, not in input order.
+
+    Yields:
+        A "batch" header, one "result" per position, then a "summary"
+    """
+    chunks = pack_chunks(llm_service.prompt_builder, groups)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(chunk: BatchChunk) -> List[Dict[str, Any]]:
+        async with semaphore:
+            data = {**chunk.context, "positions": chunk.positions}
+            max_tokens = min(
+                BATCH_MAX_OUTPUT_TOKENS,
+                BATCH_TOKENS_PER_ITEM * len(chunk.positions) + 100,
+            )
+            error = None
+            parsed: Dict[str, Dict[str, Any]] = {}
+            try:
+                text = await llm_service.complete(
+                    data, BATCH_PROMPT, priority="bulk", max_tokens=max_tokens
+                )
+                parsed = parse_results(text)
+            except Exception as e:
+                error = str(e)
+
+        rows = []
+        for position in chunk.positions:
+            row = {
+                "type": "result",
+                "group": chunk.group,
+                **chunk.context,
+                "nft_id": position["nft_id"],
+            }
+            answer = parsed.get(str(position["nft_id"]))
+            if answer is not None:
+                # Nested, so model output can't overwrite the row's own keys
+                row["analysis"] = answer
+            else:
+                row["error"] = error or "No analysis returned for this position"
+            rows.append(row)
+        return rows
+
+    total = sum(len(chunk.positions) for chunk in chunks)
+    yield {
+        "type": "batch",
+        "groups": len(groups),
+        "positions": total,
+        "chunks": len(chunks),
+    }
+
+    tasks = [asyncio.ensure_future(run(chunk)) for chunk in chunks]
+    analyzed = 0
+    failed = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            for row in await next_done:
+                if "error" in row:
+                    failed += 1
+                else:
+                    analyzed += 1
+                yield row
+    finally:
+        # Client went away (or an error): stop the remaining chunks
+        for task in tasks:
+            task.cancel()
+
+    yield {
+        "type": "summary",
+        "positions": total,
+        "analyzed": analyzed,
+        "failed": failed,
+        "chunks": len(chunks),
+    }
@@ -0,0 +1,128 @@
+import hashlib
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from dotenv import load_dotenv
+from core.serialization import dumps
+
+# Load environment variables
+load_dotenv()
+
+
+class LLMResponseCache:
+    """
+    Size-bounded LRU cache of LLM completions
+
+    Keys hash (model, prompt file, canonical payload, temperature,
+    max_tokens). With a path configured, entries are also persisted to a
+    SQLite file so they survive restarts; the same LRU bound applies there.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl: float = 0.0,
+        path: Optional[str] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0}
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(
+        model: str,
+        prompt_file: Optional[str],
+        data: Any,
+        temperature: float,
+        max_tokens: int,
+    ) -> str:
+        """Hash of the request parameters and the canonicalized payload"""
+        digest = hashlib.sha256()
+        digest.update(f"{model}|{prompt_file}|{temperature}|{max_tokens}|".encode())
+        digest.update(dumps(data, sort_keys=True))
+        return digest.hexdigest()
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl > 0 and time.time() - stored_at > self.ttl
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached completion for key, or None"""
+        entry = self._entries.get(key)
+        if entry is None and self._db is not None:
+            row = self._db.execute(
+                "SELECT value, stored_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                entry = (row[0], row[1])
+                self._remember(key, entry)
+
+        if entry is None or self._expired(entry[1]):
+            self.stats["misses"] += 1
+            return None
+
+        self._entries.move_to_end(key)
+        if self._db is not None:
+            self._db.execute(
+                "UPDATE llm_cache SET accessed_at = ? WHERE key = ?",
+                (time.time(), key),
+            )
+            self._db.commit()
+        self.stats["hits"] += 1
+        return entry[0]
+
+    def set(self, key: str, value: str) -> None:
+        """Store a completed response"""
+        now = time.time()
+        self._remember(key, (value, now))
+        self.stats["stores"] += 1
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            # Keep the on-disk copy within the same LRU bound
+            self._db.execute(
+                "DELETE FROM llm_cache WHERE key NOT IN ("
+                "SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            self._db.commit()
+
+    def _remember(self, key: str, entry: Tuple[str, float]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "persistent": self._db is not None,
+            **self.stats,
+        }
+
+
+def cache_from_env() -> Optional[LLMResponseCache]:
+    """LLMResponseCache configured from LLM_CACHE_* env vars (None if off)"""
+    if os.getenv("LLM_CACHE_ENABLED", "true") != "true":
+        return None
+    return LLMResponseCache(
+        max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "256")),
+        ttl=float(os.getenv("LLM_CACHE_TTL", "3600")),
+        path=os.getenv("LLM_CACHE_PATH") or None,
+    )
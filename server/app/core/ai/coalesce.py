@@ -0,0 +1,78 @@
+import asyncio
+from typing import AsyncIterator, Callable, List, Optional
+
+
+class SharedStream:
+    """
+    One upstream text stream fanned out to any number of subscribers
+
+    The upstream generator is driven by a single background task that
+    buffers every chunk. Each subscriber replays the buffer from the start,
+    so late joiners first get the prefix they missed and then follow the
+    live chunks. When the last subscriber leaves before the upstream is
+    finished, the upstream is cancelled.
+    """
+
+    def __init__(
+        self,
+        source: AsyncIterator[str],
+        on_finish: Optional[Callable[["SharedStream"], None]] = None,
+    ):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._on_finish = on_finish
+        self._event = asyncio.Event()
+        self._task = asyncio.ensure_future(self._run(source))
+
+    async def _run(self, source: AsyncIterator[str]) -> None:
+        try:
+            async for chunk in source:
+                self.chunks.append(chunk)
+                self._wake()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self.error = e
+        finally:
+            await source.aclose()
+            self._finish()
+
+    def _wake(self) -> None:
+        self._event.set()
+        self._event = asyncio.Event()
+
+    def _finish(self) -> None:
+        if self.done:
+            return
+        self.done = True
+        self._wake()
+        if self._on_finish is not None:
+            self._on_finish(self)
+
+    def cancel(self) -> None:
+        """Stop the upstream; current subscribers see the stream end"""
+        # Finish first so no new subscriber joins a stream being torn down
+        self._finish()
+        self._task.cancel()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        """Yield every chunk from the start, then live chunks until the end"""
+        self.subscribers += 1
+        index = 0
+        try:
+            while True:
+                if index < len(self.chunks):
+                    yield self.chunks[index]
+                    index += 1
+                    continue
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self._event.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                self.cancel()
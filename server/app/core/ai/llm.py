@@ -1,21 +1,89 @@
 import os
-import json
 from typing import Dict, Any, Optional
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, RateLimitError
 from dotenv import load_dotenv
+from core.ai.cache import LLMResponseCache, cache_from_env
+from core.ai.coalesce import SharedStream
+from core.ai.prompt_builder import PromptBuilder
+from core.ai.prompts import registry_from_env
+from core.ai.scheduler import DEFAULT_PRIORITY, scheduler_from_env
 
 # Load environment variables
 load_dotenv()
 
+# Size of the text chunks replayed on a streaming cache hit
+REPLAY_CHUNK_SIZE = 256
+
+# Scheduler priority per prompt file; anything else uses DEFAULT_PRIORITY
+PROMPT_PRIORITIES = {"chat_assistant": "interactive"}
+
+# Pause (seconds) after a 429 when OpenAI sends no Retry-After header
+RATE_LIMIT_BACKOFF = float(os.getenv("LLM_RATE_LIMIT_BACKOFF", "5"))
+
 
 class LLMService:
     def __init__(self):
         """Initialize the LLM service with OpenAI client"""
         self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
         self.model = os.getenv("OPENAI_MODEL", "gpt-4.1-mini")
+        self.max_tokens = int(os.getenv("MAX_TOKENS", "1500"))
+        self.temperature = float(os.getenv("TEMPERATURE", "0.7"))
+        self.prompt_builder = PromptBuilder(self.model)
+        self.response_cache = cache_from_env()
+        # Loaded and validated once; raises (failing startup) if a prompt is missing
+        self.prompts = registry_from_env()
+        # Admission control shared by every outbound call
+        self.scheduler = scheduler_from_env()
+        # Identical streaming requests in flight share one upstream stream
+        self._inflight_streams: Dict[str, SharedStream] = {}
+        self.stream_stats = {"upstream": 0, "coalesced": 0}
+
+    def _priority(
+        self, system_prompt_file: Optional[str], priority: Optional[str]
+    ) -> str:
+        if priority:
+            return priority
+        return PROMPT_PRIORITIES.get(system_prompt_file or "", DEFAULT_PRIORITY)
+
+    def _estimate_tokens(self, *texts: str) -> int:
+        return sum(self.prompt_builder.counter.count(text) for text in texts)
+
+    def _on_rate_limit(self, error: RateLimitError) -> None:
+        """Pause the scheduler after a 429 so queued calls back off together"""
+        delay = RATE_LIMIT_BACKOFF
+        try:
+            delay = float(error.response.headers.get("retry-after", delay))
+        except (AttributeError, TypeError, ValueError):
+            pass
+        print(f"OpenAI rate limit hit, pausing LLM calls for {delay}s")
+        self.scheduler.throttle(delay)
+
+    def _request_key(
+        self,
+        data: Dict[str, Any],
+        system_prompt_file: Optional[str],
+        max_tokens: Optional[int] = None,
+    ) -> Optional[str]:
+        """Canonical request key for caching and coalescing"""
+        try:
+            return LLMResponseCache.make_key(
+                self.model,
+                system_prompt_file,
+                data,
+                self.temperature,
+                max_tokens or self.max_tokens,
+            )
+        except Exception as e:
+            # Payloads that cannot be canonicalized are not cached or shared
+            print(f"LLM request key error: {str(e)}")
+            return None
 
     async def complete(
-        self, data: Dict[str, Any], system_prompt_file: Optional[str] = None
+        self,
+        data: Dict[str, Any],
+        system_prompt_file: Optional[str] = None,
+        priority: Optional[str] = None,
+        max_tokens: Optional[int] = None,
     ) -> str:
         """
         Complete a task using LLM with provided data and system prompt
@@ -23,11 +91,20 @@ class LLMService:
         Args:
             data: Input data for the completion
             system_prompt_file: Optional system prompt file name (without .txt extension)
+            priority: Scheduler priority class (defaults by prompt file)
+            max_tokens: Completion token limit (defaults to MAX_TOKENS)
 
         Returns:
             LLM completion result
         """
+        max_tokens = max_tokens or self.max_tokens
         try:
+            cache_key = self._request_key(data, system_prompt_file, max_tokens)
+            if cache_key and self.response_cache is not None:
+                cached = self.response_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+
             # Load system prompt if provided
             if system_prompt_file:
                 system_prompt = self.load_prompt_from_file(f"{system_prompt_file}.txt")
@@ -35,26 +112,42 @@ class LLMService:
                 system_prompt = self._load_default_system_prompt()
 
             # Format user message with data
-            user_message = self._format_user_message(data)
-
-            # Call OpenAI API
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_message},
-                ],
-                max_tokens=1500,
-                temperature=0.7,
-            )
-
-            return response.choices[0].message.content
+            user_message = self._format_user_message(data, system_prompt_file)
+
+            # Call OpenAI API once the scheduler admits the request
+            estimate = self._estimate_tokens(system_prompt, user_message) + max_tokens
+            async with self.scheduler.slot(
+                self._priority(system_prompt_file, priority), estimate
+            ) as reservation:
+                try:
+                    response = await self.client.chat.completions.create(
+                        model=self.model,
+                        messages=[
+                            {"role": "system", "content": system_prompt},
+                            {"role": "user", "content": user_message},
+                        ],
+                        max_tokens=max_tokens,
+                        temperature=self.temperature,
+                    )
+                except RateLimitError as e:
+                    self._on_rate_limit(e)
+                    raise
+                if getattr(response, "usage", None):
+                    reservation.used_tokens = response.usage.total_tokens
+
+            content = response.choices[0].message.content
+            if cache_key and content and self.response_cache is not None:
+                self.response_cache.set(cache_key, content)
+            return content
 
         except Exception as e:
             raise Exception(f"LLM completion failed: {str(e)}")
 
     async def complete_stream(
-        self, data: Dict[str, Any], system_prompt_file: Optional[str] = None
+        self,
+        data: Dict[str, Any],
+        system_prompt_file: Optional[str] = None,
+        priority: Optional[str] = None,
     ):
         """
         Complete a task using LLM with streaming response
@@ -62,10 +155,64 @@ class LLMService:
         Args:
             data: Input data for the completion
             system_prompt_file: Optional system prompt file name (without .txt extension)
+            priority: Scheduler priority class (defaults by prompt file)
 
         Yields:
             Streaming chunks of the completion
         """
+        try:
+            cache_key = self._request_key(data, system_prompt_file)
+            if cache_key and self.response_cache is not None:
+                cached = self.response_cache.get(cache_key)
+                if cached is not None:
+                    # Replay the stored completion as a stream
+                    for start in range(0, len(cached), REPLAY_CHUNK_SIZE):
+                        yield cached[start : start + REPLAY_CHUNK_SIZE]
+                    return
+
+            source = self._stream_completion(
+                data, system_prompt_file, priority, cache_key
+            )
+            if not cache_key:
+                async for chunk in source:
+                    yield chunk
+                return
+
+            # Join an identical stream already in flight, or start one
+            shared = self._inflight_streams.get(cache_key)
+            if shared is None:
+                shared = SharedStream(source, self._stream_finished(cache_key))
+                self._inflight_streams[cache_key] = shared
+                self.stream_stats["upstream"] += 1
+            else:
+                await source.aclose()
+                self.stream_stats["coalesced"] += 1
+
+            async for chunk in shared.subscribe():
+                yield chunk
+
+        except Exception as e:
+            yield f"Error: {str(e)}"
+
+    def get_stream_stats(self) -> Dict[str, Any]:
+        """Upstream streams started vs requests coalesced onto one"""
+        return {"in_flight": len(self._inflight_streams), **self.stream_stats}
+
+    def _stream_finished(self, key: str):
+        def forget(shared: SharedStream) -> None:
+            if self._inflight_streams.get(key) is shared:
+                del self._inflight_streams[key]
+
+        return forget
+
+    async def _stream_completion(
+        self,
+        data: Dict[str, Any],
+        system_prompt_file: Optional[str],
+        priority: Optional[str],
+        cache_key: Optional[str],
+    ):
+        """One upstream OpenAI stream; errors are yielded as an 'Error: ...' chunk"""
         try:
             # Load system prompt if provided
             if system_prompt_file:
@@ -74,23 +221,44 @@ class LLMService:
                 system_prompt = self._load_default_system_prompt()
 
             # Format user message with data
-            user_message = self._format_user_message(data)
-
-            # Call OpenAI API with streaming
-            stream = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_message},
-                ],
-                max_tokens=1500,
-                temperature=0.7,
-                stream=True,
-            )
-
-            async for chunk in stream:
-                if chunk.choices[0].delta.content is not None:
-                    yield chunk.choices[0].delta.content
+            user_message = self._format_user_message(data, system_prompt_file)
+
+            # Call OpenAI API with streaming; the slot is held until the
+            # stream ends or the client goes away
+            prompt_tokens = self._estimate_tokens(system_prompt, user_message)
+            parts = []
+            async with self.scheduler.slot(
+                self._priority(system_prompt_file, priority),
+                prompt_tokens + self.max_tokens,
+            ) as reservation:
+                try:
+                    stream = await self.client.chat.completions.create(
+                        model=self.model,
+                        messages=[
+                            {"role": "system", "content": system_prompt},
+                            {"role": "user", "content": user_message},
+                        ],
+                        max_tokens=self.max_tokens,
+                        temperature=self.temperature,
+                        stream=True,
+                    )
+                except RateLimitError as e:
+                    self._on_rate_limit(e)
+                    raise
+
+                try:
+                    async for chunk in stream:
+                        if chunk.choices[0].delta.content is not None:
+                            parts.append(chunk.choices[0].delta.content)
+                            yield chunk.choices[0].delta.content
+                finally:
+                    reservation.used_tokens = prompt_tokens + self._estimate_tokens(
+                        "".join(parts)
+                    )
+
+            # Only completed streams are cached; errors and disconnects are not
+            if cache_key and parts and self.response_cache is not None:
+                self.response_cache.set(cache_key, "".join(parts))
 
         except Exception as e:
             yield f"Error: {str(e)}"
@@ -108,15 +276,23 @@ class LLMService:
         try:
             system_prompt = self.load_prompt_from_file("chat_assistant.txt")
 
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": message},
-                ],
-                max_tokens=500,
-                temperature=0.7,
-            )
+            estimate = self._estimate_tokens(system_prompt, message) + 500
+            async with self.scheduler.slot("interactive", estimate) as reservation:
+                try:
+                    response = await self.client.chat.completions.create(
+                        model=self.model,
+                        messages=[
+                            {"role": "system", "content": system_prompt},
+                            {"role": "user", "content": message},
+                        ],
+                        max_tokens=500,
+                        temperature=0.7,
+                    )
+                except RateLimitError as e:
+                    self._on_rate_limit(e)
+                    raise
+                if getattr(response, "usage", None):
+                    reservation.used_tokens = response.usage.total_tokens
 
             return response.choices[0].message.content
 
@@ -175,16 +351,34 @@ class LLMService:
         """Load default system prompt"""
         return "You are a helpful AI assistant specializing in data analysis and financial insights."
 
-    def _format_user_message(self, data: Dict[str, Any]) -> str:
-        """Format user message with data"""
+    def _format_user_message(
+        self, data: Dict[str, Any], system_prompt_file: Optional[str] = None
+    ) -> str:
+        """Format user message with data, compacted to the prompt's token budget"""
         try:
-            return f"Please analyze the following data:\n\n{json.dumps(data, indent=2)}"
+            prompt = self.prompt_builder.build(data, system_prompt_file)
+            print(
+                f"Prompt {system_prompt_file or 'default'}: {prompt.tokens}/"
+                f"{prompt.budget} tokens, {prompt.rows} rows "
+                f"({prompt.rows_omitted} omitted)"
+                + (", truncated" if prompt.truncated else "")
+            )
+            return prompt.text
         except Exception as e:
             return f"Please analyze the following data:\n\n{str(data)}"
 
+    def prompt_truncated(
+        self, data: Dict[str, Any], system_prompt_file: Optional[str] = None
+    ) -> bool:
+        """Whether the user message for this data is cut to fit its budget"""
+        try:
+            return self.prompt_builder.build(data, system_prompt_file).truncated
+        except Exception:
+            return False
+
     def load_prompt_from_file(self, prompt_file: str) -> str:
         """
-        Load a prompt template from a file in the prompts directory
+        Get a prompt template from the registry loaded at startup
 
         Args:
             prompt_file: Name of the prompt file
@@ -192,16 +386,4 @@ class LLMService:
         Returns:
             Prompt template content
         """
-        try:
-            prompts_dir = os.path.join(
-                os.path.dirname(__file__), "..", "assets", "prompts"
-            )
-            prompt_path = os.path.join(prompts_dir, prompt_file)
-
-            with open(prompt_path, "r", encoding="utf-8") as f:
-                return f.read()
-
-        except FileNotFoundError:
-            raise Exception(f"Prompt file {prompt_file} not found in prompts directory")
-        except Exception as e:
-            raise Exception(f"Error loading prompt file: {str(e)}")
+        return self.prompts.get(prompt_file)
@@ -0,0 +1,562 @@
+import math
+import os
+import statistics
+from typing import Dict, Any, List, Optional
+from dotenv import load_dotenv
+from core.positions.record import PositionRecord
+from core.serialization import dumps_str
+
+# Load environment variables
+load_dotenv()
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+MESSAGE_PREFIX = "Please analyze the following data:\n\n"
+
+# Keys holding raw positions; they are projected to the prompt's columns.
+# Any other list of dicts is encoded as a table with its own keys.
+POSITION_LIST_KEYS = ("data", "positions")
+
+# Columns each prompt needs, in output order. Flattened names: fields of
+# performance.hodl are lifted to the top level and the tokens map becomes
+# a "pair" of symbols.
+PROMPT_COLUMNS = {
+    "position_analysis": [
+        "nft_id",
+        "pair",
+        "pool",
+        "network",
+        "exchange",
+        "fee_tier",
+        "in_range",
+        "age",
+        "tick_lower",
+        "tick_upper",
+        "apr",
+        "roi",
+        "pnl",
+        "pool_apr",
+        "fee_apr",
+        "il",
+        "underlying_value",
+        "score_1",
+        "score_2",
+        "score_3",
+        "score_4",
+        "weighted_score",
+    ],
+    "top_earning_analyzer": [
+        "nft_id",
+        "pair",
+        "pool",
+        "network",
+        "exchange",
+        "fee_tier",
+        "in_range",
+        "age",
+        "exited",
+        "pnl",
+        "roi",
+        "apr",
+        "pool_apr",
+        "fee_apr",
+        "il",
+        "underlying_value",
+    ],
+}
+PROMPT_COLUMNS["position_batch_analysis"] = PROMPT_COLUMNS["position_analysis"]
+
+# Default user-message token budget per prompt file (others, such as
+# chat_assistant, use PROMPT_TOKEN_BUDGET)
+DEFAULT_TOKEN_BUDGETS = {
+    "position_analysis": 4000,
+    "position_batch_analysis": 6000,
+    "top_earning_analyzer": 6000,
+}
+DEFAULT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+
+
+def token_budget(prompt_name: Optional[str]) -> int:
+    """
+    Token budget for a prompt's user message
+
+    PROMPT_TOKEN_BUDGET_<PROMPT_NAME> (e.g. PROMPT_TOKEN_BUDGET_CHAT_ASSISTANT)
+    overrides the per-prompt default, PROMPT_TOKEN_BUDGET the global one.
+    """
+    if prompt_name:
+        value = os.getenv(f"PROMPT_TOKEN_BUDGET_{prompt_name.upper()}")
+        if value:
+            return int(value)
+        if prompt_name in DEFAULT_TOKEN_BUDGETS:
+            return DEFAULT_TOKEN_BUDGETS[prompt_name]
+    return DEFAULT_TOKEN_BUDGET
+
+
+class TokenCounter:
+    """tiktoken when installed, otherwise a ~4 characters/token estimate"""
+
+    def __init__(self, model: Optional[str] = None):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model or "")
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("cl100k_base")
+
+    def count(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        return (len(text) + 3) // 4
+
+
+class BuiltPrompt:
+    """A user message plus the numbers behind it"""
+
+    __slots__ = ("text", "tokens", "budget", "rows", "rows_omitted", "truncated")
+
+    def __init__(
+        self,
+        text: str,
+        tokens: int,
+        budget: int,
+        rows: int = 0,
+        rows_omitted: int = 0,
+        truncated: bool = False,
+    ):
+        self.text = text
+        self.tokens = tokens
+        self.budget = budget
+        self.rows = rows
+        self.rows_omitted = rows_omitted
+        # True when the message was cut to fit the budget (not just rows
+        # omitted, which the message itself summarizes)
+        self.truncated = truncated
+
+
+def _is_rows(value: Any) -> bool:
+    return (
+        isinstance(value, list)
+        and bool(value)
+        and all(isinstance(item, dict) for item in value)
+    )
+
+
+def flatten_position(position: Dict[str, Any]) -> Dict[str, Any]:
+    """Lift performance.hodl fields and summarize the tokens map as a pair"""
+    return PositionRecord(position).prompt_row()
+
+
+def project_position(
+    position: Dict[str, Any], prompt_name: Optional[str]
+) -> Dict[str, Any]:
+    """
+    Flattened position reduced to the columns a prompt uses
+
+    Projecting again is a no-op, so positions projected as they arrive
+    build the same message as the raw ones.
+    """
+    row = flatten_position(position)
+    columns = PROMPT_COLUMNS.get(prompt_name or "")
+    if not columns:
+        return row
+    return {column: row[column] for column in columns if column in row}
+
+
+def _as_number(value: Any) -> Optional[float]:
+    if isinstance(value, bool) or value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def format_cell(value: Any) -> str:
+    """Compact cell text: short floats, lowercase booleans, no tabs"""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    text = str(value)
+    # Revert sends long decimal strings, e.g. "7247.966380478462993644"
+    number = _as_number(text)
+    if number is not None and ("." in text or "e" in text.lower()):
+        return f"{number:.6g}"
+    return text.replace("\t", " ").replace("\n", " ")
+
+
+# Columns left out of omitted-row summaries (identifiers, not quantities)
+SUMMARY_SKIP_COLUMNS = ("nft_id", "tick_lower", "tick_upper")
+
+
+def summarize_rows(columns: List[str], rows: List[Dict[str, Any]]) -> str:
+    """min/median/max of every numeric column over the given rows"""
+    parts = []
+    for column in columns:
+        values = [_as_number(row.get(column)) for row in rows]
+        values = [v for v in values if v is not None]
+        if not values or column in SUMMARY_SKIP_COLUMNS:
+            continue
+        parts.append(
+            f"{column} min={min(values):.6g} "
+            f"median={statistics.median(values):.6g} max={max(values):.6g}"
+        )
+    return "; ".join(parts)
+
+
+class RunningSummary:
+    """
+    min/max and quantiles of a stream of numbers in bounded memory
+
+    Values are kept exactly until more than `capacity` of them have
+    arrived. After that an overfull level is compacted: sorted, with every
+    other value moved up a level at twice the weight (alternating which
+    half survives). This is the Munro-Paterson/KLL scheme, and lower
+    levels get geometrically smaller capacities, so the sketch never holds
+    more than about 3 * capacity values.
+
+    Unlike marker-based estimators such as P-squared, the rank error does
+    not depend on input order. That matters because Revert returns
+    positions sorted by APR.
+    """
+
+    __slots__ = ("capacity", "count", "low", "high", "levels", "flips")
+
+    def __init__(self, capacity: int = 128):
+        self.capacity = max(8, capacity)
+        self.count = 0
+        self.low = math.inf
+        self.high = -math.inf
+        # levels[i] holds values standing for 2**i inputs each
+        self.levels: List[List[float]] = [[]]
+        self.flips: List[int] = [0]
+
+    def copy(self) -> "RunningSummary":
+        other = RunningSummary(self.capacity)
+        other.count = self.count
+        other.low = self.low
+        other.high = self.high
+        other.levels = [list(level) for level in self.levels]
+        other.flips = list(self.flips)
+        return other
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        if value < self.low:
+            self.low = value
+        if value > self.high:
+            self.high = value
+        self.levels[0].append(value)
+        if len(self.levels[0]) > self._level_capacity(0):
+            self._compress()
+
+    def _level_capacity(self, level: int) -> int:
+        depth = len(self.levels) - 1 - level
+        return max(2, int(self.capacity * (2 / 3) ** depth))
+
+    def _compress(self) -> None:
+        for level in range(len(self.levels)):
+            values = self.levels[level]
+            if len(values) <= self._level_capacity(level):
+                continue
+            if level + 1 == len(self.levels):
+                self.levels.append([])
+                self.flips.append(0)
+            values.sort()
+            # An odd value out stays at this level, keeping weights exact
+            kept = [values.pop()] if len(values) % 2 else []
+            flip = self.flips[level]
+            self.flips[level] = 1 - flip
+            self.levels[level + 1].extend(values[flip::2])
+            self.levels[level] = kept
+
+    def quantile(self, p: float) -> float:
+        """
+        The p-quantile (0 <= p <= 1)
+
+        Exact, with the inclusive interpolation of statistics.quantiles,
+        while nothing has been compacted; otherwise the weighted value at
+        that rank.
+        """
+        if len(self.levels) == 1:
+            ordered = sorted(self.levels[0])
+            rank = (len(ordered) - 1) * p
+            below = int(rank)
+            if below + 1 >= len(ordered):
+                return ordered[-1]
+            return ordered[below] + (ordered[below + 1] - ordered[below]) * (
+                rank - below
+            )
+        weighted = sorted(
+            (value, 1 << level)
+            for level, values in enumerate(self.levels)
+            for value in values
+        )
+        rank = (self.count - 1) * p
+        seen = 0
+        for value, weight in weighted:
+            seen += weight
+            if seen > rank:
+                return value
+        return weighted[-1][0]
+
+    @property
+    def median(self) -> float:
+        return self.quantile(0.5)
+
+    def size(self) -> int:
+        """Values currently held"""
+        return sum(len(level) for level in self.levels)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"count": self.count, "levels": self.levels}
+
+
+class PositionTable:
+    """
+    A position list projected for a prompt, built one position at a time
+
+    Rows are stored while they fit the prompt's token budget; after that a
+    position only bumps the omitted count and the per-column running
+    summaries, so memory does not grow with the number of positions.
+    PromptBuilder renders it like any other table (build() feeds raw
+    position lists through one too).
+    """
+
+    def __init__(self, prompt_name: Optional[str], counter: "TokenCounter"):
+        self.prompt_name = prompt_name
+        self.columns = PROMPT_COLUMNS.get(prompt_name or "") or []
+        self.counter = counter
+        self.budget = token_budget(prompt_name)
+        self.rows: List[Dict[str, Any]] = []
+        self.total = 0
+        self.seen: set = set()
+        self._rows_tokens = 0
+        self._omitted: Dict[str, RunningSummary] = {}
+
+    def add(self, position: Any) -> None:
+        """
+        Project one raw position and store or summarize it
+
+        Raises:
+            ValueError: When the position is not an object
+        """
+        if not isinstance(position, dict):
+            raise ValueError("Positions must be JSON objects")
+        row = project_position(position, self.prompt_name)
+        self.total += 1
+        self.seen.update(row)
+        if self._omitted or self.rows and self._rows_tokens >= self.budget:
+            self._summarize(self._omitted, row)
+            return
+        # Costed over every prompt column, an upper bound of the final row
+        cells = [format_cell(row.get(c)) for c in self.columns or list(row)]
+        cost = self.counter.count("\n" + "\t".join(cells))
+        if self.rows and self._rows_tokens + cost > self.budget:
+            self._summarize(self._omitted, row)
+            return
+        self.rows.append(row)
+        self._rows_tokens += cost
+
+    def present(self) -> List[str]:
+        """Prompt columns found in at least one position"""
+        if not self.columns:
+            return list(dict.fromkeys(k for row in self.rows for k in row))
+        return [c for c in self.columns if c in self.seen]
+
+    def omitted_summary(
+        self, present: List[str], dropped: List[Dict[str, Any]]
+    ) -> str:
+        """
+        min/median/max per numeric column over the omitted positions
+
+        Args:
+            present: Columns of the rendered table
+            dropped: Stored rows that did not make it into the message
+        """
+        summaries = {name: summary.copy() for name, summary in self._omitted.items()}
+        for row in dropped:
+            self._summarize(summaries, row)
+        parts = []
+        for column in present:
+            summary = summaries.get(column)
+            if summary is None or column in SUMMARY_SKIP_COLUMNS:
+                continue
+            parts.append(
+                f"{column} min={summary.low:.6g} "
+                f"median={summary.median:.6g} max={summary.high:.6g}"
+            )
+        return "; ".join(parts)
+
+    @staticmethod
+    def _summarize(
+        summaries: Dict[str, RunningSummary], row: Dict[str, Any]
+    ) -> None:
+        for column, value in row.items():
+            number = _as_number(value)
+            if number is not None:
+                summaries.setdefault(column, RunningSummary()).add(number)
+
+    def to_json(self) -> Dict[str, Any]:
+        """Canonical form (e.g. for LLM cache keys)"""
+        return {
+            "rows": self.rows,
+            "total": self.total,
+            "columns": self.present(),
+            "omitted": {
+                name: summary.to_json()
+                for name, summary in sorted(self._omitted.items())
+            },
+        }
+
+
+class PromptBuilder:
+    """
+    Builds compact, token-budgeted user messages for LLM prompts
+
+    Lists of rows are sent as tab-separated tables instead of indented
+    JSON, with raw position lists projected to the columns the prompt
+    needs. When the message
+    would exceed the prompt's token budget, trailing rows are dropped and
+    replaced by a one-line summary of what was omitted (computed in
+    constant memory for position lists, see PositionTable).
+    """
+
+    def __init__(self, model: Optional[str] = None):
+        self.counter = TokenCounter(model)
+
+    def build(
+        self, data: Any, prompt_name: Optional[str] = None
+    ) -> BuiltPrompt:
+        """
+        Build the user message for a prompt
+
+        Args:
+            data: Posted payload
+            prompt_name: Prompt file name (without .txt extension)
+
+        Returns:
+            BuiltPrompt with the message text and its token count
+        """
+        budget = token_budget(prompt_name)
+        columns = PROMPT_COLUMNS.get(prompt_name or "")
+
+        tables = {}
+        context: Any = data
+        if columns and isinstance(data, dict):
+            context = {}
+            for key, value in data.items():
+                if isinstance(value, PositionTable):
+                    # Streamed position list (see core.analytics.ingest)
+                    if value.total:
+                        tables[key] = value
+                    else:
+                        context[key] = []
+                elif key in POSITION_LIST_KEYS + ("position",) and _is_rows(
+                    value
+                ):
+                    tables[key] = self.position_table(value, prompt_name)
+                elif key == "position" and isinstance(value, dict):
+                    tables[key] = self.position_table([value], prompt_name)
+                elif _is_rows(value):
+                    tables[key] = value
+                else:
+                    context[key] = value
+
+        text = MESSAGE_PREFIX
+        if context or not tables:
+            text += dumps_str(context)
+        used = self.counter.count(text)
+
+        if not tables:
+            if used > budget:
+                text = self._truncate_text(text, budget)
+                return BuiltPrompt(
+                    text, self.counter.count(text), budget, truncated=True
+                )
+            return BuiltPrompt(text, used, budget)
+
+        total_rows = 0
+        total_omitted = 0
+        for key, rows in tables.items():
+            if isinstance(rows, PositionTable):
+                # Positions projected to the columns this prompt needs
+                table = rows
+                flat_rows = table.rows
+                present = table.present()
+                row_count = table.total
+            else:
+                # Already-compact rows (e.g. pre-aggregated summaries)
+                table = None
+                flat_rows = rows
+                present = list(dict.fromkeys(k for row in rows for k in row))
+                row_count = len(rows)
+            header = (
+                f"\n\n{key} ({row_count} rows, tab-separated):\n"
+                + "\t".join(present)
+            )
+            used += self.counter.count(header)
+            text += header
+
+            kept = 0
+            # Leave room for the omission summary line
+            reserve = 60 + 12 * len(present)
+            for row in flat_rows:
+                cells = [format_cell(row.get(c)) for c in present]
+                line = "\n" + "\t".join(cells)
+                cost = self.counter.count(line)
+                if used + cost > budget - reserve and kept > 0:
+                    break
+                text += line
+                used += cost
+                kept += 1
+
+            omitted = row_count - kept
+            if omitted:
+                if table is not None:
+                    omitted_text = table.omitted_summary(present, flat_rows[kept:])
+                else:
+                    omitted_text = summarize_rows(present, flat_rows[kept:])
+                summary = (
+                    f"\n[{omitted} more rows omitted to fit the token "
+                    f"budget; omitted rows: {omitted_text}]"
+                )
+                text += summary
+                used += self.counter.count(summary)
+            total_rows += kept
+            total_omitted += omitted
+
+        return BuiltPrompt(
+            text, self.counter.count(text), budget, total_rows, total_omitted
+        )
+
+    def position_table(
+        self, positions: List[Dict[str, Any]], prompt_name: Optional[str]
+    ) -> PositionTable:
+        """PositionTable of an in-memory position list"""
+        table = PositionTable(prompt_name, self.counter)
+        for position in positions:
+            table.add(position)
+        return table
+
+    def row_tokens(self, position: Dict[str, Any], prompt_name: str) -> int:
+        """Tokens one raw position adds as a table row for this prompt"""
+        flat = flatten_position(position)
+        columns = PROMPT_COLUMNS.get(prompt_name) or list(flat)
+        cells = [format_cell(flat.get(c)) for c in columns]
+        return self.counter.count("\n" + "\t".join(cells))
+
+    def _truncate_text(self, text: str, budget: int) -> str:
+        marker = "...[truncated to fit the token budget]"
+        # Shrink proportionally until the estimate fits
+        while self.counter.count(text + marker) > budget and len(text) > 1:
+            ratio = budget / self.counter.count(text + marker)
+            text = text[: max(1, int(len(text) * ratio * 0.95))]
+        return text + marker
@@ -0,0 +1,132 @@
+import os
+from types import MappingProxyType
+from typing import Dict, Iterable, Mapping, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+PROMPTS_DIR = os.path.join(os.path.dirname(__file__), "..", "assets", "prompts")
+PROMPT_EXTENSION = ".txt"
+
+# Prompts the service and endpoints reference by name; boot fails without them
+REQUIRED_PROMPTS = (
+    "chat_assistant",
+    "general_analysis",
+    "position_analysis",
+    "position_batch_analysis",
+    "position_plan_finder",
+    "top_earning_analyzer",
+)
+
+
+def _prompt_name(prompt_file: str) -> str:
+    """Registry name for a prompt file ('x.txt' and 'x' are the same)"""
+    if prompt_file.endswith(PROMPT_EXTENSION):
+        return prompt_file[: -len(PROMPT_EXTENSION)]
+    return prompt_file
+
+
+class PromptRegistry:
+    """
+    Prompt templates loaded once from the prompts directory
+
+    Every template is read and validated at construction, so a missing or
+    empty prompt fails at startup instead of on a user request. Lookups are
+    in-memory. With hot_reload enabled (development), a template whose file
+    mtime changed is re-read on its next lookup.
+    """
+
+    def __init__(
+        self,
+        directory: str = PROMPTS_DIR,
+        required: Iterable[str] = REQUIRED_PROMPTS,
+        hot_reload: bool = False,
+    ):
+        self.directory = os.path.abspath(directory)
+        self.required = tuple(required)
+        self.hot_reload = hot_reload
+        self._prompts: Mapping[str, str] = MappingProxyType({})
+        self._mtimes: Dict[str, float] = {}
+        self.load()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}{PROMPT_EXTENSION}")
+
+    def _read(self, name: str) -> str:
+        with open(self._path(name), "r", encoding="utf-8") as f:
+            text = f.read()
+        if not text.strip():
+            raise Exception(f"Prompt file {name}{PROMPT_EXTENSION} is empty")
+        return text
+
+    def load(self) -> None:
+        """(Re)load every prompt file and check the required ones exist"""
+        if not os.path.isdir(self.directory):
+            raise Exception(f"Prompts directory {self.directory} not found")
+
+        prompts = {}
+        mtimes = {}
+        for file_name in sorted(os.listdir(self.directory)):
+            if not file_name.endswith(PROMPT_EXTENSION):
+                continue
+            name = _prompt_name(file_name)
+            prompts[name] = self._read(name)
+            mtimes[name] = os.path.getmtime(self._path(name))
+
+        missing = [name for name in self.required if name not in prompts]
+        if missing:
+            raise Exception(
+                f"Prompt files not found in {self.directory}: "
+                + ", ".join(f"{name}{PROMPT_EXTENSION}" for name in missing)
+            )
+
+        self._prompts = MappingProxyType(prompts)
+        self._mtimes = mtimes
+        print(f"Loaded {len(prompts)} prompt templates from {self.directory}")
+
+    def _reload_if_changed(self, name: str) -> None:
+        try:
+            mtime = os.path.getmtime(self._path(name))
+        except OSError:
+            # Deleted while running: keep serving the loaded copy
+            return
+        if mtime != self._mtimes.get(name):
+            prompts = dict(self._prompts)
+            prompts[name] = self._read(name)
+            self._prompts = MappingProxyType(prompts)
+            self._mtimes[name] = mtime
+            print(f"Reloaded prompt template {name}")
+
+    def get(self, prompt_file: str) -> str:
+        """
+        Prompt template by name
+
+        Args:
+            prompt_file: Prompt name, with or without the .txt extension
+
+        Returns:
+            Prompt template content
+        """
+        name = _prompt_name(prompt_file)
+        if self.hot_reload:
+            self._reload_if_changed(name)
+        try:
+            return self._prompts[name]
+        except KeyError:
+            raise Exception(
+                f"Prompt file {name}{PROMPT_EXTENSION} not found in prompts directory"
+            )
+
+    def templates(self) -> Mapping[str, str]:
+        """Read-only view of all loaded templates"""
+        return self._prompts
+
+
+def registry_from_env(required: Optional[Iterable[str]] = None) -> PromptRegistry:
+    """PromptRegistry configured from PROMPTS_DIR / PROMPT_HOT_RELOAD"""
+    return PromptRegistry(
+        directory=os.getenv("PROMPTS_DIR", PROMPTS_DIR),
+        required=REQUIRED_PROMPTS if required is None else required,
+        hot_reload=os.getenv("PROMPT_HOT_RELOAD", "false") == "true",
+    )
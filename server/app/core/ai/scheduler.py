@@ -0,0 +1,263 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Priority classes, lowest value is served first
+PRIORITIES = {
+    "interactive": 0,  # chat
+    "analysis": 1,  # single analysis requests
+    "bulk": 2,  # batch / background work
+}
+DEFAULT_PRIORITY = "analysis"
+
+# Recent wait times kept for the percentile metrics
+WAIT_SAMPLES = 1024
+
+
+class SchedulerTimeout(Exception):
+    """Raised when a request waited longer than the queue timeout"""
+
+
+class Reservation:
+    """Admission granted to one LLM call"""
+
+    __slots__ = ("priority", "tokens", "waited", "used_tokens")
+
+    def __init__(self, priority: str, tokens: int, waited: float):
+        self.priority = priority
+        self.tokens = tokens
+        self.waited = waited
+        # Set by the caller once the actual usage is known
+        self.used_tokens: Optional[int] = None
+
+
+class _Waiter:
+    __slots__ = ("priority", "tokens", "future", "enqueued_at")
+
+    def __init__(self, priority: str, tokens: int, future: asyncio.Future):
+        self.priority = priority
+        self.tokens = tokens
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class LLMScheduler:
+    """
+    Admission control for outbound LLM calls
+
+    Calls queue by priority class (interactive before analysis before bulk,
+    FIFO within a class) and are admitted while fewer than max_concurrency
+    are running and a token bucket refilled at tokens_per_minute covers the
+    call's estimated tokens. The head of the queue is never skipped, so a
+    large request cannot be starved by smaller ones behind it.
+
+    tokens_per_minute <= 0 disables rate shaping (concurrency cap only).
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        tokens_per_minute: int = 0,
+        queue_timeout: float = 0.0,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.tokens_per_minute = tokens_per_minute
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._queue: List[Any] = []
+        self._seq = itertools.count()
+        self._tokens = float(tokens_per_minute)
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._waits: deque = deque(maxlen=WAIT_SAMPLES)
+        self.stats = {
+            "admitted": 0,
+            "completed": 0,
+            "timeouts": 0,
+            "cancelled": 0,
+            "throttled": 0,
+        }
+
+    def _refill(self, now: float) -> None:
+        if self.tokens_per_minute <= 0:
+            return
+        elapsed = now - self._refilled_at
+        self._refilled_at = now
+        self._tokens = min(
+            float(self.tokens_per_minute),
+            self._tokens + elapsed * self.tokens_per_minute / 60.0,
+        )
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Admit queued waiters while capacity and tokens allow"""
+        now = time.monotonic()
+        self._refill(now)
+        while self._queue and self.active < self.max_concurrency:
+            waiter = self._queue[0][2]
+            if waiter.future.done():
+                # Timed out or cancelled while queued
+                heapq.heappop(self._queue)
+                continue
+
+            delay = self._paused_until - now
+            if self.tokens_per_minute > 0:
+                # A single call may exceed the bucket; let it run once full
+                needed = min(waiter.tokens, self.tokens_per_minute)
+                if self._tokens < needed:
+                    refill_rate = self.tokens_per_minute / 60.0
+                    delay = max(delay, (needed - self._tokens) / refill_rate)
+            if delay > 0:
+                self._schedule(delay)
+                return
+
+            heapq.heappop(self._queue)
+            if self.tokens_per_minute > 0:
+                self._tokens -= waiter.tokens
+            self.active += 1
+            waiter.future.set_result(now - waiter.enqueued_at)
+
+    def _schedule(self, delay: float) -> None:
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                delay, self._on_timer
+            )
+
+    async def acquire(self, priority: str, tokens: int) -> Reservation:
+        """
+        Wait for admission
+
+        Args:
+            priority: Priority class name (see PRIORITIES)
+            tokens: Estimated tokens (prompt + completion) for the call
+
+        Returns:
+            Reservation to pass to release()
+        """
+        if priority not in PRIORITIES:
+            priority = DEFAULT_PRIORITY
+        waiter = _Waiter(
+            priority, tokens, asyncio.get_running_loop().create_future()
+        )
+        heapq.heappush(
+            self._queue, (PRIORITIES[priority], next(self._seq), waiter)
+        )
+        self._dispatch()
+
+        try:
+            if self.queue_timeout > 0:
+                waited = await asyncio.wait_for(
+                    asyncio.shield(waiter.future), self.queue_timeout
+                )
+            else:
+                waited = await waiter.future
+        except BaseException as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitted just as we gave up: hand the slot back
+                self._release_slot()
+            else:
+                waiter.future.cancel()
+                self._dispatch()
+            if isinstance(e, asyncio.TimeoutError):
+                self.stats["timeouts"] += 1
+                raise SchedulerTimeout(
+                    f"LLM request waited more than {self.queue_timeout}s "
+                    f"in the {priority} queue"
+                )
+            self.stats["cancelled"] += 1
+            raise
+
+        self.stats["admitted"] += 1
+        self._waits.append(waited)
+        return Reservation(priority, tokens, waited)
+
+    def _release_slot(self) -> None:
+        self.active -= 1
+        self._dispatch()
+
+    def release(
+        self, reservation: Reservation, used_tokens: Optional[int] = None
+    ) -> None:
+        """
+        Return a slot, crediting back unused estimated tokens
+
+        Args:
+            reservation: Reservation from acquire()
+            used_tokens: Actual tokens used, when known
+        """
+        if used_tokens is not None and self.tokens_per_minute > 0:
+            self._tokens = min(
+                float(self.tokens_per_minute),
+                self._tokens + reservation.tokens - used_tokens,
+            )
+        self.stats["completed"] += 1
+        self._release_slot()
+
+    @asynccontextmanager
+    async def slot(self, priority: str, tokens: int):
+        """async with scheduler.slot(...) as reservation: <call the LLM>"""
+        reservation = await self.acquire(priority, tokens)
+        try:
+            yield reservation
+        finally:
+            self.release(reservation, reservation.used_tokens)
+
+    def throttle(self, seconds: float) -> None:
+        """Stop admitting new calls for a while (e.g. after a 429)"""
+        self.stats["throttled"] += 1
+        self._paused_until = max(
+            self._paused_until, time.monotonic() + seconds
+        )
+        self._tokens = min(self._tokens, 0.0)
+
+    def get_stats(self) -> Dict[str, Any]:
+        depth = {name: 0 for name in PRIORITIES}
+        for _, _, waiter in self._queue:
+            if not waiter.future.done():
+                depth[waiter.priority] += 1
+        waits = sorted(self._waits)
+
+        def pct(p: float) -> float:
+            if not waits:
+                return 0.0
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))], 4)
+
+        self._refill(time.monotonic())
+        return {
+            "max_concurrency": self.max_concurrency,
+            "tokens_per_minute": self.tokens_per_minute,
+            "active": self.active,
+            "queue_depth": sum(depth.values()),
+            "queue_depth_by_priority": depth,
+            "tokens_available": (
+                round(self._tokens) if self.tokens_per_minute > 0 else None
+            ),
+            "wait_seconds": {
+                "p50": pct(0.5),
+                "p95": pct(0.95),
+                "max": round(waits[-1], 4) if waits else 0.0,
+            },
+            **self.stats,
+        }
+
+
+def scheduler_from_env() -> LLMScheduler:
+    """LLMScheduler configured from LLM_* env vars"""
+    return LLMScheduler(
+        max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "4")),
+        tokens_per_minute=int(os.getenv("LLM_TOKENS_PER_MINUTE", "0")),
+        queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", "60")),
+    )
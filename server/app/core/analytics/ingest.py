@@ -0,0 +1,83 @@
+from typing import Any, AsyncIterator, Callable, Dict
+from core.ai.prompt_builder import POSITION_LIST_KEYS, PositionTable, TokenCounter
+from core.analytics.top_earning import TopEarningSummary
+from core.positions.revert import extract_positions
+from core.streaming.json_items import iter_json_items
+
+
+async def ingest_payload(
+    chunks: AsyncIterator[bytes], sink: Callable[[], Any]
+) -> Dict[str, Any]:
+    """
+    Read a JSON object body without materializing its position lists
+
+    Args:
+        chunks: Request body chunks
+        sink: Factory of the object fed (via .add) with every item of a
+            'data'/'positions' list, in place of the list itself
+
+    Returns:
+        Top-level members in body order, position lists replaced by sinks
+
+    Raises:
+        ValueError: When the body is not a well-formed JSON object
+    """
+    data: Dict[str, Any] = {}
+    async for kind, key, value in iter_json_items(chunks, POSITION_LIST_KEYS):
+        if kind == "item":
+            data[key].add(value)
+        elif kind == "items":
+            data[key] = sink()
+        else:
+            data[key] = value
+    return data
+
+
+async def ingest_projected(
+    chunks: AsyncIterator[bytes], prompt_name: str, counter: TokenCounter
+) -> Dict[str, Any]:
+    """
+    Posted payload with its position lists read into PositionTables as
+    they are parsed (same user message as the raw payload)
+
+    Only the rows that fit the prompt's token budget are kept; the rest
+    are folded into running summaries, so memory does not grow with the
+    number of posted positions.
+
+    Args:
+        chunks: Request body chunks
+        prompt_name: Prompt whose columns and token budget apply
+        counter: Token counter of the PromptBuilder that renders the data
+
+    Raises:
+        ValueError: On a malformed body or a position that is not an object
+    """
+    return await ingest_payload(
+        chunks, lambda: PositionTable(prompt_name, counter)
+    )
+
+
+async def ingest_top_earning(
+    chunks: AsyncIterator[bytes], top_n: int = 5, max_pools: int = 10
+) -> Dict[str, Any]:
+    """
+    Streamed counterpart of summarize_top_earning
+
+    Every position is folded into a TopEarningSummary as soon as it is
+    parsed. A payload without positions is returned as posted.
+
+    Raises:
+        ValueError: On a malformed body or a position that is not an object
+    """
+
+    def summary() -> TopEarningSummary:
+        return TopEarningSummary(top_n, max_pools)
+
+    data = await ingest_payload(chunks, summary)
+    positions = extract_positions(data)
+    if isinstance(positions, TopEarningSummary) and positions.count:
+        return positions.result(data.get("total_count", positions.count))
+    return {
+        key: [] if isinstance(value, TopEarningSummary) else value
+        for key, value in data.items()
+    }
@@ -0,0 +1,282 @@
+import heapq
+import os
+from typing import Dict, Any, List, Optional, Tuple
+from dotenv import load_dotenv
+from core.ai.prompt_builder import RunningSummary
+from core.positions.record import PositionRecord
+from core.positions.revert import extract_positions
+
+# Load environment variables
+load_dotenv()
+
+# Metrics ranked for the top/bottom lists
+RANKED_METRICS = ("roi", "apr", "pnl")
+
+# Quantiles reported by each distribution
+QUANTILES = (
+    ("p10", 0.1),
+    ("p25", 0.25),
+    ("median", 0.5),
+    ("p75", 0.75),
+    ("p90", 0.9),
+)
+
+# Values per distribution (IL, ROI, APR) and per group kept exactly
+# before the quantiles become RunningSummary estimates
+TOP_EARNING_EXACT_VALUES = int(os.getenv("TOP_EARNING_EXACT_VALUES", "1000"))
+TOP_EARNING_GROUP_EXACT_VALUES = int(
+    os.getenv("TOP_EARNING_GROUP_EXACT_VALUES", "128")
+)
+
+
+def _round(value: float) -> float:
+    return float(f"{value:.6g}")
+
+
+def _distribution(values: RunningSummary) -> Dict[str, float]:
+    """min, deciles/quartiles, median and max of a column"""
+    if not values.count:
+        return {}
+    return {
+        "min": _round(values.low),
+        **{name: _round(values.quantile(p)) for name, p in QUANTILES},
+        "max": _round(values.high),
+    }
+
+
+class _Group:
+    """Running aggregate for one group (pool, network or fee tier)"""
+
+    __slots__ = ("positions", "in_range", "pnl", "value", "roi", "apr")
+
+    def __init__(self):
+        self.positions = 0
+        self.in_range = 0
+        self.pnl = 0.0
+        self.value = 0.0
+        self.roi = 0.0
+        self.apr = RunningSummary(TOP_EARNING_GROUP_EXACT_VALUES)
+
+    def add(self, in_range: bool, pnl, value, roi, apr) -> None:
+        self.positions += 1
+        self.in_range += 1 if in_range else 0
+        self.pnl += pnl
+        self.value += value
+        self.roi += roi
+        self.apr.add(apr)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "positions": self.positions,
+            "in_range_ratio": _round(self.in_range / self.positions),
+            "total_pnl": _round(self.pnl),
+            "total_value": _round(self.value),
+            "mean_roi": _round(self.roi / self.positions),
+            "median_apr": _round(self.apr.median),
+        }
+
+
+def _grouped(
+    groups: Dict[Any, _Group], label: str, limit: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """Group summaries ordered by total PnL, highest first"""
+    rows = [
+        {label: key, **group.summary()} for key, group in groups.items()
+    ]
+    rows.sort(key=lambda row: row["total_pnl"], reverse=True)
+    return rows[:limit] if limit else rows
+
+
+def can_summarize(data: Any) -> bool:
+    """True when the payload carries a non-empty list of positions"""
+    if not isinstance(data, dict):
+        return False
+    positions = extract_positions(data)
+    return (
+        isinstance(positions, list)
+        and bool(positions)
+        and all(isinstance(p, dict) for p in positions)
+    )
+
+
+class TopEarningSummary:
+    """
+    Running pre-aggregation of a top-earning positions dataset
+
+    Positions are fed one at a time (e.g. straight from a streamed request
+    body) and none is kept: totals and group-bys are running aggregates,
+    the top/bottom lists are bounded heaps and the distributions and
+    group medians are RunningSummary sketches, so memory does not grow
+    with the number of positions (only with the number of distinct
+    groups).
+    """
+
+    def __init__(self, top_n: int = 5, max_pools: int = 10):
+        self.top_n = top_n
+        self.max_pools = max_pools
+        self.count = 0
+        self.in_range = 0
+        self.exited = 0
+        self.profitable = 0
+        # Integer start, like sum(): an all -0.0 column still totals 0.0
+        self.total_pnl = 0
+        self.total_value = 0
+        self.by_network: Dict[Any, _Group] = {}
+        self.by_pool: Dict[Any, _Group] = {}
+        self.by_fee_tier: Dict[Any, _Group] = {}
+        self.negative_il = 0
+        self.il = RunningSummary(TOP_EARNING_EXACT_VALUES)
+        self.roi = RunningSummary(TOP_EARNING_EXACT_VALUES)
+        self.apr = RunningSummary(TOP_EARNING_EXACT_VALUES)
+        # Min-heaps whose root is the entry to evict next; ties keep the
+        # earliest position, as a stable sort of the whole dataset would
+        self._top: Dict[str, List[Tuple[float, int, Dict[str, Any]]]] = {
+            metric: [] for metric in RANKED_METRICS
+        }
+        self._bottom: Dict[str, List[Tuple[float, int, Dict[str, Any]]]] = {
+            metric: [] for metric in RANKED_METRICS
+        }
+
+    def add(self, position: Dict[str, Any]) -> None:
+        """Fold one raw position into the summary"""
+        if not isinstance(position, dict):
+            raise ValueError("Positions must be JSON objects")
+        record = PositionRecord(position)
+        index = self.count
+        self.count += 1
+
+        in_range = bool(record.in_range)
+        self.in_range += 1 if in_range else 0
+        self.exited += 1 if record.exited else 0
+        self.profitable += 1 if record.pnl > 0 else 0
+        self.total_pnl += record.pnl
+        self.total_value += record.underlying_value
+        self.negative_il += 1 if record.il < 0 else 0
+        self.il.add(record.il)
+        self.roi.add(record.roi)
+        self.apr.add(record.apr)
+
+        row = (
+            in_range,
+            record.pnl,
+            record.underlying_value,
+            record.roi,
+            record.apr,
+        )
+        network = record.network or "unknown"
+        self.by_network.setdefault(network, _Group()).add(*row)
+        pool_key = (record.pool, network, record.pair)
+        self.by_pool.setdefault(pool_key, _Group()).add(*row)
+        self.by_fee_tier.setdefault(record.fee_tier, _Group()).add(*row)
+
+        if self.top_n <= 0:
+            return
+        position_row = None
+        for metric in RANKED_METRICS:
+            value = getattr(record, metric)
+            for heap, entry in (
+                (self._top[metric], (value, -index)),
+                (self._bottom[metric], (-value, -index)),
+            ):
+                if len(heap) >= self.top_n and entry <= heap[0][:2]:
+                    continue
+                if position_row is None:
+                    position_row = self._position_row(record)
+                if len(heap) < self.top_n:
+                    heapq.heappush(heap, entry + (position_row,))
+                else:
+                    heapq.heapreplace(heap, entry + (position_row,))
+
+    @staticmethod
+    def _position_row(record: PositionRecord) -> Dict[str, Any]:
+        return {
+            "nft_id": record.nft_id,
+            "pair": record.pair,
+            "network": record.network,
+            "fee_tier": record.fee_tier,
+            "in_range": record.in_range,
+            "age": record.age,
+            "roi": _round(record.roi),
+            "apr": _round(record.apr),
+            "pnl": _round(record.pnl),
+            "il": _round(record.il),
+            "underlying_value": _round(record.underlying_value),
+        }
+
+    def result(self, total_count: Optional[Any] = None) -> Dict[str, Any]:
+        """
+        Summary of the positions added so far
+
+        Args:
+            total_count: Dataset size reported upstream (defaults to the
+                number of positions added)
+
+        Returns:
+            Same shape as summarize_top_earning
+        """
+        n = self.count
+        summary: Dict[str, Any] = {
+            "dataset": {
+                "positions": n,
+                "total_count": n if total_count is None else total_count,
+                "in_range_ratio": _round(self.in_range / n) if n else 0.0,
+                "exited_ratio": _round(self.exited / n) if n else 0.0,
+                "total_pnl": _round(self.total_pnl),
+                "total_value": _round(self.total_value),
+                "profitable_ratio": _round(self.profitable / n) if n else 0.0,
+            },
+        }
+        if not n:
+            return summary
+
+        top_n = self.top_n
+        for metric in RANKED_METRICS:
+            top = sorted(self._top[metric], reverse=True)
+            bottom = sorted(self._bottom[metric], reverse=True)
+            summary[f"top_{top_n}_by_{metric}"] = [entry[2] for entry in top]
+            summary[f"bottom_{top_n}_by_{metric}"] = [
+                entry[2] for entry in bottom
+            ]
+
+        summary["by_network"] = _grouped(self.by_network, "network")
+        summary["by_fee_tier"] = _grouped(self.by_fee_tier, "fee_tier")
+        summary["top_pools"] = []
+        for row in _grouped(self.by_pool, "pool_key", self.max_pools):
+            pool, network, pair = row.pop("pool_key")
+            summary["top_pools"].append(
+                {"pool": pool, "network": network, "pair": pair, **row}
+            )
+        summary["distributions"] = {
+            "il": {
+                **_distribution(self.il),
+                "negative_ratio": _round(self.negative_il / n),
+            },
+            "roi": _distribution(self.roi),
+            "apr": _distribution(self.apr),
+        }
+        return summary
+
+
+def summarize_top_earning(
+    data: Dict[str, Any], top_n: int = 5, max_pools: int = 10
+) -> Dict[str, Any]:
+    """
+    Deterministic pre-aggregation of a top-earning positions dataset
+
+    Everything the top_earning_analyzer prompt asks for that is plain
+    arithmetic is computed here, so the LLM gets a compact summary instead
+    of the raw positions.
+
+    Args:
+        data: Posted payload with a 'data' (or 'positions') list
+        top_n: Length of each top/bottom list
+        max_pools: Pools kept in the per-pool aggregate
+
+    Returns:
+        Summary with dataset totals, top/bottom-N by ROI, APR and PnL,
+        per-network/pool/fee-tier aggregates and the IL distribution
+    """
+    summary = TopEarningSummary(top_n, max_pools)
+    for position in extract_positions(data):
+        summary.add(position)
+    return summary.result(data.get("total_count", summary.count))
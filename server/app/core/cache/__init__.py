@@ -0,0 +1 @@
+# Cache module initialization
@@ -0,0 +1,291 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from typing import (
+    Dict,
+    Any,
+    Awaitable,
+    Callable,
+    Iterable,
+    List,
+    Optional,
+    Set,
+)
+
+
+class CacheEntry:
+    """A cached value with the time it was stored"""
+
+    __slots__ = ("value", "stored_at")
+
+    def __init__(self, value: Any, stored_at: Optional[float] = None):
+        self.value = value
+        self.stored_at = time.time() if stored_at is None else stored_at
+
+    def age(self) -> float:
+        return time.time() - self.stored_at
+
+
+class CacheBackend(ABC):
+    """
+    Storage interface behind TTLCache
+
+    The default MemoryBackend is per-process. A shared backend (e.g. Redis)
+    only needs to implement these three coroutines to let several uvicorn
+    workers share one cache; values must then be JSON-serializable.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        """Stored entry for a key, or None when missing"""
+
+    @abstractmethod
+    async def set(self, key: str, entry: CacheEntry, ttl: float) -> None:
+        """Store an entry; `ttl` is how long the backend may keep it"""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Forget a key (no error when missing)"""
+
+
+class MemoryBackend(CacheBackend):
+    """In-process dict backend with a simple size bound (oldest evicted)"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: Dict[str, CacheEntry] = {}
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        return self._entries.get(key)
+
+    async def set(self, key: str, entry: CacheEntry, ttl: float) -> None:
+        self._entries.pop(key, None)
+        self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.pop(next(iter(self._entries)))
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+
+class TTLCache:
+    """
+    Async TTL cache with single-flight loading and stale-while-revalidate
+
+    - Fresh entries (younger than ttl) are returned directly.
+    - Stale entries (younger than ttl + stale_ttl) are returned immediately
+      while one background refresh reloads them.
+    - Concurrent misses for the same key share a single loader call.
+
+    Loader errors are never cached; they propagate to every waiter.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        stale_ttl: float = 0.0,
+        backend: Optional[CacheBackend] = None,
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.backend = backend or MemoryBackend()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._refreshes: Set[asyncio.Task] = set()
+        self.stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "refreshes": 0,
+            "errors": 0,
+        }
+
+    async def get_or_load(
+        self, key: str, loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        Get a cached value, loading it with loader on a miss
+
+        Args:
+            key: Cache key
+            loader: Zero-argument coroutine factory producing the value
+
+        Returns:
+            The cached or freshly loaded value
+        """
+        entry = await self.backend.get(key)
+        if entry is not None:
+            age = entry.age()
+            if age < self.ttl:
+                self.stats["hits"] += 1
+                return entry.value
+            if age < self.ttl + self.stale_ttl:
+                self.stats["stale_hits"] += 1
+                self._refresh_in_background(key, loader)
+                return entry.value
+
+        self.stats["misses"] += 1
+        # Shield the shared load so a cancelled waiter (e.g. a deadline)
+        # doesn't cancel it for everyone else
+        return await asyncio.shield(self._load(key, loader))
+
+    def _load(
+        self, key: str, loader: Callable[[], Awaitable[Any]]
+    ) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+            return task
+
+        async def run():
+            try:
+                value = await loader()
+            except Exception:
+                self.stats["errors"] += 1
+                raise
+            finally:
+                self._inflight.pop(key, None)
+            await self.backend.set(
+                key, CacheEntry(value), self.ttl + self.stale_ttl
+            )
+            return value
+
+        task = asyncio.create_task(run())
+        # Retrieve the exception even when every waiter has gone away
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._inflight[key] = task
+        return task
+
+    async def get_many_or_load(
+        self,
+        keys: Iterable[str],
+        loader: Callable[[List[str]], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        """
+        Get several cached values, loading every missing key in one call
+
+        Args:
+            keys: Cache keys
+            loader: Coroutine factory taking the missing keys and returning
+                a dict with a value for each of them
+
+        Returns:
+            Dict of key -> value for every requested key
+        """
+        results: Dict[str, Any] = {}
+        waiting: Dict[str, asyncio.Task] = {}
+        missing: List[str] = []
+        stale: List[str] = []
+
+        for key in dict.fromkeys(keys):
+            entry = await self.backend.get(key)
+            if entry is not None:
+                age = entry.age()
+                if age < self.ttl:
+                    self.stats["hits"] += 1
+                    results[key] = entry.value
+                    continue
+                if age < self.ttl + self.stale_ttl:
+                    self.stats["stale_hits"] += 1
+                    results[key] = entry.value
+                    if key not in self._inflight:
+                        stale.append(key)
+                    continue
+
+            self.stats["misses"] += 1
+            task = self._inflight.get(key)
+            if task is not None:
+                self.stats["coalesced"] += 1
+                waiting[key] = task
+            else:
+                missing.append(key)
+
+        if stale:
+            self.stats["refreshes"] += 1
+            self._track_refresh(
+                ",".join(stale), self._load_many(stale, loader)
+            )
+        if missing:
+            batch = self._load_many(missing, loader)
+            for key in missing:
+                waiting[key] = self._inflight[key]
+            await asyncio.shield(batch)
+
+        for key, task in waiting.items():
+            results[key] = await asyncio.shield(task)
+        return results
+
+    def _load_many(
+        self,
+        keys: List[str],
+        loader: Callable[[List[str]], Awaitable[Dict[str, Any]]],
+    ) -> asyncio.Task:
+        async def run():
+            try:
+                values = await loader(keys)
+            except Exception:
+                self.stats["errors"] += 1
+                raise
+            finally:
+                for key in keys:
+                    self._inflight.pop(key, None)
+            for key in keys:
+                await self.backend.set(
+                    key, CacheEntry(values[key]), self.ttl + self.stale_ttl
+                )
+            return values
+
+        batch = asyncio.create_task(run())
+        batch.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+        async def pick(key: str):
+            return (await batch)[key]
+
+        for key in keys:
+            task = asyncio.create_task(pick(key))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        return batch
+
+    def _refresh_in_background(
+        self, key: str, loader: Callable[[], Awaitable[Any]]
+    ) -> None:
+        if key in self._inflight:
+            return
+        self.stats["refreshes"] += 1
+        self._track_refresh(key, self._load(key, loader))
+
+    def _track_refresh(self, label: str, task: asyncio.Task) -> None:
+        self._refreshes.add(task)
+
+        def done(finished: asyncio.Task) -> None:
+            self._refreshes.discard(finished)
+            if not finished.cancelled() and finished.exception() is not None:
+                print(
+                    f"Background refresh of {self.name}:{label} failed: "
+                    f"{finished.exception()}"
+                )
+
+        task.add_done_callback(done)
+
+    async def invalidate(self, key: str) -> None:
+        await self.backend.delete(key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters plus the configured TTLs"""
+        lookups = self.stats["hits"] + self.stats["stale_hits"]
+        lookups += self.stats["misses"]
+        return {
+            "name": self.name,
+            "ttl": self.ttl,
+            "stale_ttl": self.stale_ttl,
+            "inflight": len(self._inflight),
+            "hit_ratio": (
+                (self.stats["hits"] + self.stats["stale_hits"]) / lookups
+                if lookups
+                else 0.0
+            ),
+            **self.stats,
+        }
@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from dotenv import load_dotenv
+from core.jobs.store import DONE, JobStore
+from core.paths import data_path
+from core.serialization import dumps, loads
+
+# Load environment variables
+load_dotenv()
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH") or data_path("jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Seconds finished (done or failed) jobs are kept; 0 keeps them forever
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", str(7 * 24 * 3600)))
+# Seconds between two purges of expired jobs
+JOB_CLEANUP_INTERVAL = float(os.getenv("JOB_CLEANUP_INTERVAL", "3600"))
+
+JobHandler = Callable[[Any, Dict[str, Any]], Awaitable[Any]]
+JobValidator = Callable[[Any, Dict[str, Any]], None]
+
+
+def job_key(kind: str, data: Any, params: Dict[str, Any]) -> str:
+    """Identity of a job: kind plus canonical params and payload"""
+    digest = hashlib.sha256(kind.encode())
+    digest.update(dumps(params, sort_keys=True))
+    digest.update(dumps(data, sort_keys=True))
+    return digest.hexdigest()
+
+
+class JobRunner:
+    """
+    Background workers running stored analysis jobs
+
+    Jobs are persisted before they are queued, so work survives client
+    disconnects, and queued or interrupted jobs are picked up again when
+    the runner starts. At most `workers` jobs run at the same time.
+    """
+
+    def __init__(
+        self,
+        path: str = JOBS_DB_PATH,
+        workers: int = JOB_WORKERS,
+        result_ttl: float = JOB_RESULT_TTL,
+    ):
+        self.path = path
+        self.workers = max(1, workers)
+        self.result_ttl = result_ttl
+        self.store: Optional[JobStore] = None
+        self._handlers: Dict[str, JobHandler] = {}
+        self._validators: Dict[str, JobValidator] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def register(
+        self, kind: str, handler: JobHandler, validate: Optional[JobValidator] = None
+    ) -> None:
+        """
+        Register a job kind
+
+        Args:
+            kind: Name used in the submit endpoint
+            handler: Coroutine (data, params) -> JSON-compatible result
+            validate: Optional check run at submit time; raises ValueError
+        """
+        self._handlers[kind] = handler
+        if validate is not None:
+            self._validators[kind] = validate
+
+    def kinds(self) -> List[str]:
+        return sorted(self._handlers)
+
+    async def start(self) -> None:
+        """Open the store, re-queue unfinished jobs and start the workers"""
+        if self.store is not None:
+            return
+        self.store = JobStore(self.path)
+        self._queue = asyncio.Queue()
+        resumed = self.store.unfinished()
+        for job_id in resumed:
+            self._queue.put_nowait(job_id)
+        if resumed:
+            print(f"Resuming {len(resumed)} unfinished jobs")
+        self._tasks = [
+            asyncio.create_task(self._worker()) for _ in range(self.workers)
+        ]
+        if self.result_ttl > 0:
+            self._tasks.append(asyncio.create_task(self._cleanup()))
+
+    async def aclose(self) -> None:
+        """Stop the workers; jobs still running are resumed on next start"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    def submit(
+        self,
+        kind: str,
+        data: Any,
+        params: Optional[Dict[str, Any]] = None,
+        refresh: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Submit a job, reusing an identical queued, running or finished one
+
+        Args:
+            kind: Registered job kind
+            data: Posted payload
+            params: Handler options (part of the job identity)
+            refresh: Always create a new job, even if an identical one exists
+
+        Returns:
+            Stored job row
+
+        Raises:
+            KeyError: Unknown job kind
+            ValueError: Payload rejected by the kind's validator
+        """
+        if kind not in self._handlers:
+            raise KeyError(kind)
+        params = params or {}
+        if kind in self._validators:
+            self._validators[kind](data, params)
+
+        key = job_key(kind, data, params)
+        if not refresh:
+            existing = self.store.find_by_key(key)
+            if existing is not None:
+                return existing
+
+        job = self.store.create(kind, key, data, params)
+        self._queue.put_nowait(job["id"])
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "result_ttl": self.result_ttl,
+            "kinds": self.kinds(),
+        }
+
+    def purge_expired(self) -> int:
+        """Delete finished jobs older than the result TTL"""
+        if self.store is None or self.result_ttl <= 0:
+            return 0
+        removed = self.store.purge_finished(time.time() - self.result_ttl)
+        if removed:
+            print(f"Purged {removed} expired jobs")
+        return removed
+
+    async def _cleanup(self) -> None:
+        while True:
+            self.purge_expired()
+            await asyncio.sleep(max(1.0, JOB_CLEANUP_INTERVAL))
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        job = self.store.get(job_id)
+        if job is None or job["status"] == DONE:
+            return
+        handler = self._handlers.get(job["kind"])
+        if handler is None:
+            self.store.mark_failed(job_id, f"Unknown job kind {job['kind']}")
+            return
+
+        self.store.mark_running(job_id)
+        try:
+            result = await handler(loads(job["data"]), loads(job["params"]))
+        except asyncio.CancelledError:
+            # Shutdown: the job stays "running" and is resumed on next start
+            raise
+        except Exception as e:
+            print(f"Job {job_id} ({job['kind']}) failed: {str(e)}")
+            self.store.mark_failed(job_id, str(e))
+            return
+        self.store.mark_done(job_id, result)
+
+
+# Shared runner; started and stopped by the app lifespan
+job_runner = JobRunner()
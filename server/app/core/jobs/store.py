@@ -0,0 +1,137 @@
+import sqlite3
+import time
+import uuid
+from typing import Dict, Any, List, Optional
+from core.paths import ensure_parent
+from core.serialization import dumps_str, loads
+
+# Job lifecycle
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Statuses a resubmitted identical job is attached to instead of rerun
+REUSABLE_STATUSES = (QUEUED, RUNNING, DONE)
+
+_COLUMNS = (
+    "id, kind, key, status, data, params, result, error, "
+    "created_at, started_at, finished_at, attempts"
+)
+
+
+class JobStore:
+    """
+    SQLite-backed store of analysis jobs and their results
+
+    The posted payload is stored with the job so unfinished jobs can be
+    re-queued after a restart, and results are kept so an identical job
+    (same key) is answered from the store without recomputing.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        ensure_parent(path)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, key TEXT NOT NULL, "
+            "status TEXT NOT NULL, data TEXT NOT NULL, params TEXT NOT NULL, "
+            "result TEXT, error TEXT, created_at REAL NOT NULL, "
+            "started_at REAL, finished_at REAL, attempts INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+        self._db.commit()
+
+    def create(
+        self, kind: str, key: str, data: Any, params: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Insert a new queued job"""
+        job_id = uuid.uuid4().hex
+        self._db.execute(
+            "INSERT INTO jobs (id, kind, key, status, data, params, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, key, QUEUED, dumps_str(data), dumps_str(params), time.time()),
+        )
+        self._db.commit()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._db.execute(
+            f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def find_by_key(self, key: str) -> Optional[Dict[str, Any]]:
+        """Most recent reusable (queued, running or done) job with this key"""
+        placeholders = ", ".join("?" for _ in REUSABLE_STATUSES)
+        row = self._db.execute(
+            f"SELECT {_COLUMNS} FROM jobs WHERE key = ? AND status IN ({placeholders}) "
+            "ORDER BY created_at DESC LIMIT 1",
+            (key, *REUSABLE_STATUSES),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def unfinished(self) -> List[str]:
+        """Ids of jobs that were queued or running, oldest first"""
+        rows = self._db.execute(
+            "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+            (QUEUED, RUNNING),
+        ).fetchall()
+        return [row["id"] for row in rows]
+
+    def mark_running(self, job_id: str) -> None:
+        self._db.execute(
+            "UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1 "
+            "WHERE id = ?",
+            (RUNNING, time.time(), job_id),
+        )
+        self._db.commit()
+
+    def mark_done(self, job_id: str, result: Any) -> None:
+        self._db.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = NULL, finished_at = ? "
+            "WHERE id = ?",
+            (DONE, dumps_str(result), time.time(), job_id),
+        )
+        self._db.commit()
+
+    def mark_failed(self, job_id: str, error: str) -> None:
+        self._db.execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+            (FAILED, error, time.time(), job_id),
+        )
+        self._db.commit()
+
+    def purge_finished(self, before: float) -> int:
+        """Delete done/failed jobs finished before `before`; returns the count"""
+        cursor = self._db.execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+            (DONE, FAILED, before),
+        )
+        self._db.commit()
+        return cursor.rowcount
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def job_summary(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Public status view of a stored job (no payload or result)"""
+    return {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "error": job["error"],
+        "attempts": job["attempts"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+    }
+
+
+def job_result(job: Dict[str, Any]) -> Any:
+    """Decoded result of a finished job"""
+    return loads(job["result"]) if job["result"] is not None else None
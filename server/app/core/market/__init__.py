@@ -0,0 +1 @@
+# Market module initialization
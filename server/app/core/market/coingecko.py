@@ -0,0 +1,163 @@
+import os
+from typing import Dict, Any, Iterable, List, Optional
+import httpx
+from dotenv import load_dotenv
+from core.cache.ttl import TTLCache
+
+# Load environment variables
+load_dotenv()
+
+# Prices move slowly enough that every request within a minute can share
+# one lookup; stale values are served while a refresh runs in background
+market_cache = TTLCache(
+    "coingecko",
+    ttl=float(os.getenv("MARKET_CACHE_TTL", "60")),
+    stale_ttl=float(os.getenv("MARKET_CACHE_STALE_TTL", "240")),
+)
+
+ETH_ID = "ethereum"
+
+# Map common token addresses to CoinGecko IDs
+# This is a simplified approach - you may want to use a more
+# robust mapping
+TOKEN_ID_MAP = {
+    # WETH on Arbitrum
+    "0x82af49447d8a07e3bd95bd0d56f35241523fbab1": "weth",
+    # USDC on Arbitrum
+    "0xaf88d065e77c8cc2239327c5edb3a432268e5831": "usd-coin",
+    # WBTC on Arbitrum
+    "0x2f2a2543b76a4166549f7aab2e75bef0aefc5b0f": "wrapped-bitcoin",
+    # DAI on Arbitrum
+    "0xda10009cbd5d07dd0cecc66161fc93d7c9000da1": "dai",
+}
+
+# Fallback mapping by token symbol, as reported in Revert `tokens` maps
+SYMBOL_ID_MAP = {
+    "WETH": "weth",
+    "ETH": "ethereum",
+    "USDC": "usd-coin",
+    "USDT": "tether",
+    "WBTC": "wrapped-bitcoin",
+    "DAI": "dai",
+    "ARB": "arbitrum",
+    "OP": "optimism",
+    "LINK": "chainlink",
+    "UNI": "uniswap",
+}
+
+
+def neutral_eth_trend() -> Dict[str, Any]:
+    """Neutral ETH trend used whenever CoinGecko can't be reached in time"""
+    return {
+        "trend": "neutral",
+        "score": 0.5,
+        "price_change_24h": 0,
+        "price_change_7d": 0,
+    }
+
+
+def neutral_sentiment() -> Dict[str, Any]:
+    """Neutral token sentiment used for unknown tokens and failed lookups"""
+    return {"sentiment": "neutral", "score": 0.5}
+
+
+def resolve_token_id(
+    token_address: str, symbol: Optional[str] = None
+) -> Optional[str]:
+    """
+    Resolve a token to its CoinGecko id by address, then by symbol
+
+    Args:
+        token_address: Token contract address
+        symbol: Optional token symbol (e.g. from a Revert `tokens` map)
+
+    Returns:
+        CoinGecko id, or None if the token can't be identified
+    """
+    token_id = TOKEN_ID_MAP.get((token_address or "").lower())
+    if token_id is None and symbol:
+        token_id = SYMBOL_ID_MAP.get(symbol.upper())
+    return token_id
+
+
+async def fetch_price_changes(
+    client: httpx.AsyncClient, token_ids: List[str]
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Fetch raw 24h/7d USD price changes for many CoinGecko ids in one call
+
+    Raises on HTTP errors so failures are never cached.
+
+    Returns:
+        Dict of id -> price data (empty dict for ids CoinGecko didn't return)
+    """
+    url = "/api/v3/simple/price"
+    params = {
+        "ids": ",".join(token_ids),
+        "vs_currencies": "usd",
+        "include_24hr_change": "true",
+        "include_7d_change": "true",
+    }
+    response = await client.get(url, params=params)
+    response.raise_for_status()
+    data = response.json()
+    return {token_id: data.get(token_id, {}) for token_id in token_ids}
+
+
+async def get_price_changes(
+    client: httpx.AsyncClient, token_ids: Iterable[str]
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Cached price changes for many ids; all uncached ids share one call
+
+    Concurrent requests for the same ids are coalesced by the cache.
+    """
+    return await market_cache.get_many_or_load(
+        token_ids, lambda missing: fetch_price_changes(client, missing)
+    )
+
+
+def _weighted_change(price_data: Dict[str, Any]) -> Dict[str, Any]:
+    change_24h = price_data.get("usd_24h_change", 0) or 0
+    change_7d = price_data.get("usd_7d_change", 0) or 0
+
+    # Calculate score (weighted: 24h 60%, 7d 40%)
+    # Normalize to -1 to 1
+    score = (change_24h * 0.6 + change_7d * 0.4) / 100.0
+    score = max(-1.0, min(1.0, score))  # Clamp
+
+    # Convert -1..1 to 0..1 (higher is more bullish)
+    return {
+        "score": (score + 1) / 2.0,
+        "price_change_24h": change_24h,
+        "price_change_7d": change_7d,
+    }
+
+
+def eth_trend_from_prices(price_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Score ETH price changes
+    Returns: {'trend': 'bullish' or 'bearish', 'score': 0.0-1.0,
+    'price_change_24h': float}
+    """
+    weighted = _weighted_change(price_data)
+    trend = "bullish" if weighted["price_change_24h"] > 0 else "bearish"
+    return {"trend": trend, **weighted}
+
+
+def sentiment_from_prices(price_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Score a token's price changes
+    Returns: {'sentiment': 'positive'/'negative'/'neutral', 'score': 0.0-1.0}
+    """
+    weighted = _weighted_change(price_data)
+    normalized_score = weighted["score"]
+
+    if normalized_score > 0.6:
+        sentiment = "positive"
+    elif normalized_score < 0.4:
+        sentiment = "negative"
+    else:
+        sentiment = "neutral"
+
+    return {"sentiment": sentiment, **weighted}
@@ -0,0 +1,170 @@
+import asyncio
+import os
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Tuple
+import httpx
+from dotenv import load_dotenv
+from core.market.coingecko import (
+    ETH_ID,
+    eth_trend_from_prices,
+    get_price_changes,
+    neutral_eth_trend,
+    neutral_sentiment,
+    resolve_token_id,
+    sentiment_from_prices,
+)
+
+# Load environment variables
+load_dotenv()
+
+# Per-call deadline (seconds) for each market data lookup
+MARKET_DATA_DEADLINE = float(os.getenv("MARKET_DATA_DEADLINE", "3.0"))
+
+
+async def with_deadline(
+    call: Awaitable[Any],
+    deadline: float,
+    fallback: Callable[[], Any],
+    label: str,
+) -> Any:
+    """
+    Await a market data call, degrading to its fallback past the deadline
+
+    Args:
+        call: Awaitable producing the market data
+        deadline: Seconds to wait before giving up
+        fallback: Factory for the neutral value to use instead
+        label: Name used in the log line
+
+    Returns:
+        The call result, or the fallback if it failed or missed the deadline
+    """
+    try:
+        return await asyncio.wait_for(call, timeout=deadline)
+    except asyncio.TimeoutError:
+        print(f"{label} missed its {deadline}s deadline, using neutral value")
+        return fallback()
+    except Exception as e:
+        print(f"Error fetching {label}: {e}")
+        return fallback()
+
+
+def collect_token_symbols(
+    positions: Optional[List[Dict[str, Any]]]
+) -> Dict[str, str]:
+    """Address -> symbol for every token in the positions' `tokens` maps"""
+    symbols: Dict[str, str] = {}
+    for position in positions or []:
+        for address, token in (position.get("tokens") or {}).items():
+            symbol = (token or {}).get("symbol")
+            if symbol:
+                symbols[address.lower()] = symbol
+    return symbols
+
+
+def pair_resolvable(token1: str, token2: str) -> bool:
+    """True when both pair tokens map to CoinGecko ids by address alone"""
+    return all(resolve_token_id(t) for t in (token1, token2))
+
+
+async def gather_market_data(
+    client: httpx.AsyncClient,
+    token1: str,
+    token2: str,
+    network: str,
+    positions: Optional[List[Dict[str, Any]]] = None,
+    deadline: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Resolve the ETH trend and pair sentiments with one batched price call
+
+    Every CoinGecko id the request needs (ETH, both pair tokens and any
+    token symbol found in the positions' `tokens` maps) is resolved with a
+    single /simple/price request, then scored the same way as before.
+
+    Args:
+        client: CoinGecko client
+        token1: Address of the first pair token
+        token2: Address of the second pair token
+        network: Blockchain network
+        positions: Optional Revert positions to pull token symbols from
+        deadline: Deadline for the price call, defaults to
+            MARKET_DATA_DEADLINE
+
+    Returns:
+        {'eth_trend': ..., 'token1_sentiment': ..., 'token2_sentiment': ...}
+        plus 'token_sentiments' by symbol when positions are given
+    """
+    results = await gather_pairs_market_data(
+        client, [(token1, token2, network, positions)], deadline
+    )
+    return results[0]
+
+
+async def gather_pairs_market_data(
+    client: httpx.AsyncClient,
+    pairs: List[Tuple[str, str, str, Optional[List[Dict[str, Any]]]]],
+    deadline: Optional[float] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Market data of many pairs from a single batched price call
+
+    The CoinGecko ids of every pair (see gather_market_data) are fetched
+    together, so N pairs cost one /simple/price request instead of N.
+
+    Args:
+        client: CoinGecko client
+        pairs: (token1, token2, network, positions or None) per pair
+        deadline: Deadline for the price call, defaults to
+            MARKET_DATA_DEADLINE
+
+    Returns:
+        One gather_market_data result per pair, in order
+    """
+    if deadline is None:
+        deadline = MARKET_DATA_DEADLINE
+
+    resolved = []
+    ids = [ETH_ID]
+    for token1, token2, network, positions in pairs:
+        symbols = collect_token_symbols(positions)
+        token1_id = resolve_token_id(token1, symbols.get(token1.lower()))
+        token2_id = resolve_token_id(token2, symbols.get(token2.lower()))
+        symbol_ids = {
+            symbol: resolve_token_id(address, symbol)
+            for address, symbol in symbols.items()
+        }
+        resolved.append((symbols, token1_id, token2_id, symbol_ids))
+        ids += [token1_id, token2_id, *symbol_ids.values()]
+
+    prices = await with_deadline(
+        get_price_changes(client, [i for i in ids if i]),
+        deadline,
+        dict,
+        "CoinGecko prices",
+    )
+
+    def sentiment_for(token_id: Optional[str]) -> Dict[str, Any]:
+        if not token_id or token_id not in prices:
+            # Default neutral sentiment if we can't identify the token
+            return neutral_sentiment()
+        return sentiment_from_prices(prices[token_id])
+
+    results = []
+    for symbols, token1_id, token2_id, symbol_ids in resolved:
+        market_data = {
+            "eth_trend": (
+                eth_trend_from_prices(prices[ETH_ID])
+                if ETH_ID in prices
+                else neutral_eth_trend()
+            ),
+            "token1_sentiment": sentiment_for(token1_id),
+            "token2_sentiment": sentiment_for(token2_id),
+        }
+        if symbols:
+            market_data["token_sentiments"] = {
+                symbol: sentiment_for(symbol_ids[symbol])
+                for symbol in sorted(symbol_ids)
+                if symbol_ids[symbol]
+            }
+        results.append(market_data)
+    return results
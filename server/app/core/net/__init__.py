@@ -0,0 +1 @@
+# Net module initialization
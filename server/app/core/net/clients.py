@@ -0,0 +1,104 @@
+import os
+from typing import Dict, Optional
+import httpx
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+REVERT_BASE_URL = "https://api.revert.finance"
+COINGECKO_BASE_URL = "https://api.coingecko.com"
+
+try:
+    import h2  # noqa: F401
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+class HTTPClientRegistry:
+    """
+    Shared, pooled httpx.AsyncClient instances keyed by upstream host
+
+    One client per upstream keeps its connection pool (and TLS sessions)
+    alive across requests, and caps the number of sockets we open to it.
+    Start/stop it from the app lifespan; get() also creates clients lazily
+    so scripts can use the registry without a running app.
+    """
+
+    def __init__(self):
+        self.max_connections = _env_int("HTTP_MAX_CONNECTIONS", 20)
+        self.max_keepalive = _env_int("HTTP_MAX_KEEPALIVE", 10)
+        self.keepalive_expiry = _env_float("HTTP_KEEPALIVE_EXPIRY", 30.0)
+        self.timeout = _env_float("HTTP_TIMEOUT", 10.0)
+        self.connect_timeout = _env_float("HTTP_CONNECT_TIMEOUT", 5.0)
+        self.http2 = HTTP2_AVAILABLE and os.getenv("HTTP2", "true") == "true"
+        self._base_urls: Dict[str, str] = {
+            "revert": REVERT_BASE_URL,
+            "coingecko": COINGECKO_BASE_URL,
+        }
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def register(self, name: str, base_url: str) -> None:
+        """Register (or re-point) a named upstream before it is first used"""
+        self._base_urls[name] = base_url
+
+    def _build_client(self, base_url: str) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=base_url,
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+        )
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """
+        Get the pooled client for a named upstream
+
+        Args:
+            name: Upstream name (e.g. "revert", "coingecko")
+
+        Returns:
+            Shared httpx.AsyncClient for that upstream
+        """
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            base_url: Optional[str] = self._base_urls.get(name)
+            if base_url is None:
+                raise KeyError(f"Unknown upstream client: {name}")
+            client = self._build_client(base_url)
+            self._clients[name] = client
+        return client
+
+    async def start(self) -> None:
+        """Open a client for every registered upstream"""
+        if not HTTP2_AVAILABLE and os.getenv("HTTP2", "true") == "true":
+            print("HTTP2 requested but the h2 package is missing, using HTTP/1.1")
+        for name in self._base_urls:
+            self.get(name)
+
+    async def aclose(self) -> None:
+        """Close all pooled clients"""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
+
+
+# Process-wide registry used by the API handlers
+http_clients = HTTPClientRegistry()
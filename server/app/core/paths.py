@@ -0,0 +1,24 @@
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Directory of the server's SQLite files (jobs, snapshots). Anchored to the
+# app package rather than the working directory, so launching the server or
+# importing main from elsewhere doesn't scatter databases around.
+DATA_DIR = os.getenv("DATA_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data"
+)
+
+
+def data_path(name: str) -> str:
+    """Default path of a data file under DATA_DIR"""
+    return os.path.join(DATA_DIR, name)
+
+
+def ensure_parent(path: str) -> None:
+    """Create the directory a database file goes into, if missing"""
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
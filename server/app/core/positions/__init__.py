@@ -0,0 +1 @@
+# Positions module initialization
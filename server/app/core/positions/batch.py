@@ -0,0 +1,299 @@
+import asyncio
+import os
+from typing import Dict, Any, List, Optional, Tuple
+from dotenv import load_dotenv
+from core.market.gather import gather_pairs_market_data
+from core.net.clients import http_clients
+from core.positions.recommendations import (
+    fetch_query_positions,
+    positions_key,
+    rankings_cache,
+    rankings_key,
+    score_query,
+    scoring_context,
+)
+from core.positions.revert import extract_positions
+from core.positions.scoring import (
+    SCORERS,
+    PositionBatch,
+    ScoreTable,
+    normalize_aggregate_weights,
+)
+
+# Load environment variables
+load_dotenv()
+
+# Pair specs accepted by one batch request
+RECOMMENDATIONS_BATCH_MAX_PAIRS = int(
+    os.getenv("RECOMMENDATIONS_BATCH_MAX_PAIRS", "20")
+)
+
+PAIR_KEYS = ("token1", "token2", "network", "exchange")
+
+
+def batch_pairs(data: Dict[str, Any]) -> List[Dict[str, str]]:
+    """
+    Validate the 'pairs' list of a batch recommendations request
+
+    Returns:
+        Distinct pair specs ({token1, token2, network, exchange}) in order
+
+    Raises:
+        ValueError: When the list is missing, malformed or too long
+    """
+    entries = data.get("pairs")
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("'pairs' must be a non-empty list")
+
+    pairs = []
+    seen = set()
+    for entry in entries:
+        if not isinstance(entry, dict) or not all(
+            isinstance(entry.get(key), str) and entry[key] for key in PAIR_KEYS
+        ):
+            raise ValueError(
+                "Each pair needs token1, token2, network and exchange"
+            )
+        spec = {key: entry[key] for key in PAIR_KEYS}
+        identity = (
+            spec["token1"].lower(),
+            spec["token2"].lower(),
+            spec["network"],
+            spec["exchange"],
+        )
+        if identity not in seen:
+            seen.add(identity)
+            pairs.append(spec)
+
+    if len(pairs) > RECOMMENDATIONS_BATCH_MAX_PAIRS:
+        raise ValueError(
+            f"Too many pairs ({len(pairs)}); at most "
+            f"{RECOMMENDATIONS_BATCH_MAX_PAIRS} per batch"
+        )
+    return pairs
+
+
+def cross_pair_rankings(
+    pairs: List[Tuple[int, List[Dict[str, Any]], Dict[str, Any]]],
+    weights: Tuple[float, float, float],
+    limit: int,
+    aggregate_weights: Dict[str, float],
+) -> Dict[str, Any]:
+    """
+    Rank every pair's positions against each other
+
+    All positions go through one PositionBatch and one ScoreTable, so
+    per-position scores are normalized across pairs, while sentiment and
+    ETH trend keep each pair's own value.
+
+    Args:
+        pairs: (pair index, positions, market data) of every pair with
+            positions
+        weights: Normalized (apr, roi, volume) weights for score_1
+        limit: Positions returned per ranking
+        aggregate_weights: Normalized per-scorer aggregate weights
+
+    Returns:
+        Cross-pair section of the batch response
+    """
+    positions: List[Dict[str, Any]] = []
+    pair_of: List[int] = []
+    segments = []
+    for index, pair_positions, market_data in pairs:
+        positions.extend(pair_positions)
+        pair_of.extend([index] * len(pair_positions))
+        segments.append(
+            (len(pair_positions), scoring_context(weights, market_data))
+        )
+
+    batch = PositionBatch(positions)
+    scores = ScoreTable(batch, segments[0][1], aggregate_weights, segments)
+
+    enriched_positions: Dict[int, Dict[str, Any]] = {}
+
+    def enriched(index: int) -> Dict[str, Any]:
+        if index not in enriched_positions:
+            enriched_pos = scores.enrich(index)
+            enriched_pos.update(scores.scores_at(index))
+            enriched_pos["pair_index"] = pair_of[index]
+            enriched_positions[index] = enriched_pos
+        return enriched_positions[index]
+
+    descriptions = {}
+    for name, scorer in SCORERS.items():
+        if scorer.per_request:
+            descriptions[name] = (
+                f"{name} of each position's own pair "
+                "(see that pair's scoring_methods)"
+            )
+        else:
+            descriptions[name] = (
+                scorer.describe(segments[0][1]) + ", normalized across pairs"
+            )
+    rankings = {
+        f"{name}_ranking": {
+            "description": descriptions[name],
+            "positions": [enriched(i) for i in scores.ranking(name, limit)],
+        }
+        for name in SCORERS
+    }
+    rankings["aggregated_ranking"] = {
+        "description": "Aggregated weighted score across pairs",
+        "positions": [
+            enriched(i) for i in scores.ranking("weighted_score", limit)
+        ],
+    }
+
+    weight_apr, weight_roi, weight_volume = weights
+    return {
+        "pairs": len(pairs),
+        "total_positions": len(batch),
+        "scoring_weights": {
+            "apr": weight_apr,
+            "roi": weight_roi,
+            "volume": weight_volume,
+        },
+        "aggregate_weights": aggregate_weights,
+        "scoring_methods": descriptions,
+        "rankings": rankings,
+    }
+
+
+async def get_batch_recommendations(
+    pairs: List[Dict[str, str]],
+    limit: int,
+    weights: Tuple[float, float, float],
+    age_from: float,
+    age_to: float,
+    aggregate_weights: Optional[Dict[str, float]] = None,
+    source: str = "live",
+    cross_limit: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Recommendations for many pairs at once, plus cross-pair rankings
+
+    Every pair's positions are fetched concurrently over the shared
+    connection pools (and through the same caches as single queries),
+    then the market data of all pairs is resolved with one batched
+    CoinGecko call. Per-pair bodies are the same as
+    /positions/recommendations and share its rankings cache.
+
+    Args:
+        pairs: Pair specs from batch_pairs
+        limit: Positions per ranking, per pair
+        weights: Normalized (apr, roi, volume) weights
+        age_from, age_to: Position age window in days
+        aggregate_weights: Normalized per-scorer aggregate weights
+        source: "live" or "store" (see get_recommendations)
+        cross_limit: Positions per cross-pair ranking (defaults to limit)
+
+    Returns:
+        {'pairs': per-pair bodies (or errors), 'cross_pair': rankings over
+        every pair's positions, or None if no pair has positions}
+    """
+    aggregate_weights = aggregate_weights or normalize_aggregate_weights()
+    raw_keys = [
+        positions_key(
+            pair["token1"],
+            pair["token2"],
+            pair["network"],
+            pair["exchange"],
+            limit,
+            age_from,
+            age_to,
+        )
+        for pair in pairs
+    ]
+    fetched = await asyncio.gather(
+        *(
+            fetch_query_positions(
+                raw_key,
+                pair["token1"],
+                pair["token2"],
+                pair["network"],
+                pair["exchange"],
+                limit,
+                age_from,
+                age_to,
+                None,
+                source,
+            )
+            for raw_key, pair in zip(raw_keys, pairs)
+        ),
+        return_exceptions=True,
+    )
+
+    # One price call covering every pair that has positions
+    with_positions = [
+        index
+        for index, data in enumerate(fetched)
+        if not isinstance(data, BaseException) and extract_positions(data)
+    ]
+    markets = await gather_pairs_market_data(
+        http_clients.get("coingecko"),
+        [
+            (
+                pairs[index]["token1"],
+                pairs[index]["token2"],
+                pairs[index]["network"],
+                extract_positions(fetched[index]),
+            )
+            for index in with_positions
+        ],
+    )
+    market_by_pair = dict(zip(with_positions, markets))
+
+    bodies = []
+    for index, (pair, raw_key, data) in enumerate(zip(pairs, raw_keys, fetched)):
+        if isinstance(data, BaseException):
+            bodies.append(
+                {
+                    "token0": pair["token1"],
+                    "token1": pair["token2"],
+                    "network": pair["network"],
+                    "exchange": pair["exchange"],
+                    "error": str(data),
+                }
+            )
+            continue
+
+        async def compute(
+            pair=pair, raw_key=raw_key, data=data, index=index
+        ) -> Dict[str, Any]:
+            return score_query(
+                raw_key,
+                data,
+                market_by_pair.get(index),
+                weights,
+                limit,
+                pair["token1"],
+                pair["token2"],
+                pair["network"],
+                pair["exchange"],
+                aggregate_weights,
+                source,
+            )
+
+        result = await rankings_cache.get_or_load(
+            rankings_key(raw_key, weights, aggregate_weights, source), compute
+        )
+        # Cached under lowercased addresses; echo the caller's own values
+        body = result["body"]
+        bodies.append({**body, "token0": pair["token1"], "token1": pair["token2"]})
+
+    cross_pair = None
+    if with_positions:
+        cross_pair = cross_pair_rankings(
+            [
+                (index, extract_positions(fetched[index]), market_by_pair[index])
+                for index in with_positions
+            ],
+            weights,
+            limit if cross_limit is None else cross_limit,
+            aggregate_weights,
+        )
+    print(
+        f"Batch recommendations for {len(pairs)} pairs "
+        f"({len(with_positions)} with positions)"
+    )
+    return {"pairs": bodies, "cross_pair": cross_pair}
@@ -0,0 +1,257 @@
+import asyncio
+import os
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Optional,
+    Set,
+    Tuple,
+)
+from dotenv import load_dotenv
+from fastapi import Request
+from core.positions.recommendations import (
+    compact_recommendations,
+    get_recommendations,
+)
+from core.streaming.sse import HEARTBEAT, SSE_HEARTBEAT_INTERVAL, sse_frame
+
+# Load environment variables
+load_dotenv()
+
+# Seconds between two refreshes of a live feed
+LIVE_REFRESH_INTERVAL = float(os.getenv("LIVE_REFRESH_INTERVAL", "15"))
+# Events queued for a slow subscriber before it is resynced with a snapshot
+LIVE_SUBSCRIBER_BUFFER = int(os.getenv("LIVE_SUBSCRIBER_BUFFER", "16"))
+
+# (event name, event id, data)
+FeedEvent = Tuple[str, Optional[int], Dict[str, Any]]
+
+
+def diff_recommendations(
+    old: Dict[str, Any], new: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """
+    Changes between two compact recommendation bodies
+
+    Returns:
+        None if nothing changed, else the top-level fields that changed,
+        'positions' that are new or changed (by nft_id), 'removed' nft_ids
+        no longer in any ranking and the 'rankings' whose order changed
+    """
+    changes: Dict[str, Any] = {}
+    for key, value in new.items():
+        if key not in ("positions", "rankings") and old.get(key) != value:
+            changes[key] = value
+
+    old_positions = old.get("positions") or {}
+    new_positions = new.get("positions") or {}
+    positions = {
+        nft_id: position
+        for nft_id, position in new_positions.items()
+        if old_positions.get(nft_id) != position
+    }
+    removed = [nft_id for nft_id in old_positions if nft_id not in new_positions]
+    old_rankings = old.get("rankings") or {}
+    rankings = {
+        name: ranking
+        for name, ranking in (new.get("rankings") or {}).items()
+        if old_rankings.get(name) != ranking
+    }
+
+    if positions:
+        changes["positions"] = positions
+    if removed:
+        changes["removed"] = removed
+    if rankings:
+        changes["rankings"] = rankings
+    return changes or None
+
+
+class RecommendationFeed:
+    """
+    One shared refresh loop for a recommendations query
+
+    The loop runs while the feed has subscribers. Every refresh goes
+    through get_recommendations (and so its caches), and only the changes
+    since the previous refresh are pushed: a subscriber gets the current
+    compact body as a "snapshot" event when it joins, then "diff" events.
+    A subscriber that falls LIVE_SUBSCRIBER_BUFFER events behind has its
+    backlog replaced with a fresh snapshot.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        load: Callable[[], Awaitable[Dict[str, Any]]],
+        interval: float = LIVE_REFRESH_INTERVAL,
+    ):
+        self.key = key
+        self.load = load
+        self.interval = max(1.0, interval)
+        self.body: Optional[Dict[str, Any]] = None
+        self.version = 0
+        self.subscribers: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"refreshes": 0, "diffs": 0, "errors": 0, "resyncs": 0}
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=LIVE_SUBSCRIBER_BUFFER)
+        if self.body is not None:
+            queue.put_nowait(("snapshot", self.version, self.body))
+        self.subscribers.add(queue)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self.subscribers.discard(queue)
+        if not self.subscribers:
+            self.stop()
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _publish(self, event: FeedEvent) -> None:
+        for queue in self.subscribers:
+            if not queue.full():
+                queue.put_nowait(event)
+                continue
+            # Too far behind for diffs to apply: start over from a snapshot
+            while not queue.empty():
+                queue.get_nowait()
+            resync = event
+            if self.body is not None:
+                resync = ("snapshot", self.version, self.body)
+            queue.put_nowait(resync)
+            self.stats["resyncs"] += 1
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                result = await self.load()
+                body = compact_recommendations(result["body"])
+                self.stats["refreshes"] += 1
+                if self.body is None:
+                    self.version += 1
+                    self.body = body
+                    self._publish(("snapshot", self.version, body))
+                else:
+                    changes = diff_recommendations(self.body, body)
+                    self.body = body
+                    if changes is not None:
+                        self.version += 1
+                        self.stats["diffs"] += 1
+                        self._publish(("diff", self.version, changes))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Live feed {self.key} refresh failed: {str(e)}")
+                self.stats["errors"] += 1
+                self._publish(("error", None, {"error": str(e)}))
+            await asyncio.sleep(self.interval)
+
+
+class LiveFeeds:
+    """Registry of live feeds, one per distinct recommendations query"""
+
+    def __init__(self):
+        self._feeds: Dict[str, RecommendationFeed] = {}
+
+    def feed(
+        self,
+        token1: str,
+        token2: str,
+        network: str,
+        exchange: str,
+        limit: int,
+        weights: Tuple[float, float, float],
+        age_from: float,
+        age_to: float,
+        aggregate_weights: Dict[str, float],
+        source: str = "live",
+    ) -> RecommendationFeed:
+        """Feed of a normalized query, created on first use"""
+        token1 = token1.lower()
+        token2 = token2.lower()
+        key = "|".join(
+            [
+                token1,
+                token2,
+                network,
+                exchange,
+                str(limit),
+                repr(float(age_from)),
+                repr(float(age_to)),
+                ",".join(f"{w:.6f}" for w in weights),
+                ",".join(f"{n}={w:.6f}" for n, w in aggregate_weights.items()),
+                source,
+            ]
+        )
+        feed = self._feeds.get(key)
+        if feed is None:
+
+            def load() -> Awaitable[Dict[str, Any]]:
+                return get_recommendations(
+                    token1,
+                    token2,
+                    network,
+                    exchange,
+                    limit,
+                    weights,
+                    age_from,
+                    age_to,
+                    None,
+                    aggregate_weights,
+                    source,
+                )
+
+            feed = RecommendationFeed(key, load)
+            self._feeds[key] = feed
+        return feed
+
+    async def events(
+        self, feed: RecommendationFeed, request: Optional[Request] = None
+    ) -> AsyncIterator[str]:
+        """SSE frames of one subscription, until the client disconnects"""
+        queue = feed.subscribe()
+        try:
+            while True:
+                try:
+                    event, event_id, data = await asyncio.wait_for(
+                        queue.get(), SSE_HEARTBEAT_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    if request is not None and await request.is_disconnected():
+                        return
+                    yield HEARTBEAT
+                    continue
+                yield sse_frame(data, event_id, event=event)
+        finally:
+            feed.unsubscribe(queue)
+            if not feed.subscribers and self._feeds.get(feed.key) is feed:
+                del self._feeds[feed.key]
+
+    async def aclose(self) -> None:
+        for feed in self._feeds.values():
+            feed.stop()
+        self._feeds.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "feeds": len(self._feeds),
+            "subscribers": sum(len(f.subscribers) for f in self._feeds.values()),
+            "refresh_interval": LIVE_REFRESH_INTERVAL,
+            "by_feed": {
+                key: {"subscribers": len(feed.subscribers), **feed.stats}
+                for key, feed in self._feeds.items()
+            },
+        }
+
+
+# Shared registry; feeds stop with their last subscriber
+live_feeds = LiveFeeds()
@@ -0,0 +1,438 @@
+import bisect
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+from core.positions.scoring import (
+    SCORERS,
+    BatchStats,
+    PositionBatch,
+    scale_column,
+)
+
+# A view is re-sorted from scratch instead of updated in place when more
+# than this fraction of the positions changed since the previous fetch
+REBUILD_FRACTION = 0.25
+
+# (-score, index, key): ascending order is highest score first, ties in
+# the order of the current fetch, as ScoreTable's stable sort keeps them
+Entry = Tuple[float, int, Any]
+
+
+def position_keys(positions: List[Dict[str, Any]]) -> List[Any]:
+    """
+    Stable identity of each position across fetches
+
+    nft_id when present; repeated or missing ids get an occurrence suffix
+    so every position of a fetch has a distinct key.
+    """
+    keys = []
+    seen: Dict[Any, int] = {}
+    for position in positions:
+        key = position.get("nft_id")
+        count = seen.get(key, 0)
+        seen[key] = count + 1
+        if count or key is None:
+            key = (key, count)
+        keys.append(key)
+    return keys
+
+
+class DeltaStats(BatchStats):
+    """
+    BatchStats over the changed rows of an IncrementalRanking
+
+    column() returns the changed rows only, while max/sorted/percentile
+    (and so normalized) describe every position of the ranking. Each
+    global statistic a scorer reads is recorded in `reads`, so the scorer
+    is only rescored for every position when one of them moves.
+    """
+
+    def __init__(self, batch: PositionBatch, ranking: "IncrementalRanking"):
+        super().__init__(batch)
+        self.ranking = ranking
+        self.reads: Set[Tuple[str, str]] = set()
+
+    def max(self, name: str) -> float:
+        self.reads.add((name, "max"))
+        values = self.ranking.sorted_values(name)
+        return values[-1] if values else 0.0
+
+    def sorted(self, name: str) -> List[float]:
+        self.reads.add((name, "sorted"))
+        return self.ranking.sorted_values(name)
+
+    def normalized(self, name: str):
+        peak = self.max(name)
+        return self._cached(
+            (name, "normalized"), lambda: scale_column(self.column(name), peak)
+        )
+
+
+class SortedScores:
+    """One score per position plus the positions ordered by it"""
+
+    __slots__ = ("values", "entries", "order")
+
+    def __init__(self):
+        self.values: Dict[Any, float] = {}
+        self.entries: Dict[Any, Entry] = {}
+        self.order: List[Entry] = []
+
+    def reset(self, values: Dict[Any, float], ties: Dict[Any, int]) -> None:
+        """Replace every score and sort once"""
+        self.values = values
+        self.entries = {
+            key: (-value, ties[key], key) for key, value in values.items()
+        }
+        self.order = sorted(self.entries.values())
+
+    def relabel(self, ties: Dict[Any, int]) -> None:
+        """
+        Move every entry to its key's new fetch index
+
+        Re-sorting the previous order is close to linear: only positions
+        whose relative fetch order changed are out of place.
+        """
+        entries = self.entries
+        for key, entry in entries.items():
+            entries[key] = (entry[0], ties[key], key)
+        self.order = sorted(entries[entry[2]] for entry in self.order)
+
+    def discard(self, key: Any) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            del self.values[key]
+            del self.order[bisect.bisect_left(self.order, entry)]
+
+    def set(self, key: Any, value: float, tie: int) -> None:
+        self.discard(key)
+        entry = (-value, tie, key)
+        self.values[key] = value
+        self.entries[key] = entry
+        bisect.insort(self.order, entry)
+
+    def top(self, k: int) -> List[Any]:
+        return [entry[2] for entry in self.order[: max(k, 0)]]
+
+
+class RankingView:
+    """
+    Scores and sorted orderings of an IncrementalRanking for one
+    combination of score_1 and aggregate weights
+
+    The aggregate is ordered by its per-position part: per-request terms
+    add the same value to every position and don't change the order.
+    """
+
+    def __init__(
+        self,
+        ranking: "IncrementalRanking",
+        context: Dict[str, Any],
+        aggregate_weights: Dict[str, float],
+    ):
+        self.ranking = ranking
+        # Per-position scorers read batch columns and context["weights"]
+        self.context = context
+        self.weights = aggregate_weights
+        self.names = [
+            name for name, scorer in SCORERS.items() if not scorer.per_request
+        ]
+        self.scores = {name: SortedScores() for name in self.names}
+        self.aggregate = SortedScores()
+        self.reads: Dict[str, Set[Tuple[str, str]]] = {}
+        self.rebuild()
+
+    def _compute(
+        self, names: List[str], batch: PositionBatch, keys: List[Any]
+    ) -> Dict[str, Dict[Any, float]]:
+        stats = DeltaStats(batch, self.ranking)
+        columns = {}
+        for name in names:
+            stats.reads = set()
+            column = SCORERS[name].compute(stats, self.context)
+            self.reads[name] = stats.reads
+            columns[name] = dict(zip(keys, column))
+        return columns
+
+    def _partial(self, key: Any) -> float:
+        """Per-position part of the aggregate, summed like ScoreTable does"""
+        total = None
+        for name in self.names:
+            weight = self.weights.get(name, 0.0)
+            if not weight:
+                continue
+            term = self.scores[name].values[key] * weight
+            total = term if total is None else total + term
+        return total or 0.0
+
+    def rebuild(self) -> None:
+        """Score every position and sort every ordering"""
+        keys = self.ranking.order
+        ties = self.ranking.ties
+        columns = self._compute(self.names, self.ranking.full_batch(), keys)
+        for name in self.names:
+            self.scores[name].reset(columns[name], ties)
+        self.aggregate.reset({key: self._partial(key) for key in keys}, ties)
+
+    def update(
+        self,
+        changed: List[Any],
+        delta: PositionBatch,
+        removed: List[Any],
+        moved: Set[Tuple[str, str]],
+        reordered: bool = False,
+    ) -> bool:
+        """
+        Apply one fetch's delta
+
+        Args:
+            changed: Keys of new and updated positions (the rows of `delta`)
+            delta: Batch of the changed positions
+            removed: Keys of positions gone from the fetch
+            moved: Global statistics that changed, as (column, kind)
+            reordered: Whether kept positions changed fetch index
+
+        Returns:
+            Whether the view was rebuilt instead of updated in place
+        """
+        stale = [
+            name for name in self.names if self.reads.get(name, set()) & moved
+        ]
+        if len(changed) + len(removed) > REBUILD_FRACTION * len(self.ranking):
+            self.rebuild()
+            return True
+
+        ties = self.ranking.ties
+        for key in removed:
+            for name in self.names:
+                self.scores[name].discard(key)
+            self.aggregate.discard(key)
+        if reordered:
+            for name in self.names:
+                if name not in stale:
+                    self.scores[name].relabel(ties)
+            if not stale:
+                self.aggregate.relabel(ties)
+
+        # Scorers reading a statistic that moved (e.g. a new APR maximum)
+        # are rescored for every position, the others for the changed rows
+        fresh = [name for name in self.names if name not in stale]
+        if stale:
+            columns = self._compute(
+                stale, self.ranking.full_batch(), self.ranking.order
+            )
+            for name in stale:
+                self.scores[name].reset(columns[name], ties)
+        if fresh and changed:
+            columns = self._compute(fresh, delta, changed)
+            for name in fresh:
+                scores = self.scores[name]
+                for key, value in columns[name].items():
+                    scores.set(key, value, ties[key])
+
+        if stale:
+            self.aggregate.reset(
+                {key: self._partial(key) for key in self.ranking.order}, ties
+            )
+        else:
+            for key in changed:
+                self.aggregate.set(key, self._partial(key), ties[key])
+        return bool(stale)
+
+
+class RankedTable:
+    """
+    ScoreTable-compatible read side of a RankingView for one request
+
+    Positions are addressed by key instead of batch index. Rankings are
+    slices of the view's orderings, so reading the top k
+    costs O(k) whatever the number of positions. Per-request scores come
+    from this request's context.
+    """
+
+    def __init__(
+        self,
+        view: RankingView,
+        context: Dict[str, Any],
+        aggregate_weights: Dict[str, float],
+    ):
+        self.view = view
+        self.state = view.ranking
+        self.n = len(view.ranking)
+        self.weights = aggregate_weights
+        self.constants = {
+            name: scorer.compute(context)
+            for name, scorer in SCORERS.items()
+            if scorer.per_request
+        }
+
+    def enrich(self, key: Any) -> Dict[str, Any]:
+        return self.state.records[key].enriched()
+
+    def scores_at(self, key: Any) -> Dict[str, float]:
+        scores = {}
+        weighted = None
+        # Same terms, in the same order, as ScoreTable's weighted sum
+        for name in SCORERS:
+            if name in self.constants:
+                value = self.constants[name]
+            else:
+                value = self.view.scores[name].values[key]
+            scores[name] = value
+            weight = self.weights.get(name, 0.0)
+            if not weight:
+                continue
+            term = value * weight
+            weighted = term if weighted is None else weighted + term
+        scores["weighted_score"] = weighted or 0.0
+        return scores
+
+    def ranking(self, name: str, k: Optional[int] = None) -> List[Any]:
+        """Keys of the top k positions by a score, highest first"""
+        k = self.n if k is None else k
+        if name in self.constants:
+            # Equal for every position: the fetch order
+            return self.state.order[: max(k, 0)]
+        if name == "weighted_score":
+            return self.view.aggregate.top(k)
+        return self.view.scores[name].top(k)
+
+
+class IncrementalRanking:
+    """
+    Positions of one recommendations query, kept across successive fetches
+
+    apply() diffs a fetch against the previous one (new, updated and
+    removed positions, by nft_id), keeps the sorted column values that
+    scorers normalize against, and updates every view's orderings in
+    place; only scorers whose normalization statistic moved are rescored
+    for all positions.
+    """
+
+    def __init__(self, max_views: int = 8):
+        self.max_views = max_views
+        self.records: Dict[Any, Any] = {}
+        self.rows: Dict[Any, Tuple[float, ...]] = {}
+        # Index of each position in the current fetch (the tie-break)
+        self.ties: Dict[Any, int] = {}
+        self.order: List[Any] = []
+        self.version: Any = None
+        self._sorted: Dict[str, List[float]] = {}
+        self._batch: Optional[PositionBatch] = None
+        self._views: "OrderedDict[Any, RankingView]" = OrderedDict()
+        self.stats = {
+            "fetches": 0,
+            "added": 0,
+            "updated": 0,
+            "removed": 0,
+            "rebuilds": 0,
+        }
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def sorted_values(self, name: str) -> List[float]:
+        """Sorted values of a score column over every position"""
+        if name not in self._sorted:
+            index = PositionBatch.COLUMNS.index(name)
+            self._sorted[name] = sorted(row[index] for row in self.rows.values())
+        return self._sorted[name]
+
+    def full_batch(self) -> PositionBatch:
+        """Batch of every position in fetch order (records are reused)"""
+        if self._batch is None:
+            self._batch = PositionBatch(
+                records=[self.records[key] for key in self.order]
+            )
+        return self._batch
+
+    def apply(self, positions: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Diff a new fetch against the current positions and update all views
+
+        Returns:
+            Counts of added, updated and removed positions
+        """
+        keys = position_keys(positions)
+        changed = []
+        changed_positions = []
+        added = 0
+        for key, position in zip(keys, positions):
+            record = self.records.get(key)
+            if record is None:
+                added += 1
+            elif record.raw == position:
+                continue
+            changed.append(key)
+            changed_positions.append(position)
+        current = set(keys)
+        removed = [key for key in self.records if key not in current]
+        delta = PositionBatch(changed_positions)
+
+        # Keep the sorted columns in step and note which statistics moved
+        peaks = {
+            name: values[-1] if values else None
+            for name, values in self._sorted.items()
+        }
+        touched: Set[str] = set()
+        for index, key in enumerate(changed):
+            row = delta.row(index)
+            old_row = self.rows.get(key)
+            for name, values in self._sorted.items():
+                column = PositionBatch.COLUMNS.index(name)
+                if old_row is not None:
+                    if old_row[column] == row[column]:
+                        continue
+                    del values[bisect.bisect_left(values, old_row[column])]
+                bisect.insort(values, row[column])
+                touched.add(name)
+            self.rows[key] = row
+            self.records[key] = delta.records[index]
+        for key in removed:
+            row = self.rows.pop(key)
+            for name, values in self._sorted.items():
+                column = PositionBatch.COLUMNS.index(name)
+                del values[bisect.bisect_left(values, row[column])]
+                touched.add(name)
+            del self.records[key]
+
+        moved = {(name, "sorted") for name in touched}
+        for name in touched:
+            values = self._sorted[name]
+            if (values[-1] if values else None) != peaks[name]:
+                moved.add((name, "max"))
+
+        ties = {key: index for index, key in enumerate(keys)}
+        reordered = any(
+            self.ties.get(key, index) != index for key, index in ties.items()
+        )
+        self.ties = ties
+        self.order = keys
+        self._batch = None
+        if changed or removed or reordered:
+            for view in self._views.values():
+                if view.update(changed, delta, removed, moved, reordered):
+                    self.stats["rebuilds"] += 1
+
+        self.stats["fetches"] += 1
+        self.stats["added"] += added
+        self.stats["updated"] += len(changed) - added
+        self.stats["removed"] += len(removed)
+        return {
+            "added": added,
+            "updated": len(changed) - added,
+            "removed": len(removed),
+        }
+
+    def table(
+        self, context: Dict[str, Any], aggregate_weights: Dict[str, float]
+    ) -> RankedTable:
+        """Read side for one request, creating the weights' view on first use"""
+        key = (tuple(context["weights"]), tuple(aggregate_weights.items()))
+        view = self._views.get(key)
+        if view is None:
+            view = RankingView(self, context, aggregate_weights)
+            self._views[key] = view
+            if len(self._views) > self.max_views:
+                self._views.popitem(last=False)
+        self._views.move_to_end(key)
+        return RankedTable(view, context, aggregate_weights)
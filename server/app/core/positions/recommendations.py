@@ -0,0 +1,530 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Dict, Any, Callable, List, Optional, Tuple
+from dotenv import load_dotenv
+from core.cache.ttl import TTLCache
+from core.market.gather import gather_market_data, pair_resolvable
+from core.net.clients import http_clients
+from core.positions.ranking import IncrementalRanking
+from core.positions.revert import (
+    build_positions_params,
+    extract_positions,
+    fetch_positions,
+    scan_positions,
+)
+from core.positions.scoring import (
+    SCORERS,
+    PositionBatch,
+    ScoreTable,
+    normalize_aggregate_weights,
+)
+from core.serialization import dumps
+from core.snapshots.ingester import snapshot_ingester
+
+# Load environment variables
+load_dotenv()
+
+# Raw Revert payloads and computed rankings expire independently, so a
+# request that only changes the weights re-scores cached positions
+positions_cache = TTLCache(
+    "revert_positions", ttl=float(os.getenv("REVERT_CACHE_TTL", "30"))
+)
+rankings_cache = TTLCache(
+    "recommendations", ttl=float(os.getenv("RANKINGS_CACHE_TTL", "15"))
+)
+
+# Incrementally maintained rankings, one per normalized query (LRU)
+RANKING_STATES_MAX = int(os.getenv("RANKING_STATES_MAX", "64"))
+ranking_states: "OrderedDict[str, IncrementalRanking]" = OrderedDict()
+
+
+def normalize_weights(
+    weight_apr: float, weight_roi: float, weight_volume: float
+) -> Tuple[float, float, float]:
+    """Normalize weights to sum to 1.0 (left as-is if they sum to 0)"""
+    total_weight = weight_apr + weight_roi + weight_volume
+    if total_weight > 0:
+        weight_apr /= total_weight
+        weight_roi /= total_weight
+        weight_volume /= total_weight
+    return weight_apr, weight_roi, weight_volume
+
+
+def positions_key(
+    token1: str,
+    token2: str,
+    network: str,
+    exchange: str,
+    limit: int,
+    age_from: float,
+    age_to: float,
+    scan: Optional[Dict[str, int]] = None,
+) -> str:
+    """Cache key for the raw Revert positions of a normalized query"""
+    parts = [
+        token1.lower(),
+        token2.lower(),
+        network,
+        exchange,
+        str(limit),
+        repr(float(age_from)),
+        repr(float(age_to)),
+    ]
+    if scan:
+        # Page concurrency doesn't change the result, only how it's fetched
+        parts += ["scan", str(scan["page_size"]), str(scan["max_pages"])]
+    return "|".join(parts)
+
+
+async def load_positions(
+    params: Dict[str, Any], limit: int, scan: Optional[Dict[str, int]] = None
+) -> Dict[str, Any]:
+    """
+    Fetch positions over the shared Revert connection pool, either as one
+    `limit`-sized page or as a bounded top-k scan over many pages
+    """
+    client = http_clients.get("revert")
+    if scan:
+        return await scan_positions(
+            client,
+            params,
+            k=limit,
+            page_size=scan["page_size"],
+            max_pages=scan["max_pages"],
+            concurrency=scan["concurrency"],
+        )
+    return await fetch_positions(client, params)
+
+
+def scoring_context(
+    weights: Tuple[float, float, float], market_data: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Inputs of the scorers and their descriptions for one pair"""
+    eth_trend = market_data["eth_trend"]
+    token1_sentiment = market_data["token1_sentiment"]
+    token2_sentiment = market_data["token2_sentiment"]
+    # Average sentiment for the pair
+    pair_sentiment_score = (
+        token1_sentiment["score"] + token2_sentiment["score"]
+    ) / 2.0
+
+    sentiment_description = (
+        f"Market sentiment (pair average: "
+        f"{token1_sentiment['sentiment']}/"
+        f"{token2_sentiment['sentiment']})"
+    )
+    return {
+        "weights": weights,
+        "pair_sentiment_score": pair_sentiment_score,
+        "eth_trend_score": eth_trend["score"],
+        "eth_trend": eth_trend["trend"],
+        "sentiment_description": sentiment_description,
+        "market_data": market_data,
+    }
+
+
+def build_recommendations(
+    data: Dict[str, Any],
+    market_data: Optional[Dict[str, Any]],
+    weights: Tuple[float, float, float],
+    limit: int,
+    token1: str,
+    token2: str,
+    network: str,
+    exchange: str,
+    aggregate_weights: Optional[Dict[str, float]] = None,
+    ranking: Optional[IncrementalRanking] = None,
+) -> Dict[str, Any]:
+    """
+    Score and rank a Revert payload into the recommendations response
+
+    Args:
+        data: Raw Revert payload
+        market_data: Output of gather_market_data (unused if no positions)
+        weights: Normalized (apr, roi, volume) weights for score_1
+        limit: Positions returned per ranking
+        token1, token2, network, exchange: Echoed query values
+        aggregate_weights: Normalized weight per scorer for the aggregate
+            (defaults to equal weights)
+        ranking: Incremental ranking already holding `data`'s positions;
+            rankings are read from it instead of scoring the whole batch
+
+    Returns:
+        Response body with one ranking per registered scorer and the
+        aggregate
+    """
+    positions = extract_positions(data)
+    if not positions:
+        return {
+            "token0": token1,
+            "token1": token2,
+            "network": network,
+            "exchange": exchange,
+            "positions": [],
+            "message": "No positions found",
+        }
+
+    weight_apr, weight_roi, weight_volume = weights
+    context = scoring_context(weights, market_data)
+    aggregate_weights = aggregate_weights or normalize_aggregate_weights()
+
+    if ranking is not None:
+        # Orderings are maintained across fetches; reading is a slice
+        scores = ranking.table(context, aggregate_weights)
+    else:
+        # Parse every position once into columns and run every registered
+        # scorer over the batch (shared normalization stats), plus the
+        # aggregate
+        scores = ScoreTable(PositionBatch(positions), context, aggregate_weights)
+
+    # Only positions that make it into a ranking are enriched, once each
+    enriched_positions: Dict[Any, Dict[str, Any]] = {}
+
+    def enriched(index: Any) -> Dict[str, Any]:
+        if index not in enriched_positions:
+            enriched_pos = scores.enrich(index)
+            enriched_pos.update(scores.scores_at(index))
+            enriched_positions[index] = enriched_pos
+        return enriched_positions[index]
+
+    # One ranked list per score plus the aggregated one, selecting only
+    # the top `limit` indices
+    def ranked(name: str) -> List[Dict[str, Any]]:
+        return [enriched(i) for i in scores.ranking(name, limit)]
+
+    descriptions = {
+        name: scorer.describe(context) for name, scorer in SCORERS.items()
+    }
+    rankings = {
+        f"{name}_ranking": {
+            "description": descriptions[name],
+            "positions": ranked(name),
+        }
+        for name in SCORERS
+    }
+    ranked_by_weighted = ranked("weighted_score")
+    if aggregate_weights == normalize_aggregate_weights():
+        aggregate_description = (
+            "Aggregated weighted score (equal weights: 0.25 each)"
+        )
+    else:
+        aggregate_description = "Aggregated weighted score (weights: " + ", ".join(
+            f"{name}={weight:g}" for name, weight in aggregate_weights.items()
+        ) + ")"
+    rankings["aggregated_ranking"] = {
+        "description": aggregate_description,
+        "positions": ranked_by_weighted,
+    }
+
+    # Get total count from API response
+    total_count = data.get("total_count", scores.n)
+
+    print(
+        f"Scored {scores.n} positions, "
+        f"returning top {len(ranked_by_weighted)} per ranking"
+    )
+
+    return {
+        "token0": token1,
+        "token1": token2,
+        "network": network,
+        "exchange": exchange,
+        "scoring_weights": {
+            "apr": weight_apr,
+            "roi": weight_roi,
+            "volume": weight_volume,
+        },
+        "aggregate_weights": aggregate_weights,
+        "scoring_methods": descriptions,
+        "market_data": market_data,
+        "total_positions": total_count,
+        "rankings": rankings,
+        # Keep backward compatibility - return aggregated as main positions
+        "position_recommendations": ranked_by_weighted,
+    }
+
+
+def ranking_for(key: str, data: Dict[str, Any]) -> IncrementalRanking:
+    """
+    Incremental ranking of a query, brought up to date with `data`
+
+    A payload is applied once: live payloads are recognized by identity
+    (cache hits return the same object), snapshots by their timestamp.
+    """
+    ranking = ranking_states.get(key)
+    if ranking is None:
+        ranking = IncrementalRanking()
+        ranking_states[key] = ranking
+        if len(ranking_states) > RANKING_STATES_MAX:
+            ranking_states.popitem(last=False)
+    ranking_states.move_to_end(key)
+
+    snapshot = data.get("snapshot")
+    if snapshot is not None:
+        fresh = ranking.version != snapshot["taken_at"]
+        version = snapshot["taken_at"]
+    else:
+        fresh = ranking.version is not data
+        version = data
+    if fresh:
+        delta = ranking.apply(extract_positions(data))
+        ranking.version = version
+        print(
+            f"Re-ranked {len(ranking)} positions: {delta['added']} new, "
+            f"{delta['updated']} updated, {delta['removed']} removed"
+        )
+    return ranking
+
+
+def ranking_stats() -> Dict[str, Any]:
+    """Delta counters summed over the incremental rankings"""
+    totals = {"states": len(ranking_states)}
+    for ranking in ranking_states.values():
+        for name, value in ranking.stats.items():
+            totals[name] = totals.get(name, 0) + value
+    return totals
+
+
+def compact_recommendations(
+    body: Dict[str, Any],
+    position_id: Callable[[Dict[str, Any]], Any] = None,
+) -> Dict[str, Any]:
+    """
+    Compact response shape: every position is emitted once
+
+    Positions go into a `positions` table keyed by nft_id (or by
+    `position_id(position)` when given) and each ranking becomes an
+    ordered `position_ids` list. The legacy `position_recommendations`
+    copy is dropped (it equals `aggregated_ranking`).
+    """
+    rankings = body.get("rankings")
+    if not rankings:
+        return body
+
+    table: Dict[str, Dict[str, Any]] = {}
+    compact_rankings = {}
+    for name, ranking in rankings.items():
+        ids = []
+        for position in ranking["positions"]:
+            if position_id is None:
+                nft_id = position.get("nft_id")
+            else:
+                nft_id = position_id(position)
+            table.setdefault(str(nft_id), position)
+            ids.append(nft_id)
+        compact_rankings[name] = {
+            "description": ranking["description"],
+            "position_ids": ids,
+        }
+
+    compact = {
+        key: value
+        for key, value in body.items()
+        if key not in ("rankings", "position_recommendations")
+    }
+    compact["positions"] = table
+    compact["rankings"] = compact_rankings
+    return compact
+
+
+def compute_etag(body: Dict[str, Any]) -> str:
+    """Weak ETag over the serialized response body"""
+    return f'W/"{hashlib.sha1(dumps(body)).hexdigest()[:20]}"'
+
+
+async def get_recommendations(
+    token1: str,
+    token2: str,
+    network: str,
+    exchange: str,
+    limit: int,
+    weights: Tuple[float, float, float],
+    age_from: float,
+    age_to: float,
+    scan: Optional[Dict[str, int]] = None,
+    aggregate_weights: Optional[Dict[str, float]] = None,
+    source: str = "live",
+) -> Dict[str, Any]:
+    """
+    Cached recommendations for a normalized query
+
+    Args:
+        token1, token2, network, exchange: Pair to rank
+        limit: Positions returned per ranking
+        weights: Normalized (apr, roi, volume) weights
+        age_from, age_to: Position age window in days
+        scan: Optional paginated scan options (page_size, max_pages,
+            concurrency)
+        aggregate_weights: Normalized per-scorer aggregate weights
+        source: "live" to query Revert, or "store" to answer from the
+            local snapshot store (falling back to live for pairs it
+            doesn't cover yet)
+
+    Returns:
+        {'body': response body, 'etag': weak ETag of the body,
+        'source': where the positions came from ("live" or "store")}
+    """
+    raw_key = positions_key(
+        token1, token2, network, exchange, limit, age_from, age_to, scan
+    )
+    aggregate_weights = aggregate_weights or normalize_aggregate_weights()
+    rank_key = rankings_key(raw_key, weights, aggregate_weights, source)
+
+    async def compute() -> Dict[str, Any]:
+        # Start the market data lookup (scores 3 and 4) right away so it
+        # runs concurrently with the Revert fetch. If a pair token is only
+        # identifiable by the symbols in the Revert payload, it has to wait.
+        market_task = None
+        if pair_resolvable(token1, token2):
+            market_task = asyncio.create_task(
+                gather_market_data(
+                    http_clients.get("coingecko"), token1, token2, network
+                )
+            )
+
+        try:
+            data = await fetch_query_positions(
+                raw_key,
+                token1,
+                token2,
+                network,
+                exchange,
+                limit,
+                age_from,
+                age_to,
+                scan,
+                source,
+            )
+        except BaseException:
+            if market_task is not None:
+                market_task.cancel()
+            raise
+
+        positions = extract_positions(data)
+        print(f"Extracted {len(positions)} positions")
+        market_data = None
+        if not positions:
+            if market_task is not None:
+                market_task.cancel()
+        else:
+            # Market data for scoring methods 3 and 4: one batched
+            # CoinGecko call with a deadline, degrading to neutral values
+            # instead of blocking
+            if market_task is None:
+                market_task = asyncio.create_task(
+                    gather_market_data(
+                        http_clients.get("coingecko"),
+                        token1,
+                        token2,
+                        network,
+                        positions=positions,
+                    )
+                )
+            market_data = await market_task
+
+        return score_query(
+            raw_key,
+            data,
+            market_data,
+            weights,
+            limit,
+            token1,
+            token2,
+            network,
+            exchange,
+            aggregate_weights,
+            source,
+        )
+
+    return await rankings_cache.get_or_load(rank_key, compute)
+
+
+def rankings_key(
+    raw_key: str,
+    weights: Tuple[float, float, float],
+    aggregate_weights: Dict[str, float],
+    source: str,
+) -> str:
+    """Cache key for the computed rankings of a normalized query"""
+    return (
+        raw_key
+        + "|"
+        + ",".join(f"{w:.6f}" for w in weights)
+        + "|"
+        + ",".join(f"{n}={w:.6f}" for n, w in aggregate_weights.items())
+        + "|"
+        + source
+    )
+
+
+async def fetch_query_positions(
+    raw_key: str,
+    token1: str,
+    token2: str,
+    network: str,
+    exchange: str,
+    limit: int,
+    age_from: float,
+    age_to: float,
+    scan: Optional[Dict[str, int]] = None,
+    source: str = "live",
+) -> Dict[str, Any]:
+    """
+    Positions payload of a query: the snapshot store when asked for and
+    covering the pair, else the (cached) Revert fetch
+    """
+    if source == "store":
+        data = snapshot_ingester.query(
+            token1, token2, network, exchange, age_from, age_to, limit
+        )
+        if data is not None:
+            return data
+    params = build_positions_params(
+        token1, token2, network, exchange, limit, age_from, age_to
+    )
+    return await positions_cache.get_or_load(
+        raw_key, lambda: load_positions(params, limit, scan)
+    )
+
+
+def score_query(
+    raw_key: str,
+    data: Dict[str, Any],
+    market_data: Optional[Dict[str, Any]],
+    weights: Tuple[float, float, float],
+    limit: int,
+    token1: str,
+    token2: str,
+    network: str,
+    exchange: str,
+    aggregate_weights: Dict[str, float],
+    source: str,
+) -> Dict[str, Any]:
+    """
+    Rank a fetched payload into the cached {'body', 'etag', 'source'}
+    result, through the query's incremental ranking
+    """
+    ranking = None
+    if extract_positions(data):
+        ranking = ranking_for(raw_key + "|" + source, data)
+    body = build_recommendations(
+        data,
+        market_data,
+        weights,
+        limit,
+        token1,
+        token2,
+        network,
+        exchange,
+        aggregate_weights,
+        ranking,
+    )
+    if "snapshot" in data:
+        body["snapshot"] = data["snapshot"]
+    return {
+        "body": body,
+        "etag": compute_etag(body),
+        "source": "store" if "snapshot" in data else "live",
+    }
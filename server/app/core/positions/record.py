@@ -0,0 +1,146 @@
+from typing import Dict, Any, Optional
+from core.positions.revert import pair_label
+
+# performance.hodl fields parsed to floats (Revert sends decimal strings)
+HODL_FIELDS = ("apr", "roi", "pnl", "pool_apr", "fee_apr", "il")
+
+
+class PositionRecord:
+    """
+    One Revert position, parsed once
+
+    Holds the identifying fields as-is and every numeric field used for
+    scoring, enrichment and prompts as a float, so nothing downstream has
+    to re-parse the raw decimal strings. The raw dict is kept for fields
+    that are passed through untouched (tokens map, extra keys).
+    """
+
+    __slots__ = (
+        "raw",
+        "nft_id",
+        "pool",
+        "network",
+        "exchange",
+        "fee_tier",
+        "in_range",
+        "exited",
+        "age",
+        "tick_lower",
+        "tick_upper",
+        "token0",
+        "token1",
+        "_pair",
+        "has_hodl",
+        "apr",
+        "roi",
+        "pnl",
+        "pool_apr",
+        "fee_apr",
+        "il",
+        "has_value",
+        "underlying_value",
+    )
+
+    def __init__(self, position: Dict[str, Any]):
+        get = position.get
+        self.raw = position
+        self.nft_id = get("nft_id")
+        self.pool = get("pool")
+        self.network = get("network")
+        self.exchange = get("exchange")
+        self.fee_tier = get("fee_tier")
+        self.in_range = get("in_range")
+        self.exited = get("exited")
+        self.age = get("age")
+        self.tick_lower = get("tick_lower")
+        self.tick_upper = get("tick_upper")
+        self.token0 = get("token0")
+        self.token1 = get("token1")
+        self._pair = None
+
+        hodl = None
+        performance = get("performance")
+        if performance and "hodl" in performance:
+            hodl = performance["hodl"]
+        # Whether the raw position carried the fields, so enrichment can keep
+        # omitting keys the upstream payload did not have
+        self.has_hodl = hodl is not None
+        if self.has_hodl:
+            hodl_get = hodl.get
+            # Inlined float(value or 0): this runs for every fetched position
+            self.apr = float(hodl_get("apr") or 0)
+            self.roi = float(hodl_get("roi") or 0)
+            self.pnl = float(hodl_get("pnl") or 0)
+            self.pool_apr = float(hodl_get("pool_apr") or 0)
+            self.fee_apr = float(hodl_get("fee_apr") or 0)
+            self.il = float(hodl_get("il") or 0)
+        else:
+            self.apr = self.roi = self.pnl = 0.0
+            self.pool_apr = self.fee_apr = self.il = 0.0
+
+        self.has_value = "underlying_value" in position
+        self.underlying_value = (
+            float(position["underlying_value"] or 0) if self.has_value else 0.0
+        )
+
+    @property
+    def pair(self) -> Optional[str]:
+        """"TOKEN0/TOKEN1" label (None if unknown), resolved on first use"""
+        if self._pair is None:
+            self._pair = pair_label(self.raw) or ""
+        return self._pair or None
+
+    def enriched(self) -> Dict[str, Any]:
+        """Clean dict used in recommendation responses"""
+        enriched_pos = {
+            "nft_id": self.nft_id,
+            "pool": self.pool,
+            "in_range": self.in_range,
+            "age": self.age,
+            "tick_lower": self.tick_lower,
+            "tick_upper": self.tick_upper,
+            "fee_tier": self.fee_tier,
+            "network": self.network,
+            "exchange": self.exchange,
+            "token0": self.token0,
+            "token1": self.token1,
+            "tokens": self.raw.get("tokens", {}),
+        }
+
+        if self.has_hodl:
+            enriched_pos["apr"] = self.apr
+            enriched_pos["roi"] = self.roi
+            enriched_pos["pnl"] = self.pnl
+            enriched_pos["pool_apr"] = self.pool_apr
+            enriched_pos["fee_apr"] = self.fee_apr
+
+        if self.has_value:
+            enriched_pos["underlying_value"] = self.underlying_value
+
+        return enriched_pos
+
+    def prompt_row(self) -> Dict[str, Any]:
+        """
+        Flat row for prompt tables
+
+        Top-level scalar fields, then performance.hodl fields (parsed ones as
+        floats) and the token pair label.
+        """
+        row = {
+            key: value
+            for key, value in self.raw.items()
+            if not isinstance(value, (dict, list))
+        }
+        if row.get("underlying_value") is not None:
+            row["underlying_value"] = self.underlying_value
+        if self.has_hodl:
+            for key, value in self.raw["performance"]["hodl"].items():
+                if key in row:
+                    continue
+                if key in HODL_FIELDS and value is not None:
+                    value = getattr(self, key)
+                row[key] = value
+        if self.pair:
+            row["pair"] = self.pair
+        return row
+
@@ -0,0 +1,201 @@
+import asyncio
+import heapq
+from typing import Dict, Any, List, Optional, Tuple
+import httpx
+from core.serialization import dumps_str, loads
+
+POSITIONS_PATH = "/v1/positions"
+
+
+def build_positions_params(
+    token0: str,
+    token1: str,
+    network: str,
+    exchange: str,
+    limit: int,
+    age_from: float,
+    age_to: float,
+) -> Dict[str, Any]:
+    """
+    Build Revert /v1/positions query params
+
+    Format based on working Revert API example:
+    https://api.revert.finance/v1/positions?offset=0&sort=apr
+    &limit=50&network=arbitrum&with-v4=true
+    IMPORTANT: Revert API is case-sensitive - use lowercase
+    """
+    return {
+        "offset": 0,
+        "sort": "apr",
+        "limit": limit,
+        "network": network,
+        "with-v4": "true",
+        "token0": token0.lower(),  # Convert to lowercase
+        "no-withdrawals": "true",
+        "desc": "true",
+        "exchange": exchange,
+        "page": 1,
+        "token1": token1.lower(),  # Convert to lowercase
+        "age-from": age_from,
+        "age-to": age_to,
+    }
+
+
+def extract_positions(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Revert API returns 'data' field, not 'positions'"""
+    return data.get("data", data.get("positions", []))
+
+
+async def fetch_positions(
+    client: httpx.AsyncClient, params: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Fetch a single page of positions from Revert
+
+    Args:
+        client: Revert client
+        params: Query params from build_positions_params
+
+    Returns:
+        Raw Revert response payload
+    """
+    print("\n=== Calling Revert API ===")
+    print(f"URL: {client.base_url}{POSITIONS_PATH}")
+    print(f"Params: {params}")
+    response = await client.get(POSITIONS_PATH, params=params)
+    print(f"Response status: {response.status_code}")
+    response.raise_for_status()
+    data = loads(response.content)
+
+    # Log response for debugging (only the head of the payload is encoded)
+    preview = {**data, "data": extract_positions(data)[:2]}
+    response_str = dumps_str(preview, indent=True)[:1000]
+    print(f"Revert API Response (first 1000 chars):\n{response_str}...")
+    print(f"\nTotal count from API: {data.get('total_count', 'N/A')}")
+    print(f"Success: {data.get('success', 'N/A')}")
+    return data
+
+
+def pair_label(position: Dict[str, Any]) -> Optional[str]:
+    """"TOKEN0/TOKEN1" symbols from the position's tokens map, if known"""
+    tokens = position.get("tokens") or {}
+    symbols = [
+        (tokens.get(position.get(side)) or {}).get("symbol")
+        for side in ("token0", "token1")
+    ]
+    if all(symbols):
+        return "/".join(symbols)
+    return None
+
+
+def apr_of(position: Dict[str, Any]) -> float:
+    """The field Revert sorts by (sort=apr, desc=true)"""
+    hodl = (position.get("performance") or {}).get("hodl") or {}
+    return float(hodl.get("apr", 0) or 0)
+
+
+async def scan_positions(
+    client: httpx.AsyncClient,
+    params: Dict[str, Any],
+    k: int,
+    page_size: int = 500,
+    max_pages: int = 20,
+    concurrency: int = 4,
+) -> Dict[str, Any]:
+    """
+    Scan many Revert pages and keep only the top-k positions by APR
+
+    Pages are fetched in windows of `concurrency` requests. Each page is
+    folded into a bounded min-heap as soon as it is parsed and then
+    dropped, so memory stays O(k + concurrency * page_size) however many
+    positions are scanned. Since Revert returns positions sorted by APR
+    descending, the scan stops as soon as the heap is full and its k-th
+    APR is at least the last APR seen: no later page can beat it.
+
+    Args:
+        client: Revert client
+        params: Query params from build_positions_params
+        k: Number of positions to keep
+        page_size: Positions per Revert page
+        max_pages: Upper bound on pages fetched
+        concurrency: Pages fetched in parallel
+
+    Returns:
+        Revert-shaped payload ({'total_count', 'data', ...}) holding the
+        top-k positions in APR order, plus 'pages_fetched' and 'scanned'
+    """
+    k = max(k, 1)
+    # A zero-page window would never advance the loop
+    page_size = max(page_size, 1)
+    concurrency = max(concurrency, 1)
+    # Entries are (apr, -seq, position) so ties keep Revert's order
+    heap: List[Tuple[float, int, Dict[str, Any]]] = []
+    seq = 0
+    scanned = 0
+    pages_fetched = 0
+    total_count = None
+    last_apr = None
+    exhausted = False
+
+    async def fetch_page(page: int) -> Dict[str, Any]:
+        page_params = dict(params)
+        # Revert pages by offset; page is kept in step for completeness
+        page_params["offset"] = (page - 1) * page_size
+        page_params["page"] = page
+        page_params["limit"] = page_size
+        response = await client.get(POSITIONS_PATH, params=page_params)
+        response.raise_for_status()
+        return loads(response.content)
+
+    page = 1
+    while page <= max_pages and not exhausted:
+        window = range(page, min(page + concurrency, max_pages + 1))
+        tasks = [asyncio.create_task(fetch_page(p)) for p in window]
+        page += len(tasks)
+
+        try:
+            # Fold pages in order so last_apr is a valid bound
+            for task in tasks:
+                data = await task
+                pages_fetched += 1
+                if total_count is None:
+                    total_count = data.get("total_count")
+
+                positions = extract_positions(data)
+                for position in positions:
+                    apr = apr_of(position)
+                    entry = (apr, -seq, position)
+                    seq += 1
+                    if len(heap) < k:
+                        heapq.heappush(heap, entry)
+                    elif entry > heap[0]:
+                        heapq.heapreplace(heap, entry)
+                    last_apr = apr
+                scanned += len(positions)
+
+                if len(positions) < page_size or (
+                    total_count is not None and scanned >= total_count
+                ):
+                    exhausted = True
+                    break
+
+                # Early stop: later pages only hold APRs <= last_apr
+                if len(heap) >= k and heap[0][0] >= last_apr:
+                    exhausted = True
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    ranked = [entry[2] for entry in sorted(heap, reverse=True)]
+    print(
+        f"Scanned {scanned} positions over {pages_fetched} Revert pages, "
+        f"kept top {len(ranked)}"
+    )
+    return {
+        "success": True,
+        "total_count": total_count if total_count is not None else scanned,
+        "data": ranked,
+        "pages_fetched": pages_fetched,
+        "scanned": scanned,
+    }
@@ -0,0 +1,442 @@
+import heapq
+from array import array
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from core.positions.record import PositionRecord
+
+
+def calculate_age_score(age: float) -> float:
+    """
+    Calculate age-based score for different age ranges
+    Ranges: (0.1-1), (0.1-3), (0.1-7) days
+    Returns aggregated score 0.0-1.0
+    """
+    if age is None or age < 0:
+        return 0.0
+
+    scores = []
+
+    # Score for 0.1-1 day range
+    if 0.1 <= age <= 1.0:
+        # Higher score for newer positions in this range
+        # Linear from 1.0 (at 0.1) to 0.0 (at 1.0)
+        score_1 = 1.0 - (age - 0.1) / 0.9
+        scores.append(score_1)
+    elif age < 0.1:
+        scores.append(1.0)  # Very new positions get max score
+    else:
+        scores.append(0.0)
+
+    # Score for 0.1-3 day range
+    if 0.1 <= age <= 3.0:
+        # Higher score for newer positions
+        # Linear from 1.0 (at 0.1) to 0.0 (at 3.0)
+        score_3 = 1.0 - (age - 0.1) / 2.9
+        scores.append(score_3)
+    elif age < 0.1:
+        scores.append(1.0)
+    else:
+        scores.append(0.0)
+
+    # Score for 0.1-7 day range
+    if 0.1 <= age <= 7.0:
+        # Higher score for newer positions
+        # Linear from 1.0 (at 0.1) to 0.0 (at 7.0)
+        score_7 = 1.0 - (age - 0.1) / 6.9
+        scores.append(score_7)
+    elif age < 0.1:
+        scores.append(1.0)
+    else:
+        scores.append(0.0)
+
+    # Aggregate scores (average with equal weights)
+    if scores:
+        return sum(scores) / len(scores)
+    return 0.0
+
+
+class PositionBatch:
+    """
+    Columnar view over a list of raw Revert positions
+
+    Every position is parsed exactly once into a PositionRecord; the
+    numeric fields used for scoring are laid out as typed arrays, so
+    the scorers can work column-wise instead of re-walking the raw dicts.
+    """
+
+    # Score columns, in the order of row()
+    COLUMNS = (
+        "apr",
+        "roi",
+        "pnl",
+        "pool_apr",
+        "fee_apr",
+        "il",
+        "volume",
+        "age_score",
+    )
+
+    def __init__(
+        self,
+        positions: Optional[List[Dict[str, Any]]] = None,
+        records: Optional[List[PositionRecord]] = None,
+    ):
+        # Already-parsed records are reused as-is instead of re-parsed
+        if records is not None:
+            positions = [record.raw for record in records]
+        else:
+            records = map(PositionRecord, positions)
+        self.positions = positions
+        self.records = []
+        self.apr = array("d")
+        self.roi = array("d")
+        self.pnl = array("d")
+        self.pool_apr = array("d")
+        self.fee_apr = array("d")
+        self.il = array("d")
+        self.volume = array("d")
+        self.age_score = array("d")
+
+        for record in records:
+            self.records.append(record)
+            self.apr.append(record.apr)
+            self.roi.append(record.roi)
+            self.pnl.append(record.pnl)
+            self.pool_apr.append(record.pool_apr)
+            self.fee_apr.append(record.fee_apr)
+            self.il.append(record.il)
+            self.volume.append(record.underlying_value)
+            age = record.age
+            self.age_score.append(
+                0.0 if age is None else calculate_age_score(float(age))
+            )
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def enrich(self, index: int) -> Dict[str, Any]:
+        """Build the clean enriched dict for the position at index"""
+        return self.records[index].enriched()
+
+    def row(self, index: int) -> Tuple[float, ...]:
+        """Score column values of the position at index, in COLUMNS order"""
+        return tuple(getattr(self, name)[index] for name in self.COLUMNS)
+
+
+def scale_column(column: array, peak: float) -> array:
+    """Divide a column by `peak` (all zeros if it is <= 0)"""
+    if peak <= 0:
+        return array("d", bytes(8 * len(column)))
+    return array("d", [value / peak for value in column])
+
+
+def _normalized(column: array) -> array:
+    """Scale a column by its maximum (all zeros if the maximum is <= 0)"""
+    return scale_column(column, max(column) if column else 0.0)
+
+
+class BatchStats:
+    """
+    Normalization statistics of a PositionBatch, computed once per column
+
+    Scorers share one instance per batch, so a column's max, percentiles
+    or normalized copy is computed by whichever scorer asks first and
+    reused by the others.
+    """
+
+    def __init__(self, batch: PositionBatch):
+        self.batch = batch
+        self._cache: Dict[Tuple[str, Any], Any] = {}
+
+    def _cached(self, key: Tuple[str, Any], compute: Callable[[], Any]) -> Any:
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def column(self, name: str) -> array:
+        return getattr(self.batch, name)
+
+    def max(self, name: str) -> float:
+        column = self.column(name)
+        return self._cached((name, "max"), lambda: max(column) if column else 0.0)
+
+    def sorted(self, name: str) -> List[float]:
+        return self._cached((name, "sorted"), lambda: sorted(self.column(name)))
+
+    def percentile(self, name: str, pct: float) -> float:
+        """Nearest-rank percentile (0-100) of a column"""
+        values = self.sorted(name)
+        if not values:
+            return 0.0
+        index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+        return values[index]
+
+    def normalized(self, name: str) -> array:
+        """Column scaled by its maximum (all zeros if the maximum is <= 0)"""
+        return self._cached((name, "normalized"), lambda: _normalized(self.column(name)))
+
+
+class Scorer:
+    """
+    One scoring signal
+
+    Per-position scorers return a column (one value per position) computed
+    from batch columns; per-request scorers return a single value that
+    applies to every position (market-wide signals), so nothing is stored
+    or sorted per position for them.
+    """
+
+    __slots__ = ("name", "description", "inputs", "per_request", "compute")
+
+    def __init__(
+        self,
+        name: str,
+        compute: Callable[..., Any],
+        description: Union[str, Callable[[Dict[str, Any]], str]],
+        inputs: Tuple[str, ...] = (),
+        per_request: bool = False,
+    ):
+        self.name = name
+        self.compute = compute
+        self.description = description
+        self.inputs = inputs
+        self.per_request = per_request
+
+    def describe(self, context: Dict[str, Any]) -> str:
+        if callable(self.description):
+            return self.description(context)
+        return self.description
+
+
+# Registered scorers, in output order
+SCORERS: Dict[str, Scorer] = {}
+
+# Default aggregate weight per scorer (equal weights)
+DEFAULT_AGGREGATE_WEIGHTS: Dict[str, float] = {}
+
+
+def register_scorer(
+    name: str,
+    description: Union[str, Callable[[Dict[str, Any]], str]],
+    inputs: Tuple[str, ...] = (),
+    per_request: bool = False,
+    default_weight: float = 0.0,
+):
+    """
+    Decorator registering a scorer
+
+    Per-position: fn(stats: BatchStats, context) -> array of len(batch)
+    Per-request: fn(context) -> float
+
+    Args:
+        name: Score key in responses (also '<name>_ranking')
+        description: Text, or fn(context) -> text, for scoring_methods
+        inputs: Batch columns (per-position) or context keys it reads
+        per_request: Whether the score is one value for the whole request
+        default_weight: Weight in the aggregate when none is requested
+    """
+
+    def decorator(fn):
+        SCORERS[name] = Scorer(name, fn, description, inputs, per_request)
+        DEFAULT_AGGREGATE_WEIGHTS[name] = default_weight
+        return fn
+
+    return decorator
+
+
+@register_scorer(
+    "score_1",
+    "Current method (APR, ROI, Volume)",
+    inputs=("apr", "roi", "volume"),
+    default_weight=0.25,
+)
+def score_weighted_returns(stats: BatchStats, context: Dict[str, Any]) -> array:
+    """Weighted APR, ROI and volume, each normalized by its batch maximum"""
+    weight_apr, weight_roi, weight_volume = context["weights"]
+    return array(
+        "d",
+        [
+            weight_apr * a + weight_roi * r + weight_volume * v
+            for a, r, v in zip(
+                stats.normalized("apr"),
+                stats.normalized("roi"),
+                stats.normalized("volume"),
+            )
+        ],
+    )
+
+
+@register_scorer(
+    "score_2",
+    "Age-based ranking (0.1-1, 0.1-3, 0.1-7 days)",
+    inputs=("age_score",),
+    default_weight=0.25,
+)
+def score_age(stats: BatchStats, context: Dict[str, Any]) -> array:
+    """Aggregated age-based score, parsed with the batch"""
+    return stats.column("age_score")
+
+
+@register_scorer(
+    "score_3",
+    lambda context: context["sentiment_description"],
+    inputs=("pair_sentiment_score",),
+    per_request=True,
+    default_weight=0.25,
+)
+def score_sentiment(context: Dict[str, Any]) -> float:
+    """Average market sentiment of the pair"""
+    return context["pair_sentiment_score"]
+
+
+@register_scorer(
+    "score_4",
+    lambda context: f"ETH price signal ({context['eth_trend']})",
+    inputs=("eth_trend_score",),
+    per_request=True,
+    default_weight=0.25,
+)
+def score_eth_trend(context: Dict[str, Any]) -> float:
+    """ETH price trend signal"""
+    return context["eth_trend_score"]
+
+
+def normalize_aggregate_weights(
+    weights: Optional[Dict[str, float]] = None,
+) -> Dict[str, float]:
+    """
+    Aggregate weights for every registered scorer, normalized to sum to 1.0
+
+    Scorers missing from `weights` keep their default weight. Raises
+    ValueError for unknown scorer names or negative weights.
+    """
+    merged = dict(DEFAULT_AGGREGATE_WEIGHTS)
+    for name, weight in (weights or {}).items():
+        if name not in SCORERS:
+            raise ValueError(
+                f"Unknown scorer '{name}' (available: {', '.join(SCORERS)})"
+            )
+        if weight < 0:
+            raise ValueError(f"Aggregate weight for '{name}' must be >= 0")
+        merged[name] = weight
+    total = sum(merged.values())
+    if total > 0:
+        merged = {name: weight / total for name, weight in merged.items()}
+    return merged
+
+
+def parse_aggregate_weights(text: Optional[str]) -> Optional[Dict[str, float]]:
+    """Parse 'score_1:0.4,score_3:0.1' into {scorer: weight}"""
+    if not text:
+        return None
+    weights = {}
+    for part in text.split(","):
+        name, sep, value = part.partition(":")
+        if not sep:
+            raise ValueError(f"Expected scorer:weight, got '{part}'")
+        try:
+            weights[name.strip()] = float(value)
+        except ValueError:
+            raise ValueError(f"Invalid weight for '{name.strip()}': {value}")
+    return weights
+
+
+class ScoreTable:
+    """
+    All registered scores for a PositionBatch plus the weighted aggregate
+
+    Per-position scorers produce columns; per-request scorers produce one
+    value each. Normalization stats are shared through one BatchStats.
+
+    A batch holding several pairs' positions passes `segments`, one
+    (length, context) per consecutive run of a pair's positions: per-request
+    scores then differ by pair and are laid out as columns, while
+    per-position scorers normalize across every pair.
+    """
+
+    def __init__(
+        self,
+        batch: PositionBatch,
+        context: Dict[str, Any],
+        aggregate_weights: Optional[Dict[str, float]] = None,
+        segments: Optional[List[Tuple[int, Dict[str, Any]]]] = None,
+    ):
+        self.n = len(batch)
+        self.batch = batch
+        self.stats = BatchStats(batch)
+        self.weights = aggregate_weights or normalize_aggregate_weights()
+        self.columns: Dict[str, array] = {}
+        self.constants: Dict[str, float] = {}
+
+        for name, scorer in SCORERS.items():
+            if not scorer.per_request:
+                self.columns[name] = scorer.compute(self.stats, context)
+            elif segments is None:
+                self.constants[name] = scorer.compute(context)
+            else:
+                column = array("d")
+                for length, segment_context in segments:
+                    column.extend([scorer.compute(segment_context)] * length)
+                self.columns[name] = column
+
+        # Weighted sum in registration order, one pass per weighted score
+        weighted: Optional[List[float]] = None
+        for name in SCORERS:
+            weight = self.weights.get(name, 0.0)
+            if not weight:
+                continue
+            if name in self.constants:
+                term = self.constants[name] * weight
+                if weighted is None:
+                    weighted = [term] * self.n
+                else:
+                    weighted = [total + term for total in weighted]
+            else:
+                column = self.columns[name]
+                if weighted is None:
+                    weighted = [value * weight for value in column]
+                else:
+                    weighted = [
+                        total + value * weight
+                        for total, value in zip(weighted, column)
+                    ]
+        self.weighted_score = array("d", weighted or bytes(8 * self.n))
+
+    def enrich(self, index: int) -> Dict[str, Any]:
+        return self.batch.enrich(index)
+
+    def scores_at(self, index: int) -> Dict[str, float]:
+        scores = {}
+        for name in SCORERS:
+            if name in self.constants:
+                scores[name] = self.constants[name]
+            else:
+                scores[name] = self.columns[name][index]
+        scores["weighted_score"] = self.weighted_score[index]
+        return scores
+
+    def ranking(self, name: str, k: Optional[int] = None) -> List[int]:
+        """
+        Indices of the top k positions by a score, highest first
+
+        A per-request score is equal for every position, so its ranking is
+        the input order and needs no sort.
+        """
+        if name in self.constants:
+            n = self.n if k is None else min(max(k, 0), self.n)
+            return list(range(n))
+        column = self.weighted_score if name == "weighted_score" else self.columns[name]
+        return top_k(column, k)
+
+
+def top_k(values: array, k: Optional[int] = None) -> List[int]:
+    """
+    Indices of the k largest values, highest first
+
+    Ties keep their original order, matching sorted(..., reverse=True)[:k].
+    """
+    n = len(values)
+    if k is None or k >= n:
+        return sorted(range(n), key=values.__getitem__, reverse=True)
+    if k <= 0:
+        return []
+    return heapq.nlargest(k, range(n), key=values.__getitem__)
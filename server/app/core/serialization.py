@@ -0,0 +1,80 @@
+import json
+from typing import Any
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+
+def _default(obj: Any) -> Any:
+    """Objects that know their JSON form (e.g. PositionTable) via to_json()"""
+    to_json = getattr(obj, "to_json", None)
+    if to_json is None:
+        raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+    return to_json()
+
+
+def dumps(obj: Any, indent: bool = False, sort_keys: bool = False) -> bytes:
+    """
+    Serialize to JSON bytes, using orjson when it is installed
+
+    Args:
+        obj: JSON-compatible object (dict keys may be non-strings); other
+            objects are serialized through their to_json() method
+        indent: Pretty-print with 2-space indentation
+        sort_keys: Emit object keys in sorted order (canonical form)
+
+    Returns:
+        UTF-8 encoded JSON
+    """
+    if ORJSON_AVAILABLE:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=_default, option=option)
+    if indent:
+        return json.dumps(
+            obj,
+            indent=2,
+            ensure_ascii=False,
+            sort_keys=sort_keys,
+            default=_default,
+        ).encode("utf-8")
+    return json.dumps(
+        obj,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        sort_keys=sort_keys,
+        default=_default,
+    ).encode("utf-8")
+
+
+def dumps_str(obj: Any, indent: bool = False) -> str:
+    """Same as dumps, decoded to str (for prompts and logging)"""
+    return dumps(obj, indent=indent).decode("utf-8")
+
+
+def loads(data: Any) -> Any:
+    """Parse JSON from bytes or str, using orjson when it is installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered through dumps()
+
+    Return it directly from an endpoint so FastAPI skips jsonable_encoder;
+    the content must already be plain JSON types.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
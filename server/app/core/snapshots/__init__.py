@@ -0,0 +1 @@
+# Snapshots module initialization
@@ -0,0 +1,386 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+from dotenv import load_dotenv
+from core.net.clients import http_clients
+from core.paths import data_path
+from core.positions.revert import (
+    build_positions_params,
+    extract_positions,
+    scan_positions,
+)
+from core.snapshots.store import PairKey, SnapshotStore
+
+# Load environment variables
+load_dotenv()
+
+# Opt-in: ingestion runs background Revert scans for every tracked pair
+SNAPSHOT_ENABLED = os.getenv("SNAPSHOT_ENABLED", "false").lower() == "true"
+SNAPSHOT_DB_PATH = os.getenv("SNAPSHOT_DB_PATH") or data_path("snapshots.sqlite3")
+# Seconds between two ingestions of the same pair
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "300"))
+# Older snapshots are not served; the query falls back to the live API
+SNAPSHOT_MAX_STALENESS = float(os.getenv("SNAPSHOT_MAX_STALENESS", "900"))
+# Age window (days) ingested per pair; wider queries go live
+SNAPSHOT_MAX_AGE_DAYS = float(os.getenv("SNAPSHOT_MAX_AGE_DAYS", "7"))
+# Positions kept per pair (top by APR when the pair has more)
+SNAPSHOT_MAX_POSITIONS = int(os.getenv("SNAPSHOT_MAX_POSITIONS", "5000"))
+SNAPSHOT_PAGE_SIZE = int(os.getenv("SNAPSHOT_PAGE_SIZE", "500"))
+SNAPSHOT_PAGE_CONCURRENCY = int(os.getenv("SNAPSHOT_PAGE_CONCURRENCY", "2"))
+# Pairs picked up on demand are dropped after this many idle days
+SNAPSHOT_IDLE_DAYS = float(os.getenv("SNAPSHOT_IDLE_DAYS", "7"))
+# Always-ingested pairs: network:exchange:token0:token1, comma separated
+SNAPSHOT_PAIRS = os.getenv("SNAPSHOT_PAIRS", "")
+# Pairs tracked at most (SNAPSHOT_PAIRS included); further store-mode
+# queries for untracked pairs are answered live without being tracked
+SNAPSHOT_MAX_PAIRS = int(os.getenv("SNAPSHOT_MAX_PAIRS", "50"))
+# Consecutive failed scans after which an on-demand pair is dropped (a pair
+# whose first scan fails or finds nothing is dropped right away)
+SNAPSHOT_MAX_FAILURES = int(os.getenv("SNAPSHOT_MAX_FAILURES", "3"))
+# Seconds a dropped pair is not tracked again on demand
+SNAPSHOT_RETRY_AFTER = float(os.getenv("SNAPSHOT_RETRY_AFTER", "3600"))
+
+
+def pair_key(token0: str, token1: str, network: str, exchange: str) -> PairKey:
+    """Store key of a recommendations query (tokens in query order)"""
+    return (network, exchange, token0.lower(), token1.lower())
+
+
+def parse_pairs(spec: str) -> List[PairKey]:
+    """
+    Parse SNAPSHOT_PAIRS
+
+    Raises:
+        ValueError: On an entry that is not network:exchange:token0:token1
+    """
+    keys = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        parts = [part.strip() for part in entry.split(":")]
+        if len(parts) != 4 or not all(parts):
+            raise ValueError(
+                f"Invalid snapshot pair '{entry}', "
+                "expected network:exchange:token0:token1"
+            )
+        network, exchange, token0, token1 = parts
+        keys.append(pair_key(token0, token1, network, exchange))
+    return keys
+
+
+class SnapshotIngester:
+    """
+    Background ingestion of Revert positions into a SnapshotStore
+
+    Tracked pairs come from SNAPSHOT_PAIRS and from store-mode queries for
+    pairs that are not covered yet (those are answered live once and
+    ingested right after), up to SNAPSHOT_MAX_PAIRS. Each pair is
+    re-scanned every `interval` seconds over the [0, max_age_days] age
+    window, one pair at a time to stay gentle on Revert. On-demand pairs
+    whose scans keep failing (or find nothing) are dropped again.
+    """
+
+    def __init__(
+        self,
+        path: str = SNAPSHOT_DB_PATH,
+        enabled: bool = SNAPSHOT_ENABLED,
+        interval: float = SNAPSHOT_INTERVAL,
+    ):
+        self.path = path
+        self.enabled = enabled
+        self.interval = max(1.0, interval)
+        self.store: Optional[SnapshotStore] = None
+        self._targets: Dict[PairKey, Dict[str, Any]] = {}
+        # Recently dropped pairs -> time until which they aren't re-tracked
+        self._rejected: "OrderedDict[PairKey, float]" = OrderedDict()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            "store_hits": 0,
+            "live_fallbacks": 0,
+            "ingests": 0,
+            "ingest_failures": 0,
+            "untracked_queries": 0,
+            "dropped_pairs": 0,
+        }
+
+    async def start(self) -> None:
+        """Open the store, load tracked pairs and start ingesting"""
+        if not self.enabled or self.store is not None:
+            return
+        self.store = SnapshotStore(self.path)
+        for target in self.store.targets():
+            key = (
+                target["network"],
+                target["exchange"],
+                target["token0"],
+                target["token1"],
+            )
+            target["seeded"] = False
+            self._targets[key] = target
+        try:
+            seeded = parse_pairs(SNAPSHOT_PAIRS)
+        except ValueError as e:
+            print(f"Ignoring SNAPSHOT_PAIRS: {str(e)}")
+            seeded = []
+        for key in seeded:
+            self._track(key)["seeded"] = True
+        print(f"Snapshot ingester tracking {len(self._targets)} pairs")
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    def query(
+        self,
+        token0: str,
+        token1: str,
+        network: str,
+        exchange: str,
+        age_from: float,
+        age_to: float,
+        limit: int,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Answer a recommendations query from the store
+
+        Returns:
+            Revert-shaped payload plus a 'snapshot' block, or None when the
+            pair's snapshot is missing, stale or doesn't span the age window
+            (an untracked pair starts being ingested)
+        """
+        if self.store is None:
+            self.stats["live_fallbacks"] += 1
+            return None
+        now = time.time()
+        key = pair_key(token0, token1, network, exchange)
+        target = self._targets.get(key)
+        if target is None:
+            if not self._can_track(key, now):
+                self.stats["untracked_queries"] += 1
+                self.stats["live_fallbacks"] += 1
+                return None
+            target = self._track(key)
+            self._wake.set()
+        target["last_requested_at"] = now
+
+        ingested_at = target.get("last_ingested_at")
+        if (
+            ingested_at is None
+            or now - ingested_at > SNAPSHOT_MAX_STALENESS
+            or age_to > SNAPSHOT_MAX_AGE_DAYS
+        ):
+            self.stats["live_fallbacks"] += 1
+            return None
+
+        positions, count = self.store.query(key, age_from, age_to, limit, now)
+        self.stats["store_hits"] += 1
+        return {
+            "success": True,
+            "total_count": count,
+            "data": positions,
+            "snapshot": {
+                "taken_at": ingested_at,
+                "age_seconds": round(now - ingested_at, 3),
+                # False when the pair had more than SNAPSHOT_MAX_POSITIONS
+                # positions and only the top ones by APR were stored
+                "complete": target["complete"],
+            },
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "interval": self.interval,
+            "max_staleness": SNAPSHOT_MAX_STALENESS,
+            "max_age_days": SNAPSHOT_MAX_AGE_DAYS,
+            "max_pairs": SNAPSHOT_MAX_PAIRS,
+            **self.stats,
+            "pairs": [
+                {
+                    key: target.get(key)
+                    for key in (
+                        "network",
+                        "exchange",
+                        "token0",
+                        "token1",
+                        "seeded",
+                        "last_ingested_at",
+                        "positions",
+                        "total_count",
+                        "complete",
+                        "last_error",
+                        "failures",
+                    )
+                }
+                for target in self._targets.values()
+            ],
+        }
+
+    def _can_track(self, key: PairKey, now: float) -> bool:
+        """Whether an on-demand pair may start being ingested"""
+        if len(self._targets) >= SNAPSHOT_MAX_PAIRS:
+            return False
+        retry_at = self._rejected.get(key)
+        if retry_at is not None:
+            if retry_at > now:
+                return False
+            del self._rejected[key]
+        return True
+
+    async def _untrack(self, key: PairKey, reason: str) -> None:
+        """Stop ingesting an on-demand pair and forget its snapshot"""
+        self._targets.pop(key, None)
+        self._rejected[key] = time.time() + SNAPSHOT_RETRY_AFTER
+        self._rejected.move_to_end(key)
+        while len(self._rejected) > SNAPSHOT_MAX_PAIRS:
+            self._rejected.popitem(last=False)
+        self.stats["dropped_pairs"] += 1
+        await asyncio.to_thread(self.store.drop_pair, key)
+        print(f"Stopped ingesting pair {':'.join(key)} ({reason})")
+
+    def _track(self, key: PairKey) -> Dict[str, Any]:
+        target = self._targets.get(key)
+        if target is None:
+            network, exchange, token0, token1 = key
+            target = {
+                "network": network,
+                "exchange": exchange,
+                "token0": token0,
+                "token1": token1,
+                "seeded": False,
+                "last_requested_at": None,
+                "last_attempt_at": None,
+                "last_ingested_at": None,
+                "positions": 0,
+                "total_count": None,
+                "complete": False,
+                "last_error": None,
+                "failures": 0,
+            }
+            self._targets[key] = target
+        return target
+
+    async def _run(self) -> None:
+        while True:
+            self._wake.clear()
+            await self._drop_idle()
+
+            due = [
+                (key, target)
+                for key, target in self._targets.items()
+                if target["last_attempt_at"] is None
+                or time.time() - target["last_attempt_at"] >= self.interval
+            ]
+            # Never-ingested pairs first, then the stalest
+            due.sort(key=lambda item: item[1]["last_attempt_at"] or 0)
+            for key, target in due:
+                await self.ingest(key, target)
+
+            delay = self.interval
+            if self._targets:
+                next_due = min(
+                    (target["last_attempt_at"] or 0) + self.interval
+                    for target in self._targets.values()
+                )
+                delay = min(delay, max(1.0, next_due - time.time()))
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _drop_idle(self) -> None:
+        cutoff = time.time() - SNAPSHOT_IDLE_DAYS * 86400
+        for key, target in list(self._targets.items()):
+            if target["seeded"]:
+                continue
+            last_used = target["last_requested_at"] or target["last_attempt_at"]
+            if last_used is not None and last_used < cutoff:
+                del self._targets[key]
+                await asyncio.to_thread(self.store.drop_pair, key)
+                print(f"Stopped ingesting idle pair {':'.join(key)}")
+
+    async def ingest(self, key: PairKey, target: Dict[str, Any]) -> None:
+        """Scan one pair from Revert and replace its snapshot"""
+        network, exchange, token0, token1 = key
+        started = time.time()
+        target["last_attempt_at"] = started
+        params = build_positions_params(
+            token0,
+            token1,
+            network,
+            exchange,
+            SNAPSHOT_PAGE_SIZE,
+            0,
+            SNAPSHOT_MAX_AGE_DAYS,
+        )
+        try:
+            data = await scan_positions(
+                http_clients.get("revert"),
+                params,
+                k=SNAPSHOT_MAX_POSITIONS,
+                page_size=SNAPSHOT_PAGE_SIZE,
+                max_pages=math.ceil(SNAPSHOT_MAX_POSITIONS / SNAPSHOT_PAGE_SIZE),
+                concurrency=SNAPSHOT_PAGE_CONCURRENCY,
+            )
+            positions = extract_positions(data)
+            # Ages are as of the scan start, so they are never overstated
+            stored = await asyncio.to_thread(
+                self.store.replace_pair, key, positions, started
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Snapshot of {':'.join(key)} failed: {str(e)}")
+            self.stats["ingest_failures"] += 1
+            target["last_error"] = str(e)
+            target["failures"] = target.get("failures", 0) + 1
+            if not target["seeded"] and (
+                target["last_ingested_at"] is None
+                or target["failures"] >= SNAPSHOT_MAX_FAILURES
+            ):
+                await self._untrack(key, "ingestion failed")
+                return
+            await asyncio.to_thread(self.store.save_target, target)
+            return
+
+        if (
+            not positions
+            and not target["seeded"]
+            and target["last_ingested_at"] is None
+        ):
+            # Unknown token, network or exchange: nothing worth re-scanning
+            await self._untrack(key, "no positions")
+            return
+
+        self.stats["ingests"] += 1
+        target.update(
+            {
+                "last_ingested_at": started,
+                "positions": stored,
+                "total_count": data.get("total_count"),
+                "complete": len(positions) >= (data.get("total_count") or 0),
+                "last_error": None,
+                "failures": 0,
+            }
+        )
+        await asyncio.to_thread(self.store.save_target, target)
+        print(
+            f"Snapshot of {':'.join(key)}: {stored} positions "
+            f"in {time.time() - started:.2f}s"
+        )
+
+
+# Shared ingester; started and stopped by the app lifespan
+snapshot_ingester = SnapshotIngester()
@@ -0,0 +1,213 @@
+import sqlite3
+import threading
+from typing import Dict, Any, List, Tuple
+from core.paths import ensure_parent
+from core.serialization import dumps_str, loads
+
+# (network, exchange, token0, token1), tokens lowercased like Revert queries
+PairKey = Tuple[str, str, str, str]
+
+_TARGET_COLUMNS = (
+    "network, exchange, token0, token1, seeded, last_requested_at, "
+    "last_attempt_at, last_ingested_at, positions, total_count, complete, "
+    "last_error"
+)
+
+
+class SnapshotStore:
+    """
+    SQLite store of Revert position snapshots, one snapshot per pair
+
+    Each ingested position is stored whole (JSON) next to the columns the
+    recommendations query filters on. Age is stored as the time the
+    position was opened, so the (token0, token1, network, exchange,
+    opened_at) index answers any age window at query time without
+    rewriting rows as they get older.
+
+    Writes run on their own connection (from a worker thread) and reads on
+    another; with WAL journaling readers keep seeing the last committed
+    snapshot while a pair is being replaced.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        ensure_parent(path)
+        self._write_lock = threading.Lock()
+        self._writer = sqlite3.connect(path, check_same_thread=False)
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._writer.execute(
+            "CREATE TABLE IF NOT EXISTS positions ("
+            "network TEXT NOT NULL, exchange TEXT NOT NULL, "
+            "token0 TEXT NOT NULL, token1 TEXT NOT NULL, "
+            "nft_id TEXT NOT NULL, opened_at REAL NOT NULL, "
+            "rank INTEGER NOT NULL, position TEXT NOT NULL, "
+            "PRIMARY KEY (network, exchange, token0, token1, nft_id))"
+        )
+        self._writer.execute(
+            "CREATE INDEX IF NOT EXISTS positions_pair_age "
+            "ON positions (token0, token1, network, exchange, opened_at)"
+        )
+        self._writer.execute(
+            "CREATE TABLE IF NOT EXISTS targets ("
+            "network TEXT NOT NULL, exchange TEXT NOT NULL, "
+            "token0 TEXT NOT NULL, token1 TEXT NOT NULL, "
+            "seeded INTEGER NOT NULL DEFAULT 0, last_requested_at REAL, "
+            "last_attempt_at REAL, last_ingested_at REAL, "
+            "positions INTEGER NOT NULL DEFAULT 0, total_count INTEGER, "
+            "complete INTEGER NOT NULL DEFAULT 0, last_error TEXT, "
+            "PRIMARY KEY (network, exchange, token0, token1))"
+        )
+        self._writer.commit()
+        self._reader = sqlite3.connect(path, check_same_thread=False)
+        self._reader.row_factory = sqlite3.Row
+
+    def targets(self) -> List[Dict[str, Any]]:
+        """Every tracked pair with its ingestion state"""
+        rows = self._reader.execute(
+            f"SELECT {_TARGET_COLUMNS} FROM targets"
+        ).fetchall()
+        targets = []
+        for row in rows:
+            target = dict(row)
+            target["seeded"] = bool(target["seeded"])
+            target["complete"] = bool(target["complete"])
+            targets.append(target)
+        return targets
+
+    def save_target(self, target: Dict[str, Any]) -> None:
+        """Insert or update a tracked pair"""
+        values = [
+            target["network"],
+            target["exchange"],
+            target["token0"],
+            target["token1"],
+            int(bool(target.get("seeded"))),
+            target.get("last_requested_at"),
+            target.get("last_attempt_at"),
+            target.get("last_ingested_at"),
+            target.get("positions", 0),
+            target.get("total_count"),
+            int(bool(target.get("complete"))),
+            target.get("last_error"),
+        ]
+        placeholders = ", ".join("?" for _ in values)
+        with self._write_lock:
+            self._writer.execute(
+                f"INSERT OR REPLACE INTO targets ({_TARGET_COLUMNS}) "
+                f"VALUES ({placeholders})",
+                values,
+            )
+            self._writer.commit()
+
+    def drop_pair(self, key: PairKey) -> None:
+        """Forget a pair and its snapshot"""
+        with self._write_lock:
+            for table in ("positions", "targets"):
+                self._writer.execute(
+                    f"DELETE FROM {table} WHERE network = ? AND exchange = ? "
+                    "AND token0 = ? AND token1 = ?",
+                    key,
+                )
+            self._writer.commit()
+
+    def replace_pair(
+        self, key: PairKey, positions: List[Dict[str, Any]], taken_at: float
+    ) -> int:
+        """
+        Atomically replace a pair's snapshot
+
+        Args:
+            key: Pair the positions were fetched for
+            positions: Revert positions in APR order
+            taken_at: When the positions (and their ages) were fetched
+
+        Returns:
+            Number of positions stored (those without an age are skipped)
+        """
+        rows = []
+        for rank, position in enumerate(positions):
+            age = position.get("age")
+            if age is None or position.get("nft_id") is None:
+                continue
+            rows.append(
+                (
+                    *key,
+                    str(position["nft_id"]),
+                    taken_at - float(age) * 86400,
+                    rank,
+                    dumps_str(position),
+                )
+            )
+
+        with self._write_lock:
+            try:
+                self._writer.execute(
+                    "DELETE FROM positions WHERE network = ? AND exchange = ? "
+                    "AND token0 = ? AND token1 = ?",
+                    key,
+                )
+                self._writer.executemany(
+                    "INSERT OR REPLACE INTO positions (network, exchange, "
+                    "token0, token1, nft_id, opened_at, rank, position) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._writer.commit()
+            except BaseException:
+                self._writer.rollback()
+                raise
+        return len(rows)
+
+    def query(
+        self,
+        key: PairKey,
+        age_from: float,
+        age_to: float,
+        limit: int,
+        now: float,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Top positions of a pair in an age window, in APR order
+
+        Args:
+            key: Pair to read
+            age_from, age_to: Position age window in days, as of `now`
+            limit: Positions returned
+            now: Reference time for ages
+
+        Returns:
+            (positions with 'age' updated to `now`, positions in the window)
+        """
+        network, exchange, token0, token1 = key
+        # age = (now - opened_at) / 1 day, so the window is a range on opened_at
+        bounds = (
+            token0,
+            token1,
+            network,
+            exchange,
+            now - age_to * 86400,
+            now - age_from * 86400,
+        )
+        where = (
+            "WHERE token0 = ? AND token1 = ? AND network = ? AND exchange = ? "
+            "AND opened_at BETWEEN ? AND ?"
+        )
+        count = self._reader.execute(
+            f"SELECT COUNT(*) FROM positions {where}", bounds
+        ).fetchone()[0]
+        rows = self._reader.execute(
+            f"SELECT opened_at, position FROM positions {where} "
+            "ORDER BY rank LIMIT ?",
+            (*bounds, limit),
+        ).fetchall()
+
+        positions = []
+        for row in rows:
+            position = loads(row["position"])
+            position["age"] = (now - row["opened_at"]) / 86400
+            positions.append(position)
+        return positions, count
+
+    def close(self) -> None:
+        self._reader.close()
+        self._writer.close()
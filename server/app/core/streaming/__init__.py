@@ -0,0 +1 @@
+# Streaming module initialization
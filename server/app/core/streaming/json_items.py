@@ -0,0 +1,312 @@
+import os
+import re
+from typing import Any, AsyncIterator, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+from core.serialization import loads
+
+# Load environment variables
+load_dotenv()
+
+# Largest single value (one array item or top-level member) held in memory
+JSON_STREAM_MAX_VALUE_BYTES = int(
+    os.getenv("JSON_STREAM_MAX_VALUE_BYTES", str(1024 * 1024))
+)
+
+# Deepest nesting accepted in one value (deeper input is rejected before
+# it reaches the decoder)
+JSON_STREAM_MAX_DEPTH = int(os.getenv("JSON_STREAM_MAX_DEPTH", "64"))
+
+# (kind, key, value): kind is "member" for a whole top-level member,
+# "items" when a streamed array starts and "item" for each of its elements
+JSONEvent = Tuple[str, str, Any]
+
+_WHITESPACE = re.compile(rb"[ \t\r\n]*")
+# Unrolled loops (no per-byte alternation), so sre scans runs at once
+_STRING = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+# Rest of a string up to its closing quote, or to a trailing backslash
+# whose escaped byte has not arrived yet
+_STRING_BODY = re.compile(rb'[^"\\]*(?:\\.[^"\\]*)*', re.S)
+_SCALAR = re.compile(rb"[^ \t\r\n,\]}]*")
+# Everything up to the next bracket, skipping over complete strings; stops
+# at the opening quote of a string that has not fully arrived yet
+_RUN = rb'[^"\[\]{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{}]*)*'
+_NESTED = re.compile(_RUN, re.S)
+# Depth of the nested values matched by one regex call (deeper or
+# incomplete ones are scanned bracket by bracket)
+_BALANCED_DEPTH = 6
+
+
+def _balanced(depth: int) -> "re.Pattern[bytes]":
+    """A complete array/object nesting at most `depth` levels"""
+    pattern = rb"[\[{]" + _RUN + rb"[\]}]"
+    for _ in range(depth - 1):
+        pattern = rb"[\[{]" + _RUN + rb"(?:" + pattern + _RUN + rb")*[\]}]"
+    return re.compile(pattern, re.S)
+
+
+_BALANCED = _balanced(_BALANCED_DEPTH)
+
+# Parser states
+_START = 0
+_FIRST_KEY = 1
+_KEY = 2
+_COLON = 3
+_VALUE = 4
+_AFTER_VALUE = 5
+_FIRST_ITEM = 6
+_ITEM = 7
+_AFTER_ITEM = 8
+_DONE = 9
+
+
+class JSONItemParser:
+    """
+    Incremental parser for a JSON object body
+
+    Bytes are fed as they arrive. Top-level members are decoded whole,
+    except arrays under one of `item_keys`, whose elements are decoded and
+    emitted one at a time. Only the value being read is buffered, so
+    memory is bounded by the largest single item, not by the body size.
+    """
+
+    def __init__(self, item_keys: Iterable[str]):
+        self.item_keys = frozenset(item_keys)
+        self._buf = bytearray()
+        self._pos = 0
+        # Body bytes already dropped from the buffer (for error offsets)
+        self._offset = 0
+        self._state = _START
+        self._key: Optional[str] = None
+        # Resumable scan of a value split across chunks
+        self._scan = 0
+        self._depth = 0
+        self._in_string = False
+
+    def feed(self, chunk: bytes, final: bool = False) -> List[JSONEvent]:
+        """
+        Consume the next chunk of the body
+
+        Args:
+            chunk: Raw bytes (may split values, strings or escapes)
+            final: True once the body has ended
+
+        Returns:
+            Events completed by this chunk, in body order
+
+        Raises:
+            ValueError: On malformed JSON, a non-object body, a truncated
+                body or a value larger than JSON_STREAM_MAX_VALUE_BYTES
+        """
+        self._buf += chunk
+        events: List[JSONEvent] = []
+        while self._step(events, final):
+            pass
+
+        if self._pos:
+            del self._buf[: self._pos]
+            self._offset += self._pos
+            self._scan = max(0, self._scan - self._pos)
+            self._pos = 0
+        if final and (self._state != _DONE or self._buf):
+            raise ValueError("Truncated JSON body")
+        return events
+
+    def _step(self, events: List[JSONEvent], final: bool) -> bool:
+        """Advance by one token; False when more input is needed"""
+        buf = self._buf
+        self._pos = _WHITESPACE.match(buf, self._pos).end()
+        if self._pos >= len(buf):
+            return False
+        char = buf[self._pos : self._pos + 1]
+        state = self._state
+
+        if state == _START:
+            self._expect(char, b"{", "a JSON object")
+            self._state = _FIRST_KEY
+        elif state in (_FIRST_KEY, _KEY):
+            if state == _FIRST_KEY and char == b"}":
+                self._pos += 1
+                self._state = _DONE
+                return True
+            self._expect(char, b'"', "an object key", advance=False)
+            end = self._value_end(final)
+            if end is None:
+                return False
+            self._key = loads(bytes(buf[self._pos : end]))
+            self._pos = end
+            self._state = _COLON
+        elif state == _COLON:
+            self._expect(char, b":", "':'")
+            self._state = _VALUE
+        elif state == _VALUE:
+            if char == b"[" and self._key in self.item_keys:
+                self._pos += 1
+                events.append(("items", self._key, None))
+                self._state = _FIRST_ITEM
+                return True
+            end = self._value_end(final)
+            if end is None:
+                return False
+            events.append(
+                ("member", self._key, loads(bytes(buf[self._pos : end])))
+            )
+            self._pos = end
+            self._state = _AFTER_VALUE
+        elif state == _AFTER_VALUE:
+            if char == b"}":
+                self._state = _DONE
+            else:
+                self._expect(char, b",", "',' or '}'", advance=False)
+                self._state = _KEY
+            self._pos += 1
+        elif state in (_FIRST_ITEM, _ITEM):
+            if state == _FIRST_ITEM and char == b"]":
+                self._pos += 1
+                self._state = _AFTER_VALUE
+                return True
+            end = self._value_end(final)
+            if end is None:
+                return False
+            events.append(("item", self._key, loads(bytes(buf[self._pos : end]))))
+            self._pos = end
+            self._state = _AFTER_ITEM
+        elif state == _AFTER_ITEM:
+            if char == b"]":
+                self._state = _AFTER_VALUE
+            else:
+                self._expect(char, b",", "',' or ']'", advance=False)
+                self._state = _ITEM
+            self._pos += 1
+        else:
+            raise ValueError("Unexpected data after the JSON object")
+        return True
+
+    def _expect(
+        self, char: bytes, expected: bytes, label: str, advance: bool = True
+    ) -> None:
+        if char != expected:
+            raise ValueError(
+                f"Expected {label} at byte {self._offset + self._pos}, "
+                f"got {char.decode(errors='replace')!r}"
+            )
+        if advance:
+            self._pos += 1
+
+    def _value_end(self, final: bool) -> Optional[int]:
+        """
+        End offset of the value starting at _pos, None if incomplete
+
+        An incomplete value is never rescanned: the scan stops at a safe
+        point (outside an escape) and resumes there from _scan with the
+        next chunk, so reading a value costs time linear in its size.
+        """
+        buf = self._buf
+        start = self._pos
+        first = buf[start : start + 1]
+        end = None
+
+        if first in (b"{", b"[", b'"'):
+            if not self._scan:
+                if first == b'"':
+                    match = _STRING.match(buf, start)
+                else:
+                    match = _BALANCED.match(buf, start)
+                if match:
+                    return match.end()
+                self._scan = start + 1 if first == b'"' else start
+                self._in_string = first == b'"'
+            end = self._scan_composite(len(buf))
+        else:
+            i = max(self._scan, start)
+            end = _SCALAR.match(buf, i).end()
+            if end == start:
+                raise ValueError(
+                    f"Unexpected {first.decode(errors='replace')!r} at byte "
+                    f"{self._offset + start} of the JSON body"
+                )
+            if end == len(buf) and not final:
+                # The number or literal may continue in the next chunk
+                self._scan = end
+                end = None
+            else:
+                self._scan = 0
+
+        if end is None:
+            if final:
+                raise ValueError("Truncated JSON body")
+            if len(buf) - start > JSON_STREAM_MAX_VALUE_BYTES:
+                raise ValueError(
+                    f"JSON value larger than {JSON_STREAM_MAX_VALUE_BYTES} bytes"
+                )
+        return end
+
+    def _scan_composite(self, size: int) -> Optional[int]:
+        """Resume scanning a string, array or object from _scan"""
+        buf = self._buf
+        i = self._scan
+        depth = self._depth
+        in_string = self._in_string
+        end = None
+        while True:
+            if in_string:
+                i = _STRING_BODY.match(buf, i).end()
+                if i >= size or buf[i : i + 1] == b"\\":
+                    # Needs more input (possibly the rest of an escape)
+                    break
+                i += 1
+                in_string = False
+                if depth == 0:
+                    end = i
+                    break
+                continue
+            i = _NESTED.match(buf, i).end()
+            if i >= size:
+                break
+            char = buf[i : i + 1]
+            i += 1
+            if char == b'"':
+                in_string = True
+            elif char in (b"{", b"["):
+                depth += 1
+                if depth > JSON_STREAM_MAX_DEPTH:
+                    raise ValueError(
+                        f"JSON nested deeper than {JSON_STREAM_MAX_DEPTH} levels"
+                    )
+            else:
+                depth -= 1
+                if depth == 0:
+                    end = i
+                    break
+
+        if end is None:
+            self._scan = i
+            self._depth = depth
+            self._in_string = in_string
+        else:
+            self._scan = 0
+            self._depth = 0
+            self._in_string = False
+        return end
+
+
+async def iter_json_items(
+    chunks: AsyncIterator[bytes], item_keys: Iterable[str]
+) -> AsyncIterator[JSONEvent]:
+    """
+    Parse a streamed JSON object body incrementally
+
+    Args:
+        chunks: Body chunks (e.g. Request.stream())
+        item_keys: Top-level keys whose arrays are emitted item by item
+
+    Yields:
+        ("member", key, value), ("items", key, None) and ("item", key,
+        value) events in body order
+    """
+    parser = JSONItemParser(item_keys)
+    async for chunk in chunks:
+        if chunk:
+            for event in parser.feed(chunk):
+                yield event
+    for event in parser.feed(b"", final=True):
+        yield event
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+from dotenv import load_dotenv
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from core.serialization import dumps_str
+
+# Load environment variables
+load_dotenv()
+
+# Seconds without output before a heartbeat comment is sent
+SSE_HEARTBEAT_INTERVAL = float(os.getenv("SSE_HEARTBEAT_INTERVAL", "15"))
+# Token deltas arriving within this window (seconds) share one frame
+SSE_COALESCE_WINDOW = float(os.getenv("SSE_COALESCE_WINDOW", "0.05"))
+# Upper bound on the text carried by one frame
+SSE_MAX_FRAME_CHARS = int(os.getenv("SSE_MAX_FRAME_CHARS", "1024"))
+# Chunks read ahead of a slow client before the upstream is paused
+SSE_BUFFER_CHUNKS = 256
+
+HEARTBEAT = ": heartbeat\n\n"
+
+_END = object()
+
+
+def sse_frame(
+    data: Dict[str, Any], event_id: Optional[int] = None, event: Optional[str] = None
+) -> str:
+    """Encode one server-sent event"""
+    frame = ""
+    if event_id is not None:
+        frame += f"id: {event_id}\n"
+    if event is not None:
+        frame += f"event: {event}\n"
+    return frame + f"data: {dumps_str(data)}\n\n"
+
+
+async def sse_events(
+    chunks: AsyncIterator[str], request: Optional[Request] = None
+) -> AsyncIterator[str]:
+    """
+    Turn a stream of text deltas into SSE frames
+
+    Deltas are read by a background task into a bounded buffer (so a slow
+    client pauses the upstream instead of growing memory) and everything
+    that arrives within SSE_COALESCE_WINDOW is sent as one
+    {"content": ...} frame. Idle periods produce heartbeat comments, and
+    the upstream iterator is closed as soon as the client disconnects.
+    Errors are sent as an {"error": ...} frame; the stream ends with a
+    "done" event.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=SSE_BUFFER_CHUNKS)
+
+    async def pump() -> None:
+        try:
+            async for chunk in chunks:
+                await queue.put(chunk)
+        except Exception as e:
+            await queue.put(e)
+        finally:
+            await queue.put(_END)
+
+    reader = asyncio.ensure_future(pump())
+    event_id = 0
+    finished = False
+    try:
+        while not finished:
+            try:
+                item = await asyncio.wait_for(queue.get(), SSE_HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                if request is not None and await request.is_disconnected():
+                    return
+                yield HEARTBEAT
+                continue
+
+            # Coalesce deltas that arrive shortly after the first one
+            parts = []
+            size = 0
+            deadline = time.monotonic() + SSE_COALESCE_WINDOW
+            error = None
+            while True:
+                if item is _END:
+                    finished = True
+                    break
+                if isinstance(item, Exception):
+                    error = item
+                    break
+                parts.append(item)
+                size += len(item)
+                remaining = deadline - time.monotonic()
+                if size >= SSE_MAX_FRAME_CHARS or remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            if parts:
+                event_id += 1
+                yield sse_frame({"content": "".join(parts)}, event_id)
+            if error is not None:
+                event_id += 1
+                yield sse_frame({"error": str(error)}, event_id)
+
+        event_id += 1
+        yield sse_frame({"done": True}, event_id, event="done")
+    finally:
+        # Client gone (cancelled) or stream over: stop reading the upstream
+        reader.cancel()
+        try:
+            await reader
+        except (asyncio.CancelledError, Exception):
+            pass
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+def event_stream_response(frames: AsyncIterator[str]) -> StreamingResponse:
+    """StreamingResponse serving already-encoded SSE frames"""
+    return StreamingResponse(
+        frames,
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Disable proxy buffering (nginx) so frames are flushed
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+def sse_response(
+    chunks: AsyncIterator[str], request: Optional[Request] = None
+) -> StreamingResponse:
+    """StreamingResponse serving text deltas as text/event-stream"""
+    return event_stream_response(sse_events(chunks, request))
@@ -0,0 +1,104 @@
+"""
+Benchmark: fresh httpx.AsyncClient per call vs the shared pooled registry
+
+Starts a local keep-alive HTTP stub and fires concurrent GETs through both
+strategies, reporting p50/p99 latency per call.
+
+Usage (from server/):
+    python tests/benchmarks/bench_http_pool.py --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "app"))
+
+from core.net.clients import HTTPClientRegistry  # noqa: E402
+
+BODY = b'{"ethereum": {"usd": 3000.0, "usd_24h_change": 1.2}}'
+
+
+async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Minimal HTTP/1.1 keep-alive stub returning a CoinGecko-like body"""
+    try:
+        while True:
+            request = await reader.readuntil(b"\r\n\r\n")
+            if not request:
+                break
+            # Simulate a little upstream work
+            await asyncio.sleep(0.002)
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: application/json\r\n"
+                b"Content-Length: " + str(len(BODY)).encode() + b"\r\n"
+                b"Connection: keep-alive\r\n\r\n" + BODY
+            )
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionResetError):
+        pass
+    finally:
+        writer.close()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(strategy, base_url, total, concurrency):
+    registry = HTTPClientRegistry()
+    registry.register("stub", base_url)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            if strategy == "fresh":
+                async with httpx.AsyncClient(base_url=base_url) as client:
+                    response = await client.get("/api/v3/simple/price")
+            else:
+                response = await registry.get("stub").get(
+                    "/api/v3/simple/price"
+                )
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+    await registry.aclose()
+
+    print(
+        f"{strategy:>7}: p50={statistics.median(latencies):7.2f} ms  "
+        f"p99={percentile(latencies, 99):7.2f} ms  "
+        f"throughput={total / elapsed:8.1f} req/s"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    base_url = f"http://127.0.0.1:{port}"
+    print(
+        f"{args.requests} requests, concurrency {args.concurrency} "
+        f"against {base_url}"
+    )
+    async with server:
+        await run("fresh", base_url, args.requests, args.concurrency)
+        await run("pooled", base_url, args.requests, args.concurrency)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+"""
+Benchmark: JSON encoding paths for large recommendation/analysis payloads
+
+Compares FastAPI's default jsonable_encoder + stdlib json path with the
+core.serialization layer (orjson when installed) over
+tests/data/top-earning-positions.json, reporting encode time and bytes.
+
+Usage (from server/):
+    python tests/benchmarks/bench_json.py --repeat 50
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "app"))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from core.serialization import ORJSON_AVAILABLE, dumps  # noqa: E402
+
+DATA_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "data", "top-earning-positions.json"
+)
+
+
+def bench(label, encode, repeat):
+    encoded = encode()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        encode()
+    elapsed = (time.perf_counter() - start) / repeat * 1000
+    print(f"{label:<38} {elapsed:8.3f} ms  {len(encoded):>9,} bytes")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    with open(DATA_PATH, "r", encoding="utf-8") as f:
+        payload = json.load(f)
+
+    print(
+        f"{len(payload.get('data', []))} positions, "
+        f"orjson {'enabled' if ORJSON_AVAILABLE else 'not installed'}"
+    )
+
+    # Response body path
+    bench(
+        "jsonable_encoder + json.dumps",
+        lambda: json.dumps(
+            jsonable_encoder(payload),
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":"),
+        ).encode("utf-8"),
+        args.repeat,
+    )
+    bench("serialization.dumps", lambda: dumps(payload), args.repeat)
+
+    # LLM prompt formatting path
+    bench(
+        "json.dumps(indent=2)",
+        lambda: json.dumps(payload, indent=2).encode("utf-8"),
+        args.repeat,
+    )
+    bench(
+        "serialization.dumps(indent=True)",
+        lambda: dumps(payload, indent=True),
+        args.repeat,
+    )
+
+
+if __name__ == "__main__":
+    main()
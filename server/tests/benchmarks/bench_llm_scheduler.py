@@ -0,0 +1,163 @@
+"""
+Benchmark: LLM admission control against a local fake OpenAI server
+
+Starts an OpenAI-compatible stub (/v1/chat/completions) that answers 429
+whenever more than --upstream-limit requests are in flight, then fires a
+burst of bulk analysis calls mixed with interactive chat calls through
+LLMService. Reports 429s, per-priority latency and the scheduler stats.
+
+Usage (from server/):
+    python tests/benchmarks/bench_llm_scheduler.py --bulk 60 --chat 10
+    python tests/benchmarks/bench_llm_scheduler.py --concurrency 100  # ~no cap
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "app"))
+
+state = {"in_flight": 0, "rejected": 0, "served": 0}
+
+
+def completion_body() -> bytes:
+    return json.dumps(
+        {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "gpt-4.1-mini",
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "ok"},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": 200,
+                "completion_tokens": 50,
+                "total_tokens": 250,
+            },
+        }
+    ).encode()
+
+
+def make_handler(limit: int, latency: float):
+    async def handle(reader, writer):
+        """Minimal HTTP/1.1 keep-alive stub of the chat completions API"""
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":")[1])
+                await reader.readexactly(length)
+
+                state["in_flight"] += 1
+                try:
+                    if state["in_flight"] > limit:
+                        state["rejected"] += 1
+                        status, body = b"429 Too Many Requests", json.dumps(
+                            {"error": {"message": "rate limited"}}
+                        ).encode()
+                        extra = b"Retry-After: 0.2\r\n"
+                    else:
+                        await asyncio.sleep(latency)
+                        state["served"] += 1
+                        status, body, extra = b"200 OK", completion_body(), b""
+                finally:
+                    state["in_flight"] -= 1
+
+                writer.write(
+                    b"HTTP/1.1 " + status + b"\r\n"
+                    b"Content-Type: application/json\r\n" + extra
+                    + b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+                    b"Connection: keep-alive\r\n\r\n" + body
+                )
+                await writer.drain()
+        except (
+            asyncio.IncompleteReadError,
+            asyncio.CancelledError,
+            ConnectionResetError,
+        ):
+            pass
+        finally:
+            writer.close()
+
+    return handle
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bulk", type=int, default=60)
+    parser.add_argument("--chat", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--tpm", type=int, default=0)
+    parser.add_argument("--upstream-limit", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    server = await asyncio.start_server(
+        make_handler(args.upstream_limit, args.latency), "127.0.0.1", 0
+    )
+    port = server.sockets[0].getsockname()[1]
+
+    os.environ["OPENAI_API_KEY"] = "bench"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+    os.environ["LLM_CACHE_ENABLED"] = "false"
+    os.environ["LLM_MAX_CONCURRENCY"] = str(args.concurrency)
+    os.environ["LLM_TOKENS_PER_MINUTE"] = str(args.tpm)
+    from core.ai.llm import LLMService
+
+    service = LLMService()
+    # Surface 429s to the scheduler instead of retrying inside the client
+    service.client.max_retries = 0
+    latencies = {"interactive": [], "analysis": []}
+    failures = {"interactive": 0, "analysis": 0}
+
+    async def call(index: int, priority: str):
+        prompt = "chat_assistant" if priority == "interactive" else "general_analysis"
+        start = time.perf_counter()
+        try:
+            await service.complete({"request": index}, prompt)
+            latencies[priority].append((time.perf_counter() - start) * 1000)
+        except Exception as e:
+            failures[priority] += 1
+            print(f"{priority} call {index} failed: {e}")
+
+    async def chats():
+        # Chat arrives while the bulk burst is already queued
+        await asyncio.sleep(args.latency)
+        await asyncio.gather(*(call(i, "interactive") for i in range(args.chat)))
+
+    async with server:
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(call(i, "analysis") for i in range(args.bulk)), chats()
+        )
+        elapsed = time.perf_counter() - started
+
+    print(
+        f"{args.bulk} bulk + {args.chat} chat calls, scheduler concurrency "
+        f"{args.concurrency}, upstream limit {args.upstream_limit}: "
+        f"{elapsed:.2f}s, {state['rejected']} upstream 429s"
+    )
+    for priority, samples in latencies.items():
+        if samples:
+            print(
+                f"{priority:>11}: ok={len(samples)} failed={failures[priority]} "
+                f"p50={statistics.median(samples):8.1f} ms  "
+                f"max={max(samples):8.1f} ms"
+            )
+        else:
+            print(f"{priority:>11}: ok=0 failed={failures[priority]}")
+    print(json.dumps(service.scheduler.get_stats(), indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,117 @@
+"""
+Benchmark: parsing Revert positions for scoring/enrichment
+
+Compares the old per-use dict parsing (float(hodl.get(...) or 0) repeated
+in scoring and enrichment) with a single pass into PositionRecord objects
+and a PositionBatch (records plus typed score columns). Positions are
+replicated from tests/data/top-earning-positions.json up to --count
+(default: the sample's total_count, ~169k). Reports parse time and the
+memory retained by the parsed structures (tracemalloc, raw dicts excluded).
+
+Usage (from server/):
+    python tests/benchmarks/bench_position_parse.py --count 169685
+"""
+import argparse
+import copy
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "app"))
+
+from core.positions.record import PositionRecord  # noqa: E402
+from core.positions.scoring import PositionBatch, calculate_age_score  # noqa: E402
+
+DATA_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "data", "top-earning-positions.json"
+)
+
+
+def legacy_parse(positions):
+    """The pre-record path: every consumer re-parses the decimal strings"""
+    scored = []
+    for position in positions:
+        hodl = position.get("performance", {}).get("hodl", {})
+        apr = float(hodl.get("apr", 0) or 0)
+        roi = float(hodl.get("roi", 0) or 0)
+        volume = float(position.get("underlying_value", 0) or 0)
+        age = position.get("age")
+        scored.append(
+            {
+                "apr": apr,
+                "roi": roi,
+                "volume": volume,
+                "age_score": 0.0 if age is None else calculate_age_score(float(age)),
+            }
+        )
+
+    enriched = []
+    for position in positions:
+        hodl = position.get("performance", {}).get("hodl", {})
+        item = {
+            "nft_id": position.get("nft_id"),
+            "pool": position.get("pool"),
+            "network": position.get("network"),
+            "tokens": position.get("tokens", {}),
+        }
+        for key in ("apr", "roi", "pnl", "pool_apr", "fee_apr"):
+            item[key] = float(hodl.get(key, 0) or 0)
+        if "underlying_value" in position:
+            item["underlying_value"] = float(position["underlying_value"])
+        enriched.append(item)
+    return scored, enriched
+
+
+def measure(label, build, positions, repeat):
+    gc.collect()
+    tracemalloc.start()
+    result = build(positions)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        build(positions)
+        timings.append(time.perf_counter() - start)
+    print(
+        f"{label:<28} {min(timings) * 1000:9.1f} ms  "
+        f"{retained / 1024 / 1024:8.1f} MiB retained"
+    )
+
+
+def main():
+    with open(DATA_PATH, "r", encoding="utf-8") as f:
+        payload = json.load(f)
+    sample = payload["data"]
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=payload.get("total_count"))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    positions = []
+    while len(positions) < args.count:
+        for position in sample[: args.count - len(positions)]:
+            clone = copy.deepcopy(position)
+            clone["nft_id"] = len(positions)
+            positions.append(clone)
+
+    print(f"{len(positions):,} positions")
+    measure("legacy dict parsing", legacy_parse, positions, args.repeat)
+    measure(
+        "PositionRecord list",
+        lambda items: [PositionRecord(p) for p in items],
+        positions,
+        args.repeat,
+    )
+    measure("PositionBatch (records+cols)", PositionBatch, positions, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+"""
+Shared setup of the pytest checks
+
+Usage (from server/):
+    python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+# Keep the jobs/snapshot databases of the tests out of the app directory;
+# main.py only needs an API key to construct its client
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="spardose-tests-"))
+os.environ.setdefault("OPENAI_API_KEY", "test")
@@ -0,0 +1,131 @@
+"""Request validation of the batch endpoints"""
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from core.ai.batch import BATCH_MAX_POSITIONS, analyze_batch, batch_groups
+from core.ai.prompt_builder import PromptBuilder
+from core.positions.batch import batch_pairs
+
+
+@pytest.mark.parametrize(
+    "data, message",
+    [
+        ({"pairs": {"positions": []}}, "'pairs' must be a list"),
+        ({"pairs": [1]}, "Each pair must be an object"),
+        ({"pairs": ["0xa/0xb"]}, "Each pair must be an object"),
+        ({"positions": {"nft_id": 1}}, "'positions' must be a list"),
+        ({"positions": []}, "No positions provided"),
+        ({"pairs": [{"positions": [1, "x"]}]}, "Each position must be an object"),
+        ({"positions": [{"nft_id": 1}, None]}, "Each position must be an object"),
+        (
+            {"positions": [{}] * (BATCH_MAX_POSITIONS + 1)},
+            "Too many positions",
+        ),
+    ],
+)
+def test_batch_groups_rejects(data, message):
+    with pytest.raises(ValueError, match=message):
+        batch_groups(data)
+
+
+def test_batch_groups_names_anonymous_positions():
+    groups = batch_groups(
+        {
+            "network": "arbitrum",
+            "positions": [{"nft_id": 7}, {"apr": 1.0}],
+        }
+    )
+    assert len(groups) == 1
+    assert groups[0]["context"]["network"] == "arbitrum"
+    assert groups[0]["context"]["exchange"] == "unknown"
+    assert [p["nft_id"] for p in groups[0]["positions"]] == [7, "0-1"]
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {},
+        {"pairs": []},
+        {"pairs": [1]},
+        {"pairs": [{"token1": "0xa", "token2": "0xb", "network": "arbitrum"}]},
+    ],
+)
+def test_batch_pairs_rejects(data):
+    with pytest.raises(ValueError):
+        batch_pairs(data)
+
+
+def test_batch_pairs_drops_duplicates():
+    pair = {
+        "token1": "0xA",
+        "token2": "0xb",
+        "network": "arbitrum",
+        "exchange": "uniswapv3",
+    }
+    assert batch_pairs({"pairs": [pair, {**pair, "token1": "0xa"}]}) == [pair]
+
+
+def test_batch_endpoints_report_invalid_pairs():
+    import main
+
+    with TestClient(main.app) as client:
+        response = client.post(
+            "/positions/recommendations/analyze/batch", json={"pairs": [1]}
+        )
+        assert response.status_code == 422
+        assert response.json() == {"error": "Each pair must be an object"}
+
+        response = client.post(
+            "/positions/recommendations/analyze/batch",
+            json={"positions": [{"nft_id": 1}, 2]},
+        )
+        assert response.status_code == 422
+        assert response.json() == {"error": "Each position must be an object"}
+
+        response = client.post("/jobs/positions-batch", json={"pairs": [1]})
+        assert response.status_code == 400
+        assert response.json() == {"error": "Each pair must be an object"}
+
+        response = client.post("/positions/recommendations/batch", json={})
+        assert "error" in response.json()
+
+
+class FakeLLM:
+    """LLMService stand-in answering every position with `answer` fields"""
+
+    def __init__(self, answer: str):
+        self.prompt_builder = PromptBuilder()
+        self.answer = answer
+
+    async def complete(self, data, prompt_name, **kwargs):
+        return "\n".join(
+            '{"nft_id": %s, %s}' % (position["nft_id"], self.answer)
+            for position in data["positions"]
+        )
+
+
+def test_model_answers_cannot_overwrite_row_keys():
+    groups = batch_groups(
+        {"network": "arbitrum", "positions": [{"nft_id": 1}, {"nft_id": 2}]}
+    )
+    llm = FakeLLM('"type": "summary", "group": 9, "verdict": "watch"')
+
+    async def run():
+        return [row async for row in analyze_batch(llm, groups, 2)]
+
+    rows = asyncio.run(run())
+    results = [row for row in rows if row["type"] == "result"]
+    assert [row["nft_id"] for row in results] == [1, 2]
+    for row in results:
+        assert row["group"] == 0
+        assert row["network"] == "arbitrum"
+        assert row["analysis"] == {"type": "summary", "group": 9, "verdict": "watch"}
+    assert rows[-1] == {
+        "type": "summary",
+        "positions": 2,
+        "analyzed": 2,
+        "failed": 0,
+        "chunks": 1,
+    }
@@ -0,0 +1,30 @@
+"""Pooled upstream clients (HTTPClientRegistry)"""
+import asyncio
+
+import pytest
+
+from core.net.clients import HTTPClientRegistry
+
+
+def test_one_pooled_client_per_upstream():
+    async def run():
+        registry = HTTPClientRegistry()
+        registry.register("stub", "https://stub.test")
+        await registry.start()
+        revert = registry.get("revert")
+        assert registry.get("revert") is revert
+        assert registry.get("stub") is not revert
+        assert str(registry.get("stub").base_url) == "https://stub.test"
+
+        await registry.aclose()
+        assert revert.is_closed
+        # Used again after close (e.g. by a script), a fresh client is built
+        assert registry.get("revert") is not revert
+        await registry.aclose()
+
+    asyncio.run(run())
+
+
+def test_unknown_upstream_raises():
+    with pytest.raises(KeyError):
+        HTTPClientRegistry().get("nowhere")
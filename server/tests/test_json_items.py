@@ -0,0 +1,168 @@
+"""Incremental JSON body parsing and the streamed prompt tables"""
+import asyncio
+import json
+import random
+import statistics
+
+import pytest
+
+from core.ai.prompt_builder import PositionTable, PromptBuilder, RunningSummary
+from core.analytics.ingest import ingest_projected
+from core.streaming import json_items
+from core.streaming.json_items import JSONItemParser
+
+BODY = json.dumps(
+    {
+        "success": True,
+        "data": [
+            {"nft_id": 1, "note": "a \"quoted\" \\ value", "nested": [[{}], []]},
+            {"nft_id": 2, "apr": -1.5e-3, "tokens": {"0xa": {"symbol": "ÉTH"}}},
+        ],
+        "total_count": 2,
+        "extra": [1, 2, 3],
+    }
+).encode()
+
+
+def parse(body: bytes, size: int, item_keys=("data",)) -> list:
+    parser = JSONItemParser(item_keys)
+    events = []
+    for i in range(0, len(body), size):
+        events += parser.feed(body[i : i + size])
+    return events + parser.feed(b"", final=True)
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 1 << 20])
+def test_any_chunking_gives_the_same_events(size):
+    data = json.loads(BODY)
+    assert parse(BODY, size) == [
+        ("member", "success", True),
+        ("items", "data", None),
+        ("item", "data", data["data"][0]),
+        ("item", "data", data["data"][1]),
+        ("member", "total_count", 2),
+        ("member", "extra", [1, 2, 3]),
+    ]
+
+
+@pytest.mark.parametrize(
+    "body, message",
+    [
+        (b"[1, 2]", "Expected a JSON object"),
+        (b'{"data": [1, 2]', "Truncated JSON body"),
+        (b'{"data": [{"a": 1}', "Truncated JSON body"),
+        (b'{"a": "unterminated', "Truncated JSON body"),
+        (b'{"a": 12', "Truncated JSON body"),
+        (b'{"a" 1}', "Expected ':'"),
+        (b'{"a": 1 "b": 2}', "Expected ',' or '}'"),
+        (b'{"data": [1 2]}', "Expected ',' or ']'"),
+        (b'{"a": ]}', "Unexpected"),
+        (b'{"a": 1} {}', "Unexpected data after the JSON object"),
+        (b'{"a": ' + b"[" * 100 + b"]" * 100 + b"}", "nested deeper than"),
+    ],
+)
+def test_malformed_bodies_raise_value_error(body, message):
+    for size in (1, len(body)):
+        with pytest.raises(ValueError, match=message):
+            parse(body, size)
+
+
+def test_oversized_value_is_rejected(monkeypatch):
+    monkeypatch.setattr(json_items, "JSON_STREAM_MAX_VALUE_BYTES", 100)
+    body = b'{"data": [{"note": "' + b"x" * 1000 + b'"}]}'
+    with pytest.raises(ValueError, match="larger than 100 bytes"):
+        parse(body, 10)
+    # Items are bounded one at a time, not as a whole list
+    small = b'{"data": [' + b",".join([b'{"a": 1}'] * 100) + b"]}"
+    assert len(parse(small, 10)) == 101
+
+
+def test_running_summary_is_exact_up_to_its_capacity():
+    values = [3.0, -1.0, 7.5, 2.0, 4.0, 10.0, 0.5, 6.0]
+    for n in range(1, len(values) + 1):
+        summary = RunningSummary(capacity=8)
+        for value in values[:n]:
+            summary.add(value)
+        assert (summary.low, summary.high) == (min(values[:n]), max(values[:n]))
+        assert summary.median == statistics.median(values[:n])
+
+
+@pytest.mark.parametrize("order", ["ascending", "descending", "shuffled"])
+def test_running_summary_stays_bounded_and_close(order):
+    values = [float(i) for i in range(100_000)]
+    if order == "descending":
+        values.reverse()
+    elif order == "shuffled":
+        random.Random(0).shuffle(values)
+    summary = RunningSummary(capacity=128)
+    largest = 0
+    for value in values:
+        summary.add(value)
+        largest = max(largest, summary.size())
+    assert largest <= 3 * 128
+    for p in (0.1, 0.25, 0.5, 0.75, 0.9):
+        # Rank error well within 2% whatever the input order
+        assert abs(summary.quantile(p) / len(values) - p) < 0.02
+
+
+def positions(count: int) -> list:
+    return [
+        {
+            "nft_id": i,
+            "performance": {"hodl": {"apr": str(i / 7), "roi": i % 13}},
+        }
+        for i in range(count)
+    ]
+
+
+def test_position_table_stops_storing_past_the_budget():
+    builder = PromptBuilder()
+    table = builder.position_table(positions(5000), "position_analysis")
+    assert table.total == 5000
+    assert 0 < len(table.rows) < 1000
+    prompt = builder.build({"data": table}, "position_analysis")
+    assert prompt.rows + prompt.rows_omitted == 5000
+    assert prompt.tokens <= prompt.budget
+    assert "more rows omitted" in prompt.text
+
+
+def test_streamed_positions_render_like_the_raw_payload():
+    builder = PromptBuilder()
+    data = {"note": "x", "data": positions(40)}
+
+    async def chunks():
+        body = json.dumps(data).encode()
+        for i in range(0, len(body), 100):
+            yield body[i : i + 100]
+
+    streamed = asyncio.run(
+        ingest_projected(chunks(), "position_analysis", builder.counter)
+    )
+    assert isinstance(streamed["data"], PositionTable)
+    assert (
+        builder.build(streamed, "position_analysis").text
+        == builder.build(data, "position_analysis").text
+    )
+
+
+def test_non_object_positions_are_rejected():
+    async def chunks():
+        yield b'{"data": [{"nft_id": 1}, 2]}'
+
+    with pytest.raises(ValueError, match="Positions must be JSON objects"):
+        asyncio.run(
+            ingest_projected(chunks(), "position_analysis", PromptBuilder().counter)
+        )
+
+
+def test_analyze_endpoints_report_malformed_bodies():
+    from fastapi.testclient import TestClient
+
+    import main
+
+    client = TestClient(main.app)
+    for path in ("/analyze/position", "/analyze/top-earning"):
+        response = client.post(
+            path, content=b'{"data": [{"nft_id": 1}', params={"stream": False}
+        )
+        assert response.json() == {"error": "Truncated JSON body"}
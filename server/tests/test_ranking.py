@@ -0,0 +1,133 @@
+"""IncrementalRanking against a fresh ScoreTable over successive fetches"""
+import copy
+import json
+import os
+import random
+
+import pytest
+
+from core.positions.ranking import IncrementalRanking, position_keys
+from core.positions.recommendations import scoring_context
+from core.positions.scoring import (
+    SCORERS,
+    PositionBatch,
+    ScoreTable,
+    normalize_aggregate_weights,
+)
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "data", "top-earning-positions.json")
+MARKET = {
+    "eth_trend": {"score": 0.6, "trend": "bullish"},
+    "token1_sentiment": {"score": 0.4, "sentiment": "neutral"},
+    "token2_sentiment": {"score": 0.7, "sentiment": "positive"},
+}
+WEIGHTS = [
+    ((0.4, 0.4, 0.2), normalize_aggregate_weights()),
+    ((0.2, 0.3, 0.5), normalize_aggregate_weights({"score_1": 0.7, "score_3": 0})),
+]
+
+
+@pytest.fixture(scope="module")
+def template():
+    with open(SAMPLE) as f:
+        return json.load(f)["data"][0]
+
+
+class Fetches:
+    """Positions of one query, mutated between fetches"""
+
+    def __init__(self, template, seed: int):
+        self.template = template
+        self.random = random.Random(seed)
+        self.next_id = 0
+        self.positions = [self.new() for _ in range(60)]
+
+    def new(self):
+        # Few distinct values, so scores and APRs tie exactly
+        position = copy.deepcopy(self.template)
+        position["nft_id"] = self.next_id
+        self.next_id += 1
+        hodl = position["performance"]["hodl"]
+        hodl["apr"] = str(self.random.choice([50, 100, 100, 250, 400]))
+        hodl["roi"] = str(self.random.choice([-1, 0.5, 0.5, 2]))
+        return position
+
+    def fetch(self):
+        """APR descending like Revert, equal APRs in arbitrary order"""
+        positions = list(self.positions)
+        self.random.shuffle(positions)
+        return sorted(
+            positions, key=lambda p: -float(p["performance"]["hodl"]["apr"])
+        )
+
+    def set_apr(self, index: int, apr: float) -> None:
+        position = copy.deepcopy(self.positions[index])
+        position["performance"]["hodl"]["apr"] = str(apr)
+        self.positions[index] = position
+
+    def peak_index(self) -> int:
+        return max(
+            range(len(self.positions)),
+            key=lambda i: float(self.positions[i]["performance"]["hodl"]["apr"]),
+        )
+
+    def mutate(self, step: int) -> None:
+        kind = step % 5
+        if kind == 0:
+            self.positions += [self.new() for _ in range(3)]
+        elif kind == 1:
+            for _ in range(3):
+                index = self.random.randrange(len(self.positions))
+                self.set_apr(index, self.random.choice([50, 100, 250]))
+        elif kind == 2:
+            del self.positions[self.random.randrange(len(self.positions))]
+        elif kind == 3:
+            # A new per-column maximum, then its removal
+            self.set_apr(self.random.randrange(len(self.positions)), 5000 + step)
+        else:
+            del self.positions[self.peak_index()]
+
+
+def assert_same_rankings(ranking: IncrementalRanking, fetch) -> None:
+    keys = position_keys(fetch)
+    for weights, aggregate_weights in WEIGHTS:
+        context = scoring_context(weights, MARKET)
+        fresh = ScoreTable(PositionBatch(fetch), context, aggregate_weights)
+        table = ranking.table(context, aggregate_weights)
+        for name in [*SCORERS, "weighted_score"]:
+            expected = [keys[i] for i in fresh.ranking(name)]
+            assert table.ranking(name) == expected, name
+            assert table.ranking(name, 5) == expected[:5], name
+        for index, key in enumerate(keys):
+            assert table.scores_at(key) == fresh.scores_at(index)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_incremental_rankings_match_a_fresh_score_table(template, seed):
+    fetches = Fetches(template, seed)
+    ranking = IncrementalRanking()
+    for step in range(25):
+        fetch = fetches.fetch()
+        ranking.apply(fetch)
+        assert_same_rankings(ranking, fetch)
+        fetches.mutate(step)
+    assert ranking.stats["removed"] and ranking.stats["added"]
+
+
+def test_apply_reports_changes(template):
+    fetches = Fetches(template, 0)
+    ranking = IncrementalRanking()
+    assert ranking.apply(fetches.fetch()) == {
+        "added": 60,
+        "updated": 0,
+        "removed": 0,
+    }
+    fetches.set_apr(0, 7)
+    del fetches.positions[1]
+    fetches.positions.append(fetches.new())
+    assert ranking.apply(fetches.fetch()) == {
+        "added": 1,
+        "updated": 1,
+        "removed": 1,
+    }
+    assert len(ranking) == 60
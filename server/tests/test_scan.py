@@ -0,0 +1,95 @@
+"""Paginated top-k scan of Revert positions (scan_positions)"""
+import asyncio
+
+import httpx
+from fastapi.testclient import TestClient
+
+from core.positions.revert import scan_positions
+
+
+def revert_client(total: int, pages: list) -> httpx.AsyncClient:
+    """Revert stub serving `total` positions sorted by APR descending"""
+    positions = [
+        {"nft_id": i, "performance": {"hodl": {"apr": total - i}}}
+        for i in range(total)
+    ]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        offset = int(request.url.params["offset"])
+        limit = int(request.url.params["limit"])
+        pages.append(offset // limit + 1)
+        return httpx.Response(
+            200,
+            json={
+                "success": True,
+                "total_count": total,
+                "data": positions[offset : offset + limit],
+            },
+        )
+
+    return httpx.AsyncClient(
+        transport=httpx.MockTransport(handler), base_url="https://revert.test"
+    )
+
+
+def scan(total: int, **kwargs) -> tuple:
+    pages = []
+
+    async def run():
+        async with revert_client(total, pages) as client:
+            return await scan_positions(client, {}, **kwargs)
+
+    return asyncio.run(run()), pages
+
+
+def test_scan_stops_once_top_k_is_full():
+    result, pages = scan(1000, k=15, page_size=10, max_pages=50, concurrency=1)
+    assert [p["nft_id"] for p in result["data"]] == list(range(15))
+    # Page 2 fills the heap and its last APR bounds every later page
+    assert pages == [1, 2]
+    assert result["pages_fetched"] == 2
+    assert result["total_count"] == 1000
+
+
+def test_scan_stops_at_the_last_page():
+    result, pages = scan(25, k=100, page_size=10, max_pages=50, concurrency=4)
+    assert len(result["data"]) == 25
+    assert result["scanned"] == 25
+    assert result["pages_fetched"] == 3
+
+
+def test_scan_respects_max_pages():
+    result, _ = scan(1000, k=100, page_size=10, max_pages=2, concurrency=4)
+    assert result["pages_fetched"] == 2
+    assert len(result["data"]) == 20
+
+
+def test_scan_clamps_zero_window():
+    # A zero page size or concurrency must not spin without fetching
+    result, pages = scan(5, k=3, page_size=0, max_pages=3, concurrency=0)
+    assert pages
+    assert result["pages_fetched"] == len(pages) <= 3
+
+
+def test_recommendations_rejects_out_of_range_pages():
+    import main
+
+    client = TestClient(main.app)
+    params = {
+        "token1": "0xa",
+        "token2": "0xb",
+        "network": "arbitrum",
+        "exchange": "uniswapv3",
+        "paginate": "true",
+    }
+    for name, value in (
+        ("page_size", 0),
+        ("page_size", 1001),
+        ("max_pages", 0),
+        ("page_concurrency", 0),
+        ("page_concurrency", 17),
+    ):
+        response = client.get(
+            "/positions/recommendations", params={**params, name: value}
+        )
+        assert response.status_code == 422, (name, value)
@@ -0,0 +1,93 @@
+"""Store-mode answers of the snapshot ingester and their live fallbacks"""
+import asyncio
+import time
+
+import pytest
+
+from core.snapshots import ingester as snapshots
+from core.snapshots.ingester import SnapshotIngester, pair_key
+from core.snapshots.store import SnapshotStore
+
+PAIR = ("0xToken0", "0xToken1", "arbitrum", "uniswapv3")
+POSITIONS = [
+    {"nft_id": i, "age": 0.5, "performance": {"hodl": {"apr": 10 - i}}}
+    for i in range(3)
+]
+
+
+@pytest.fixture
+def ingester(tmp_path):
+    """Enabled ingester with an open store but no background task"""
+    ingester = SnapshotIngester(str(tmp_path / "snapshots.sqlite3"), enabled=True)
+    ingester.store = SnapshotStore(ingester.path)
+    ingester._wake = asyncio.Event()
+    yield ingester
+    ingester.store.close()
+
+
+def ingested(ingester: SnapshotIngester, taken_at: float) -> dict:
+    key = pair_key(*PAIR)
+    target = ingester._track(key)
+    stored = ingester.store.replace_pair(key, POSITIONS, taken_at)
+    target.update(
+        {"last_ingested_at": taken_at, "positions": stored, "complete": True}
+    )
+    return target
+
+
+def test_disabled_store_falls_back_live(tmp_path):
+    ingester = SnapshotIngester(str(tmp_path / "s.sqlite3"), enabled=False)
+    assert ingester.query(*PAIR, 0, 1, 10) is None
+    assert ingester.stats["live_fallbacks"] == 1
+
+
+def test_untracked_pair_falls_back_live_and_is_tracked(ingester):
+    assert ingester.query(*PAIR, 0, 1, 10) is None
+    assert pair_key(*PAIR) in ingester._targets
+    assert ingester._wake.is_set()
+
+
+def test_fresh_snapshot_is_served(ingester):
+    ingested(ingester, time.time())
+    body = ingester.query(*PAIR, 0, 1, 10)
+    assert [p["nft_id"] for p in body["data"]] == [0, 1, 2]
+    assert body["total_count"] == 3
+    assert body["snapshot"]["complete"] is True
+    assert ingester.stats["store_hits"] == 1
+
+
+def test_stale_snapshot_falls_back_live(ingester):
+    ingested(ingester, time.time() - snapshots.SNAPSHOT_MAX_STALENESS - 1)
+    assert ingester.query(*PAIR, 0, 1, 10) is None
+    assert ingester.stats["live_fallbacks"] == 1
+
+
+def test_wider_age_window_falls_back_live(ingester):
+    ingested(ingester, time.time())
+    age_to = snapshots.SNAPSHOT_MAX_AGE_DAYS + 1
+    assert ingester.query(*PAIR, 0, age_to, 10) is None
+
+
+def test_tracked_pairs_are_capped(ingester, monkeypatch):
+    monkeypatch.setattr(snapshots, "SNAPSHOT_MAX_PAIRS", 2)
+    for token in ("0x1", "0x2", "0x3"):
+        ingester.query(token, "0xb", "arbitrum", "uniswapv3", 0, 1, 10)
+    assert len(ingester._targets) == 2
+    assert ingester.stats["untracked_queries"] == 1
+
+
+def test_failing_on_demand_pair_is_dropped(ingester, monkeypatch):
+    async def failing_scan(*args, **kwargs):
+        raise RuntimeError("Revert unavailable")
+
+    monkeypatch.setattr(snapshots, "scan_positions", failing_scan)
+    monkeypatch.setattr(snapshots.http_clients, "get", lambda name: None)
+    key = pair_key(*PAIR)
+    target = ingester._track(key)
+
+    asyncio.run(ingester.ingest(key, target))
+    assert key not in ingester._targets
+    assert ingester.stats["dropped_pairs"] == 1
+    # Not re-tracked on demand until SNAPSHOT_RETRY_AFTER has passed
+    assert ingester.query(*PAIR, 0, 1, 10) is None
+    assert key not in ingester._targets
@@ -0,0 +1,87 @@
+"""Streamed pre-aggregation of top-earning positions (TopEarningSummary)"""
+import asyncio
+import copy
+import json
+import os
+
+from core.analytics.ingest import ingest_payload
+from core.analytics.top_earning import (
+    TOP_EARNING_EXACT_VALUES,
+    TOP_EARNING_GROUP_EXACT_VALUES,
+    TopEarningSummary,
+    summarize_top_earning,
+)
+from core.serialization import dumps
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "data", "top-earning-positions.json")
+
+
+def generated_body(count: int) -> bytes:
+    """`count` positions cycled from the sample, sorted by APR like Revert"""
+    with open(SAMPLE) as f:
+        sample = json.load(f)["data"]
+    positions = []
+    for i in range(count):
+        position = copy.deepcopy(sample[i % len(sample)])
+        position["nft_id"] = i
+        position["performance"]["hodl"]["apr"] = str(1000 + (i * 7919) % count)
+        positions.append(position)
+    positions.sort(key=lambda p: -float(p["performance"]["hodl"]["apr"]))
+    return dumps({"total_count": count, "data": positions})
+
+
+def summary_of(body: bytes) -> TopEarningSummary:
+    async def chunks():
+        for i in range(0, len(body), 65536):
+            yield body[i : i + 65536]
+
+    data = asyncio.run(ingest_payload(chunks(), TopEarningSummary))
+    return data["data"]
+
+
+def held_values(summary: TopEarningSummary) -> int:
+    """Floats kept by the distributions and group medians"""
+    groups = [
+        *summary.by_network.values(),
+        *summary.by_pool.values(),
+        *summary.by_fee_tier.values(),
+    ]
+    return (
+        summary.il.size()
+        + summary.roi.size()
+        + summary.apr.size()
+        + sum(group.apr.size() for group in groups)
+    )
+
+
+def test_summary_state_does_not_grow_with_positions():
+    small = summary_of(generated_body(10_000))
+    large = summary_of(generated_body(40_000))
+    assert large.count == 40_000
+    # Same pools in both bodies: only the positions multiply
+    groups = len(large.by_network) + len(large.by_pool) + len(large.by_fee_tier)
+    assert len(large.by_pool) == len(small.by_pool)
+    bound = 3 * (
+        3 * TOP_EARNING_EXACT_VALUES + groups * TOP_EARNING_GROUP_EXACT_VALUES
+    )
+    assert held_values(large) <= bound
+    # Four times the positions, about the same state
+    assert held_values(large) <= 1.25 * held_values(small)
+
+    distribution = large.result()["distributions"]["apr"]
+    # APRs are 1000 + a permutation of 0..N-1, posted in descending order
+    for name, p in (("p10", 0.1), ("median", 0.5), ("p90", 0.9)):
+        assert abs(distribution[name] - (1000 + p * 40_000)) < 0.02 * 40_000
+
+
+def test_small_datasets_stay_exact():
+    with open(SAMPLE) as f:
+        data = json.load(f)
+    summary = summarize_top_earning(data)
+    apr = sorted(
+        float(p["performance"]["hodl"]["apr"]) for p in data["data"]
+    )
+    assert summary["distributions"]["apr"]["min"] == float(f"{apr[0]:.6g}")
+    assert summary["distributions"]["apr"]["median"] == float(
+        f"{(apr[49] + apr[50]) / 2:.6g}"
+    )